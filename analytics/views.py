@@ -2,26 +2,34 @@
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from videos.renderers import API_RENDERER_CLASSES
 
 class AnalysisSessionListView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request):
         return Response({"message": "Analysis session list placeholder"})
 class AnalysisSessionDetailView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request, pk):
         return Response({"message": f"Analysis session detail placeholder for {pk}"})
     
 class VideoSummaryListView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request):
         return Response({"message": "Video summary list placeholder"})
 class VideoSummaryDetailView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request, pk):
         return Response({"message": f"Video summary detail placeholder for {pk}"})
 class InsightListView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request):
         return Response({"message": "Insight list placeholder"})
 class InsightDetailView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request, pk):
         return Response({"message": f"Insight detail placeholder for {pk}"})
 class UserAnalyticsView(APIView):
+    renderer_classes = API_RENDERER_CLASSES
     def get(self, request):
         return Response({"message": "User analytics placeholder"})
\ No newline at end of file
@@ -0,0 +1,125 @@
+import datetime
+import decimal
+import json
+import uuid
+import msgpack
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.renderers import ORJSONRenderer, MessagePackRenderer
+from videos.serializers import EventSerializer, VideoFrameSerializer
+from videos.views import VideoEventsView, VideoFramesView
+
+User = get_user_model()
+
+
+class RendererTests(TestCase):
+    """Test cases for the fast JSON and MessagePack renderers"""
+
+    def setUp(self):
+        self.data = {
+            'id': uuid.UUID(int=1),
+            'created_at': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'duration': datetime.timedelta(seconds=90),
+            'score': decimal.Decimal('0.25'),
+            'title': 'Red light ✓',
+            'boxes': [[0.1, 0.2, 0.3, 0.4]],
+        }
+
+    def test_orjson_matches_json_renderer(self):
+        """The orjson renderer produces the same document as DRF's renderer"""
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(self.data)),
+            json.loads(JSONRenderer().render(self.data))
+        )
+
+    def test_messagepack_round_trip(self):
+        """MessagePack payloads decode to the JSON document"""
+        payload = MessagePackRenderer().render(self.data)
+        self.assertEqual(
+            msgpack.unpackb(payload, raw=False),
+            json.loads(JSONRenderer().render(self.data))
+        )
+
+
+class FastListSerializerTests(TestCase):
+    """Test cases for the read-only list serializer fast path"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+        for frame_number in range(3):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=frame_number,
+                timestamp=float(frame_number),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            DetectedObject.objects.create(
+                frame=frame,
+                class_name='car',
+                confidence=0.9,
+                bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2,
+                track_id=None if frame_number else 'track_1'
+            )
+        Event.objects.create(
+            video=self.video,
+            event_type='sudden_stop',
+            title='Sudden Vehicle Stop',
+            description='A vehicle stopped suddenly',
+            severity='warning',
+            start_time=1.0,
+            confidence=0.8,
+            detected_by='test'
+        )
+
+    def stock_representation(self, serializer_class, instances):
+        return [serializer_class(instance).data for instance in instances]
+
+    def test_matches_stock_serializers(self):
+        """The fast path produces exactly what the field-by-field path does"""
+        frames = VideoFrame._default_manager.prefetch_related('objects')
+        self.assertEqual(
+            json.loads(JSONRenderer().render(VideoFrameSerializer(frames, many=True).data)),
+            json.loads(JSONRenderer().render(self.stock_representation(VideoFrameSerializer, frames)))
+        )
+        events = Event.objects.prefetch_related('related_objects')
+        self.assertIsInstance(EventSerializer(events, many=True), serializers.ListSerializer)
+        self.assertEqual(
+            json.loads(JSONRenderer().render(EventSerializer(events, many=True).data)),
+            json.loads(JSONRenderer().render(self.stock_representation(EventSerializer, events)))
+        )
+
+    def test_content_negotiation(self):
+        """Clients asking for MessagePack get it, with a distinct ETag"""
+        def get(accept):
+            request = self.factory.get('/frames/', HTTP_ACCEPT=accept)
+            force_authenticate(request, user=self.user)
+            response = VideoFramesView.as_view()(request, video_id=self.video.id)
+            response.render()
+            return response
+
+        json_response = get('application/json')
+        msgpack_response = get('application/msgpack')
+        self.assertEqual(msgpack_response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(msgpack_response.content), json.loads(json_response.content))
+        self.assertNotEqual(msgpack_response['ETag'], json_response['ETag'])
+        self.assertIn('Accept', msgpack_response['Vary'])
+
+        request = self.factory.get('/events/')
+        force_authenticate(request, user=self.user)
+        response = VideoEventsView.as_view()(request, video_id=self.video.id)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
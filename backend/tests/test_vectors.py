@@ -0,0 +1,231 @@
+import uuid
+from unittest import mock
+import numpy as np
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.core.cache import cache
+from videos import tasks, vectors
+from videos.models import Video, VideoFrame, Event, Embedding, EmbeddingIndex, EmbeddingSegment
+from videos.packing import DetectionVocabulary, pack_detections
+from videos.vectors import FlatIndex, IVFIndex, event_text_embedding, index_video_embeddings
+from videos.views import similar_events, similar_frames
+
+User = get_user_model()
+
+
+class VectorIndexTests(TestCase):
+    """Test cases for the flat and approximate vector indexes"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        vectors = centers[rng.integers(0, 20, 4000)] + 0.2 * rng.normal(size=(4000, 32))
+        self.vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+        self.queries = self.vectors[:20]
+
+    def test_flat_index_is_exact(self):
+        """The flat index returns the best scores in order"""
+        positions, scores = FlatIndex(self.vectors).search(self.queries[0], 5)
+        expected = np.argsort(-(self.vectors @ self.queries[0]))[:5]
+        self.assertEqual(list(positions), list(expected))
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_ivf_recall(self):
+        """IVF search, with and without product quantization, finds the true neighbours"""
+        flat = FlatIndex(self.vectors)
+        for index, minimum_recall in ((IVFIndex(self.vectors), 0.95),
+                                      (IVFIndex(self.vectors, pq_subvectors=8), 0.5)):
+            recall = 0.0
+            for query in self.queries:
+                exact, _ = flat.search(query, 10)
+                approximate, _ = index.search(query, 10)
+                recall += len(set(exact) & set(approximate)) / 10
+            self.assertGreaterEqual(recall / len(self.queries), minimum_recall)
+
+    def test_restored_ivf_index(self):
+        """A trained index restored with its encoded vectors answers like the original"""
+        index = IVFIndex(self.vectors, pq_subvectors=8)
+        lists, encoded = index.encode(self.vectors)
+        restored = IVFIndex.restore(index.quantizer(), lists, encoded)
+        for query in self.queries[:5]:
+            positions, scores = index.search(query, 10)
+            restored_positions, restored_scores = restored.search(query, 10)
+            self.assertEqual(list(positions), list(restored_positions))
+            np.testing.assert_allclose(scores, restored_scores)
+
+
+class SimilarEventsTests(TestCase):
+    """Test cases for the similar events API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+        self.events = [
+            Event.objects.create(
+                video=self.video,
+                event_type=event_type,
+                title=title,
+                description=title,
+                start_time=float(i),
+                confidence=0.9,
+                detected_by='test'
+            )
+            for i, (event_type, title) in enumerate([
+                ('red_light_violation', 'Red Light Violation'),
+                ('red_light_violation', 'Red Light Violation at the junction'),
+                ('pedestrian_crossing', 'Pedestrian Crossing'),
+            ])
+        ]
+
+    def test_embedding_is_deterministic(self):
+        """The local embedding function gives the same unit vector every time"""
+        first = event_text_embedding(self.events[0])
+        second = event_text_embedding(self.events[0])
+        self.assertTrue(np.array_equal(first, second))
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_similar_events(self):
+        """The closest event to a red light violation is the other one"""
+        self.assertEqual(index_video_embeddings(self.video), 3)
+        self.assertEqual(Embedding.objects.filter(entity_type='event').count(), 3)
+
+        request = APIRequestFactory().get('/similar/?k=1')
+        force_authenticate(request, user=self.user)
+        response = similar_events(request, pk=self.events[0].id)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], str(self.events[1].id))
+
+    def test_index_is_built_by_the_pipeline(self):
+        """Queries load the stored index, once per embeddings version"""
+        cache.clear()
+        vectors._index_cache.clear()
+        index_video_embeddings(self.video)
+        stored = EmbeddingIndex.objects.get(user=self.user, entity_type='event')
+        self.assertEqual(stored.trained_count, 3)
+
+        with self.assertNumQueries(3):
+            object_ids, index = vectors.load_index(self.user, 'event')
+        self.assertEqual(
+            sorted(uuid.UUID(bytes=row.tobytes()) for row in object_ids),
+            sorted(event.id for event in self.events)
+        )
+        with self.assertNumQueries(0):
+            vectors.load_index(self.user, 'event')
+
+        self.events[2].delete()
+        index_video_embeddings(self.video)
+        object_ids, _ = vectors.load_index(self.user, 'event')
+        self.assertEqual(len(object_ids), 2)
+
+    def add_video(self, titles):
+        video = Video.objects.create(user=self.user, title='Other Video', file='videos/other.mp4')
+        events = [
+            Event.objects.create(
+                video=video,
+                event_type='red_light_violation',
+                title=title,
+                description=title,
+                start_time=float(i),
+                confidence=0.9,
+                detected_by='test'
+            )
+            for i, title in enumerate(titles)
+        ]
+        index_video_embeddings(video)
+        return video, events
+
+    @mock.patch('videos.vectors.APPROXIMATE_INDEX_THRESHOLD', 2)
+    def test_uploads_do_not_retrain(self):
+        """New videos are assigned to the trained lists; the periodic task retrains"""
+        cache.clear()
+        vectors._index_cache.clear()
+        index_video_embeddings(self.video)
+        trained = EmbeddingIndex.objects.get(user=self.user, entity_type='event')
+        self.assertEqual((trained.kind, trained.generation), ('ivf', 1))
+        vectors.load_index(self.user, 'event')
+
+        video, events = self.add_video(['Red Light Violation downtown', 'Red Light Violation again'])
+        stored = EmbeddingIndex.objects.get(user=self.user, entity_type='event')
+        self.assertEqual(stored.generation, 1)
+        self.assertEqual(bytes(stored.data), bytes(trained.data))
+        segment = EmbeddingSegment.objects.get(video=video, entity_type='event')
+        self.assertEqual((segment.generation, segment.vectors_count), (1, 2))
+        object_ids, _ = vectors.load_index(self.user, 'event')
+        self.assertEqual(len(object_ids), 5)
+        found = {object_id for object_id, _ in vectors.find_similar(self.user, 'event', self.events[0].id, k=4)}
+        self.assertTrue(found & {event.id for event in events})
+
+        # 5 vectors against 3 trained on is not yet worth training again
+        self.assertEqual(tasks.retrain_embedding_indexes(), 0)
+        self.add_video(['Pedestrian Crossing at night', 'Pedestrian Crossing'])
+        self.assertEqual(tasks.retrain_embedding_indexes(), 1)
+        stored.refresh_from_db()
+        self.assertEqual((stored.generation, stored.trained_count), (2, 7))
+        self.assertEqual(
+            set(EmbeddingSegment.objects.filter(entity_type='event').values_list('generation', flat=True)), {2}
+        )
+        object_ids, _ = vectors.load_index(self.user, 'event')
+        self.assertEqual(len(object_ids), 7)
+
+    def test_deleted_video_leaves_the_index(self):
+        """Loaded indexes drop the vectors of a deleted video"""
+        cache.clear()
+        vectors._index_cache.clear()
+        index_video_embeddings(self.video)
+        video, _ = self.add_video(['Red Light Violation downtown'])
+        self.assertEqual(len(vectors.load_index(self.user, 'event')[0]), 4)
+        video.delete()
+        self.assertEqual(len(vectors.load_index(self.user, 'event')[0]), 3)
+
+
+class SimilarFramesTests(TestCase):
+    """Test cases for the similar frames API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+
+    def test_packed_detections_are_served(self):
+        """Frames whose detections are packed list them among the results"""
+        vocabulary = DetectionVocabulary()
+        frames = []
+        for second, classes in enumerate([['car', 'car'], ['car', 'car', 'truck'], ['person']]):
+            detections = [
+                {'class_name': class_name, 'confidence': 0.9, 'bbox_x': 0.1, 'bbox_y': 0.1,
+                 'bbox_width': 0.2, 'bbox_height': 0.2, 'track_id': None}
+                for class_name in classes
+            ]
+            frames.append(VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=True,
+                packed_detections=pack_detections(detections, vocabulary)
+            ))
+        self.video.packed_vocabulary = vocabulary.as_json()
+        self.video.save()
+        index_video_embeddings(self.video)
+
+        request = APIRequestFactory().get('/similar/?k=1')
+        force_authenticate(request, user=self.user)
+        response = similar_frames(request, pk=frames[0].id)
+        self.assertEqual(response.data['count'], 1)
+        result = response.data['results'][0]
+        self.assertEqual(result['id'], str(frames[1].id))
+        self.assertEqual(
+            sorted(detection['class_name'] for detection in result['objects']),
+            ['car', 'car', 'truck']
+        )
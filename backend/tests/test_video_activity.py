@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from videos.models import Video, VideoFrame
+from videos.activity import classify_group, flow_image, recognize_activities
+from videos.inference import clear_models
+from videos.packing import DetectionVocabulary, pack_detections
+from videos.tasks import perform_object_detection
+
+User = get_user_model()
+
+
+def smooth_noise(rng, height, width, sigma):
+    """Blurred noise scaled to uint8, a texture optical flow can follow"""
+    image = cv2.GaussianBlur(rng.integers(0, 255, (height, width)).astype(np.float32), (0, 0), sigma)
+    return cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+
+class PatchDetector:
+    """Detector finding the white patch of an analysis image, without tracking"""
+
+    def detect(self, image, letterbox):
+        x, y, width, height = cv2.boundingRect((image[..., 0] > 200).astype(np.uint8))
+        return [('car', 0.9, (x, y, width, height))] if width else []
+
+
+class ActivityClassificationTests(TestCase):
+    """Test cases for classifying the flow samples of one group"""
+
+    def test_stopping(self):
+        """Moving samples followed by still ones are a stop"""
+        flows = np.array([[0.1, 0.0], [0.1, 0.0], [0.08, 0.0], [0.0, 0.0], [0.001, 0.0]])
+        centers = np.column_stack([np.linspace(0.4, 0.5, 5), np.full(5, 0.5)])
+        activities = classify_group(np.arange(5.0), centers, flows)
+        self.assertEqual([activity[:3] for activity in activities], [('stopping', 2, 4)])
+
+    def test_turning(self):
+        """A heading change from right to up is a left turn"""
+        flows = np.array([[0.1, 0.0], [0.1, 0.0], [0.0, -0.1], [0.0, -0.1]])
+        centers = np.array([[0.5, 0.5]] * 4)
+        activity, first, last, details = classify_group(np.arange(4.0), centers, flows)[0]
+        self.assertEqual((activity, first, last), ('turning', 0, 3))
+        self.assertEqual((details['turn'], details['direction']), (90.0, 'left'))
+
+    def test_crossing(self):
+        """Travelling across the frame horizontally is a crossing"""
+        flows = np.full((4, 2), [-0.2, 0.0])
+        centers = np.column_stack([np.linspace(0.9, 0.3, 4), np.full(4, 0.5)])
+        activities = classify_group(np.arange(4.0), centers, flows)
+        self.assertEqual([activity[0] for activity in activities], ['crossing'])
+        self.assertEqual(activities[0][3]['direction'], 'left')
+
+
+class ActivityRecognitionTests(TestCase):
+    """Test cases for activity events from the optical flow of a video"""
+
+    # Patch x offsets, in pixels of a 320 x 180 frame
+    positions = [50, 56, 62, 68, 74, 74, 74, 74]
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=10),
+            status='processing'
+        )
+
+    def test_flow_image_is_downscaled_grayscale(self):
+        image = flow_image(np.zeros((720, 1280, 3), dtype=np.uint8), width=320)
+        self.assertEqual(image.shape, (180, 320))
+
+    def flow_images(self):
+        """Flow images of a textured patch moving right, then standing still"""
+        rng = np.random.default_rng(0)
+        background = smooth_noise(rng, 180, 320, 4)
+        patch = smooth_noise(rng, 40, 60, 3)
+        images = []
+        for x in self.positions:
+            image = background.copy()
+            image[70:110, x:x + 60] = patch
+            images.append(image)
+        return images
+
+    def create_packed_frames(self, track_ids):
+        """Frames of the moving patch, with packed detections of the given track ids"""
+        vocabulary = DetectionVocabulary()
+        frames = []
+        for index, (x, image, track_id) in enumerate(zip(self.positions, self.flow_images(), track_ids)):
+            box = {
+                'class_name': 'car', 'confidence': 0.9,
+                'bbox_x': x / 320, 'bbox_y': 70 / 180, 'bbox_width': 60 / 320, 'bbox_height': 40 / 180,
+                'track_id': track_id,
+            }
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=index * 8,
+                timestamp=index * 0.25,
+                image='frames/test.jpg',
+                width=320,
+                height=180,
+                file_size=1024,
+                has_objects=True,
+                packed_detections=pack_detections([box], vocabulary)
+            )
+            frame.flow_image = image
+            frames.append(frame)
+        self.video.packed_vocabulary = vocabulary.as_json()
+        self.video.save()
+        return frames
+
+    def test_tracked_object_stopping(self):
+        """A tracked patch moving right then standing still is reported as stopping"""
+        frames = self.create_packed_frames(['car_1'] * len(self.positions))
+
+        events = recognize_activities(self.video, frames)
+        self.assertEqual([event.event_type for event in events], ['stopping'])
+        event = events[0]
+        self.assertEqual(event.detected_by, 'activity_recognizer')
+        self.assertEqual(event.metadata['track_id'], 'car_1')
+        self.assertEqual((event.start_time, event.end_time), (1.0, 1.75))
+        self.assertAlmostEqual(event.metadata['speed_before'], 6 / 320 / 0.25, delta=0.01)
+
+        scores = list(
+            VideoFrame._default_manager.filter(video=self.video)
+            .order_by('timestamp').values_list('motion_score', flat=True)
+        )
+        self.assertIsNone(scores[0])
+        self.assertGreater(scores[1], 0.0)
+        self.assertAlmostEqual(scores[-1], 0.0, places=3)
+
+    def test_single_frame_tracks_group_by_region(self):
+        """Track ids seen in one frame only fall back to the region grid"""
+        frames = self.create_packed_frames([f'car_{index}' for index in range(len(self.positions))])
+        events = recognize_activities(self.video, frames)
+        self.assertEqual([event.event_type for event in events], ['stopping'])
+        self.assertIsNone(events[0].metadata['track_id'])
+        self.assertEqual(events[0].metadata['group'], 'region:car:1,0')
+
+    @override_settings(VIDEO_MODELS={'object_detector': {'loader': f'{__name__}.PatchDetector', 'version': 'patch'}})
+    def test_detection_then_activity_recognition(self):
+        """Detections linked into tracks by the detection stage yield activity events"""
+        frames = []
+        for index, image in enumerate(self.flow_images()):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=index * 8,
+                timestamp=index * 0.25,
+                image='frames/test.jpg',
+                width=320,
+                height=180,
+                file_size=1024
+            )
+            analysis = np.zeros((180, 320, 3), dtype=np.uint8)
+            analysis[70:110, self.positions[index]:self.positions[index] + 60] = 255
+            frame.analysis_image = analysis
+            frame.flow_image = image
+            frames.append(frame)
+
+        clear_models()
+        perform_object_detection(self.video, frames)
+        events = recognize_activities(self.video, frames)
+        self.assertEqual([event.event_type for event in events], ['stopping'])
+        self.assertIsNotNone(events[0].metadata['track_id'])
+        self.assertEqual(events[0].metadata['samples'], len(self.positions) - 1)
@@ -0,0 +1,108 @@
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from videos.models import Video, VideoFrame, Event
+from videos.anomalies import change_scores, detect_anomalies, flagged_runs, rolling_zscores, window_peaks
+from videos.packing import DetectionVocabulary, pack_detections
+from videos.tasks import detect_video_anomalies
+
+User = get_user_model()
+
+
+class AnomalyStatisticsTests(TestCase):
+    """Test cases for the rolling statistics behind anomaly detection"""
+
+    def test_rolling_zscores_match_brute_force(self):
+        """Z-scores use the mean and deviation of the previous window only"""
+        values = np.random.default_rng(0).normal(5.0, 2.0, 200)
+        zscores, means = rolling_zscores(values, 20)
+        for index in (5, 19, 20, 150):
+            history = values[max(index - 20, 0):index]
+            self.assertAlmostEqual(means[index], history.mean())
+            self.assertAlmostEqual(zscores[index], (values[index] - history.mean()) / history.std())
+        self.assertEqual(zscores[:4].tolist(), [0.0] * 4)
+
+    def test_change_points(self):
+        """A step in the mean peaks at the first frame of the new level"""
+        values = np.concatenate([np.full(50, 2.0), np.full(50, 8.0)])
+        scores, before, after = change_scores(values, 10, min_std=1.0, poisson=True)
+        self.assertEqual(window_peaks(scores, 10, 4.0).tolist(), [50])
+        self.assertEqual((before[50], after[50]), (2.0, 8.0))
+        self.assertEqual(window_peaks(np.zeros(30), 10, 4.0).tolist(), [])
+
+    def test_flagged_runs(self):
+        first, last = flagged_runs(np.array([True, True, False, False, True, False, True]))
+        self.assertEqual(first.tolist(), [0, 4, 6])
+        self.assertEqual(last.tolist(), [1, 4, 6])
+
+
+class AnomalyDetectionTests(TestCase):
+    """Test cases for anomaly events over a video's frames"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=120),
+            status='processing'
+        )
+
+    def create_frames(self, counts):
+        """Frames one second apart with the given numbers of detections, in packed storage"""
+        vocabulary = DetectionVocabulary()
+        for second, count in enumerate(counts):
+            boxes = [
+                {
+                    'class_name': 'car', 'confidence': 0.9,
+                    'bbox_x': 0.1 * (index % 8), 'bbox_y': 0.5, 'bbox_width': 0.1, 'bbox_height': 0.1,
+                    'track_id': None,
+                }
+                for index in range(count)
+            ]
+            VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=bool(count),
+                packed_detections=pack_detections(boxes, vocabulary)
+            )
+        self.video.packed_vocabulary = vocabulary.as_json()
+        self.video.save()
+
+    def test_spike_and_change_point(self):
+        """A burst of detections is a spike; a lasting rise is a change point"""
+        counts = [2] * 40 + [15, 14] + [2] * 38 + [9] * 40
+        self.create_frames(counts)
+
+        events = detect_anomalies(self.video, window=20, z_threshold=3.0, change_threshold=4.0)
+        self.assertTrue(all(event.detected_by == 'anomaly_detector' for event in events))
+        self.assertFalse([event for event in events if event.metadata['series'] == 'motion'])
+
+        spikes = [event for event in events if event.event_type == 'object_count_anomaly']
+        self.assertEqual((spikes[0].start_time, spikes[0].end_time), (40.0, 41.0))
+        self.assertEqual(spikes[0].metadata['kind'], 'spike')
+        self.assertEqual(spikes[0].metadata['value'], 15.0)
+        self.assertEqual(spikes[-1].start_time, 80.0)
+
+        changes = [event for event in events if event.event_type == 'object_count_change']
+        self.assertEqual([event.start_time for event in changes], [80.0])
+        self.assertEqual((changes[0].metadata['before'], changes[0].metadata['after']), (2.0, 9.0))
+        self.assertTrue(all(0.5 <= event.confidence < 1.0 for event in events))
+
+    def test_steady_video_has_no_anomalies(self):
+        """Noise within the floor of a series is not reported"""
+        rng = np.random.default_rng(1)
+        self.create_frames(rng.integers(3, 6, 100).tolist())
+        self.assertEqual(detect_video_anomalies(self.video), [])
+        self.assertFalse(Event.objects.filter(video=self.video).exists())
@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.cache import cache_stats
+from videos.models import Video, Event
+from videos.views import VideoEventsView, VideoDetailView, video_analysis_status
+
+User = get_user_model()
+
+
+class VideoResponseCacheTests(TestCase):
+    """Test cases for the versioned response cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        return view(request, **kwargs)
+
+    def create_event(self, start_time):
+        return Event.objects.create(
+            video=self.video,
+            event_type='sudden_stop',
+            title='Sudden Vehicle Stop',
+            description='A vehicle stopped suddenly',
+            severity='warning',
+            start_time=start_time,
+            confidence=0.8,
+            detected_by='test'
+        )
+
+    def test_hit_skips_database(self):
+        """A repeated request is answered without touching the database"""
+        self.create_event(1.0)
+        events_view = VideoEventsView.as_view()
+        first = self.get(events_view, '/events/', video_id=self.video.id)
+        with self.assertNumQueries(0):
+            second = self.get(events_view, '/events/', video_id=self.video.id)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache_stats()['video-events'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate(self):
+        """Event and video writes bump the video version"""
+        response = self.get(video_analysis_status, '/status/', video_id=self.video.id)
+        self.assertEqual(response.data['events_count'], 0)
+
+        self.create_event(2.0)
+        response = self.get(video_analysis_status, '/status/', video_id=self.video.id)
+        self.assertEqual(response.data['events_count'], 1)
+
+        detail_view = VideoDetailView.as_view()
+        self.get(detail_view, '/', pk=self.video.id)
+        self.video.title = 'Renamed'
+        self.video.save()
+        response = self.get(detail_view, '/', pk=self.video.id)
+        self.assertEqual(response.data['title'], 'Renamed')
+
+    def test_query_string_is_part_of_the_key(self):
+        """Different filters are cached separately"""
+        self.create_event(1.0)
+        events_view = VideoEventsView.as_view()
+        self.get(events_view, '/events/', video_id=self.video.id)
+        response = self.get(events_view, '/events/?severity=info', video_id=self.video.id)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_conditional_get(self):
+        """A matching If-None-Match gets a 304 without touching the database"""
+        events_view = VideoEventsView.as_view()
+        first = self.get(events_view, '/events/', video_id=self.video.id)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        etag = first['ETag']
+
+        request = self.factory.get('/events/', HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(0):
+            response = events_view(request, video_id=self.video.id)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.create_event(1.0)
+        request = self.factory.get('/events/', HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, user=self.user)
+        response = events_view(request, video_id=self.video.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_conditional_get_if_modified_since(self):
+        """An If-Modified-Since at the Last-Modified date gets a 304"""
+        first = self.get(video_analysis_status, '/status/', video_id=self.video.id)
+        request = self.factory.get('/status/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        force_authenticate(request, user=self.user)
+        response = video_analysis_status(request, video_id=self.video.id)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_is_not_shared_between_users(self):
+        """Another user's validator never yields a 304 for someone else's video"""
+        detail_view = VideoDetailView.as_view()
+        etag = self.get(detail_view, '/', pk=self.video.id)['ETag']
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=etag)
+        force_authenticate(request, user=other)
+        response = detail_view(request, pk=self.video.id)
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,130 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, DetectedObject
+from videos.classmasks import (
+    MAX_MASK_CLASSES, FrameQueryError, build_frame_class_index, frame_class_fields, parse_frame_query
+)
+from videos.views import video_frame_query
+
+User = get_user_model()
+
+FRAME_CLASSES = [
+    ['person', 'car'],
+    ['person', 'car', 'traffic_light'],
+    ['car', 'car', 'car'],
+    ['person'],
+    [],
+]
+
+
+class FrameClassMaskTests(TestCase):
+    """Test cases for per-frame class bitmasks and frame queries"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='completed'
+        )
+        for second, classes in enumerate(FRAME_CLASSES):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=bool(classes)
+            )
+            for class_name in classes:
+                DetectedObject.objects.create(
+                    frame=frame,
+                    class_name=class_name,
+                    confidence=0.9,
+                    bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+                )
+        build_frame_class_index(self.video)
+
+    def query(self, q, **params):
+        request = self.factory.get(f'/api/v1/videos/{self.video.id}/frames/query/', {'q': q, **params})
+        force_authenticate(request, user=self.user)
+        return video_frame_query(request, video_id=self.video.id)
+
+    def matching_timestamps(self, q):
+        response = self.query(q)
+        self.assertEqual(response.status_code, 200)
+        return [frame['timestamp'] for frame in response.data['frames']]
+
+    def test_frame_class_fields(self):
+        """Masks set one bit per class and extend the vocabulary"""
+        vocabulary = ['car']
+        mask, counts = frame_class_fields(vocabulary, ['person', 'car', 'person'])
+        self.assertEqual(vocabulary, ['car', 'person'])
+        self.assertEqual(mask, 0b11)
+        self.assertEqual(counts, {'person': 2, 'car': 1})
+
+    def test_index_built_from_detections(self):
+        """The most frequent classes get the lowest bits"""
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.class_vocabulary, ['car', 'person', 'traffic_light'])
+        frame = VideoFrame._default_manager.get(video=self.video, timestamp=1.0)
+        self.assertEqual(frame.class_mask, 0b111)
+        self.assertEqual(frame.class_counts, {'person': 1, 'car': 1, 'traffic_light': 1})
+
+    def test_backfill_command(self):
+        """The command indexes the videos analysed before frames had class masks"""
+        VideoFrame._default_manager.filter(video=self.video).update(class_mask=0, class_counts={})
+        Video.objects.filter(id=self.video.id).update(class_vocabulary=[])
+        output = StringIO()
+        call_command('build_frame_class_index', stdout=output)
+        self.assertIn('1 videos', output.getvalue())
+        self.assertEqual(self.matching_timestamps('person AND car AND NOT traffic_light'), [0.0])
+
+        call_command('build_frame_class_index', stdout=output)
+        self.assertIn('0 videos', output.getvalue())
+
+    def test_boolean_queries(self):
+        """Presence, absence and count expressions select the right frames"""
+        self.assertEqual(self.matching_timestamps('person AND car AND NOT traffic_light'), [0.0])
+        self.assertEqual(self.matching_timestamps('traffic_light OR NOT car'), [1.0, 3.0, 4.0])
+        self.assertEqual(self.matching_timestamps('car >= 2'), [2.0])
+        self.assertEqual(self.matching_timestamps('(person || bicycle) & !car'), [3.0])
+        self.assertEqual(self.matching_timestamps('bicycle'), [])
+
+        response = self.query('car', limit=1)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['frames']), 1)
+
+    def test_classes_beyond_the_mask(self):
+        """Classes without a bit are answered from the counts"""
+        self.video.class_vocabulary = [f'class_{index}' for index in range(MAX_MASK_CLASSES)] + ['car']
+        self.video.save()
+        VideoFrame._default_manager.filter(video=self.video).update(class_mask=0)
+        self.assertEqual(self.matching_timestamps('car'), [0.0, 1.0, 2.0])
+
+    def test_invalid_queries(self):
+        for query in ('', 'car AND', '(car', 'car >= many', 'car bus'):
+            with self.assertRaises(FrameQueryError):
+                parse_frame_query(query)
+        self.assertEqual(self.query('car AND').status_code, 400)
+
+    def test_deeply_nested_queries(self):
+        """Queries nested past the limit are rejected rather than overflowing the stack"""
+        self.assertEqual(self.matching_timestamps('(' * 8 + 'NOT NOT person' + ')' * 8), [0.0, 1.0, 3.0])
+        for query in ('(' * 400 + 'car' + ')' * 400, 'NOT ' * 400 + 'car', ' AND '.join(['car'] * 400)):
+            with self.assertRaises(FrameQueryError):
+                parse_frame_query(query)
+            self.assertEqual(self.query(query).status_code, 400)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import cv2
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from videos.models import Video, VideoFrame
+from videos.decoding import LETTERBOX_FILL, Letterbox, analysis_input, decode_frame, fit_size
+from videos.tasks import extract_video_frames
+
+User = get_user_model()
+
+
+class LetterboxTests(TestCase):
+    """Test cases for the placement of frames in a square model input"""
+
+    def test_fit_size(self):
+        self.assertEqual(fit_size(3840, 2160, 1280), (1280, 720))
+        self.assertEqual(fit_size(1080, 1920, 640), (360, 640))
+        self.assertEqual(fit_size(320, 240, 640), (320, 240))
+        self.assertEqual(fit_size(3840, 2160, None), (3840, 2160))
+
+    def test_apply_centres_the_image(self):
+        letterbox = Letterbox.fit(1920, 1080, 640)
+        self.assertEqual((letterbox.width, letterbox.height, letterbox.pad_x, letterbox.pad_y), (640, 360, 0, 140))
+        canvas = letterbox.apply(np.zeros((360, 640, 3), dtype=np.uint8))
+        self.assertEqual(canvas.shape, (640, 640, 3))
+        self.assertEqual(canvas[:140].min(), LETTERBOX_FILL)
+        self.assertEqual(canvas[500:].min(), LETTERBOX_FILL)
+        self.assertEqual(canvas[140:500].max(), 0)
+
+    def test_boxes_round_trip_through_input_pixels(self):
+        """Boxes in input pixels map back to the normalized frame boxes, clipped to the frame"""
+        letterbox = Letterbox.fit(1080, 1920, 640)
+        boxes = np.array([[0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 0.25, 0.25]])
+        np.testing.assert_allclose(letterbox.to_normalized(letterbox.to_input(boxes)), boxes)
+        # A box reaching into the padding is cut at the frame edge
+        clipped = letterbox.to_normalized([[letterbox.pad_x - 20, 0, 60, 64]])
+        np.testing.assert_allclose(clipped, [[0.0, 0.0, 40 / 360, 0.1]])
+
+
+class FrameDecodingTests(TestCase):
+    """Test cases for decoding frames once at every resolution"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def test_decode_frame_never_upscales(self):
+        stored, analysis, flow = decode_frame(np.zeros((2160, 3840, 3), dtype=np.uint8), 1280, 640)
+        self.assertEqual((stored.shape, analysis.shape, flow.shape), ((720, 1280, 3), (360, 640, 3), (180, 320)))
+        stored, analysis, _ = decode_frame(np.zeros((240, 320, 3), dtype=np.uint8), 1280, 640)
+        self.assertEqual((stored.shape, analysis.shape), ((240, 320, 3), (240, 320, 3)))
+
+    @override_settings(FRAME_STORAGE_SIZE=640, ANALYSIS_INPUT_SIZE=320)
+    def test_extraction_stores_and_keeps_downscaled_frames(self):
+        """Extracted frames are stored at storage size and keep their analysis images"""
+        path = os.path.join(self.media_root, 'videos', 'test.avi')
+        os.makedirs(os.path.dirname(path))
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (1280, 720))
+        for index in range(25):
+            writer.write(np.full((720, 1280, 3), index * 10, dtype=np.uint8))
+        writer.release()
+        video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.avi',
+            duration=timedelta(seconds=2.5),
+            status='processing'
+        )
+
+        with self.settings(MEDIA_ROOT=self.media_root):
+            frames = extract_video_frames(video)
+            self.assertEqual([frame.frame_number for frame in frames], [0, 10, 20])
+            stored = VideoFrame._default_manager.get(video=video, frame_number=10)
+            self.assertEqual((stored.width, stored.height), (640, 360))
+            self.assertEqual(cv2.imread(stored.image.path).shape, (360, 640, 3))
+            self.assertEqual(stored.file_size, os.path.getsize(stored.image.path))
+
+            self.assertEqual(frames[1].analysis_image.shape, (180, 320, 3))
+            self.assertEqual(frames[1].flow_image.ndim, 2)
+            model_input, letterbox = analysis_input(frames[1])
+            self.assertEqual(model_input.shape, (320, 320, 3))
+            self.assertEqual(letterbox.pad_y, 70)
+            # Frames without a decoded image are read back from their stored image
+            self.assertEqual(analysis_input(stored)[0].shape, (320, 320, 3))
@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.export import parquet_available
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.views import video_export
+
+User = get_user_model()
+
+
+class VideoExportTests(TestCase):
+    """Test cases for the columnar detection and event export"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+        for frame_number in range(3):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=frame_number,
+                timestamp=frame_number * 0.5,
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for class_name in ('car', 'person'):
+                DetectedObject.objects.create(
+                    frame=frame,
+                    class_name=class_name,
+                    confidence=0.75,
+                    bbox_x=0.1, bbox_y=0.2, bbox_width=0.3, bbox_height=0.4,
+                    track_id='track_1' if class_name == 'car' else None
+                )
+        Event.objects.create(
+            video=self.video,
+            event_type='sudden_stop',
+            title='Sudden Vehicle Stop',
+            description='A vehicle stopped suddenly',
+            severity='warning',
+            start_time=1.0,
+            confidence=0.8,
+            detected_by='test'
+        )
+
+    def get(self, path, user=None):
+        request = self.factory.get(path)
+        force_authenticate(request, user=user or self.user)
+        return video_export(request, video_id=self.video.id)
+
+    def test_npz_export(self):
+        """The NPZ archive holds typed detection and event columns"""
+        response = self.get('/export/')
+        self.assertEqual(response.status_code, 200)
+        archive = np.load(io.BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(archive['detections_bbox'].shape, (6, 4))
+        self.assertEqual(archive['detections_bbox'].dtype, np.float32)
+        self.assertEqual(list(archive['detections_timestamp']), [0.0, 0.0, 0.5, 0.5, 1.0, 1.0])
+        class_names = archive['detections_class_names'][archive['detections_class_id']]
+        self.assertEqual(sorted(class_names), ['car'] * 3 + ['person'] * 3)
+        self.assertEqual(sorted(archive['detections_track_id']), [''] * 3 + ['track_1'] * 3)
+
+        self.assertEqual(archive['events_event_types'][archive['events_event_type'][0]], 'sudden_stop')
+        self.assertTrue(np.isnan(archive['events_end_time'][0]))
+        self.assertEqual(archive['events_location'].shape, (1, 2))
+
+    def test_export_requires_ownership(self):
+        """Other users cannot export the video"""
+        other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.assertEqual(self.get('/export/', user=other).status_code, 404)
+
+    def test_parquet_requires_pyarrow(self):
+        """Parquet is refused with a 400 when pyarrow is missing"""
+        response = self.get('/export/?file_format=parquet&table=events')
+        self.assertEqual(response.status_code, 200 if parquet_available() else 400)
+
+    def test_management_command(self):
+        """The command writes the same archive to disk"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.npz')
+            call_command('export_detections', str(self.video.id), output=path, stdout=io.StringIO())
+            archive = np.load(path)
+            self.assertEqual(len(archive['detections_confidence']), 6)
+            self.assertEqual(len(archive['events_id']), 1)
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.views import VideoFramesView, VideoEventsView, VideoDetailView, VideoListView
+
+User = get_user_model()
+
+
+class SparseFieldsetTests(TestCase):
+    """Test cases for ?fields= and ?expand= on the video endpoints"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(user=self.user, title='Test Video', file='videos/test.mp4')
+        for frame_number in range(5):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=frame_number,
+                timestamp=float(frame_number),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for class_name in ('car', 'person'):
+                DetectedObject.objects.create(
+                    frame=frame,
+                    class_name=class_name,
+                    confidence=0.8,
+                    bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+                )
+        for i in range(3):
+            event = Event.objects.create(
+                video=self.video,
+                event_type='vehicle_movement',
+                title='Vehicle Movement Detected',
+                description='A vehicle moved',
+                start_time=float(i),
+                end_time=float(i) + 1.5,
+                confidence=0.9,
+                detected_by='test'
+            )
+            event.related_objects.set(DetectedObject.objects.all()[:2])
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request, **kwargs)
+
+    def test_frame_fields_without_detections(self):
+        """Frames limited to ids and timestamps skip the detection prefetch"""
+        with self.assertNumQueries(2):
+            response = self.get(VideoFramesView, '/frames/?fields=id,timestamp', video_id=self.video.id)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'timestamp'})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_nested_fields(self):
+        """Dotted names select fields of the embedded detections"""
+        with self.assertNumQueries(3):
+            response = self.get(
+                VideoFramesView, '/frames/?fields=id,objects.class_name', video_id=self.video.id
+            )
+        frame = response.data['results'][0]
+        self.assertEqual(set(frame), {'id', 'objects'})
+        self.assertEqual([set(obj) for obj in frame['objects']], [{'class_name'}] * 2)
+
+    def test_expand(self):
+        """An empty expand drops every expandable relation but keeps other fields"""
+        with self.assertNumQueries(2):
+            response = self.get(VideoEventsView, '/events/?expand=', video_id=self.video.id)
+        event = response.data['results'][0]
+        self.assertNotIn('related_objects', event)
+        self.assertEqual(event['duration_display'], '1.50s')
+
+    def test_method_field_columns(self):
+        """Method fields load the columns they declare, without extra queries"""
+        with self.assertNumQueries(2):
+            response = self.get(
+                VideoEventsView, '/events/?fields=id,duration_display', video_id=self.video.id
+            )
+        self.assertEqual(response.data['results'][0]['duration_display'], '1.50s')
+
+    def test_detail_and_list(self):
+        """Video detail and list views only fetch what is selected"""
+        with self.assertNumQueries(1):
+            response = self.get(VideoDetailView, '/?fields=id,title', pk=self.video.id)
+        self.assertEqual(response.data, {'id': str(self.video.id), 'title': 'Test Video'})
+
+        with self.assertNumQueries(2):
+            response = self.get(
+                VideoDetailView, '/?fields=id,events.title&expand=events', pk=self.video.id
+            )
+        self.assertEqual(response.data['events'][0], {'title': 'Vehicle Movement Detected'})
+
+        response = self.get(VideoListView, '/?fields=id,events_count')
+        self.assertEqual(response.data['results'], [{'id': str(self.video.id), 'events_count': 3}])
@@ -0,0 +1,88 @@
+import threading
+import time
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from videos.inference import (
+    MockObjectDetector, clear_models, get_model, model_stats, preload_models
+)
+
+LOADS = []
+
+
+class CountingModel:
+    """Test model recording every load"""
+
+    def __init__(self):
+        time.sleep(0.01)
+        LOADS.append(self)
+
+    def memory_bytes(self):
+        return 1024
+
+
+def model_config(**versions):
+    return {
+        name: {'loader': f'{__name__}.CountingModel', 'version': version}
+        for name, version in versions.items()
+    }
+
+
+class ModelRegistryTests(TestCase):
+    """Test cases for the worker-resident model registry"""
+
+    def setUp(self):
+        LOADS.clear()
+        clear_models()
+        self.addCleanup(clear_models)
+
+    def test_models_load_once(self):
+        with self.settings(VIDEO_MODELS=model_config(detector='v1')):
+            model = get_model('detector')
+            self.assertIs(get_model('detector'), model)
+        self.assertEqual(len(LOADS), 1)
+
+        stats = model_stats()
+        self.assertEqual([(entry['name'], entry['version']) for entry in stats], [('detector', 'v1')])
+        self.assertEqual(stats[0]['uses'], 2)
+        self.assertEqual(stats[0]['memory_bytes'], 1024)
+        self.assertGreater(stats[0]['load_seconds'], 0)
+
+    def test_new_version_is_loaded(self):
+        with self.settings(VIDEO_MODELS=model_config(detector='v1')):
+            first = get_model('detector')
+        with self.settings(VIDEO_MODELS=model_config(detector='v2')):
+            self.assertIsNot(get_model('detector'), first)
+        self.assertEqual(len(LOADS), 2)
+
+    @override_settings(MODEL_CACHE_SIZE=2, VIDEO_MODELS=model_config(a='1', b='1', c='1'))
+    def test_least_recently_used_model_is_evicted(self):
+        get_model('a')
+        get_model('b')
+        get_model('a')
+        get_model('c')
+        self.assertEqual([entry['name'] for entry in model_stats()], ['a', 'c'])
+        get_model('b')
+        self.assertEqual(len(LOADS), 4)
+
+    @override_settings(VIDEO_MODELS=model_config(detector='v1'))
+    def test_concurrent_first_use_loads_once(self):
+        models = []
+        threads = [threading.Thread(target=lambda: models.append(get_model('detector'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(LOADS), 1)
+        self.assertTrue(all(model is LOADS[0] for model in models))
+
+    @override_settings(VIDEO_MODELS=model_config(detector='v1'), VIDEO_MODELS_PRELOAD=['detector'])
+    def test_preload_on_worker_start(self):
+        preload_models()
+        self.assertEqual(len(LOADS), 1)
+        get_model('detector')
+        self.assertEqual(len(LOADS), 1)
+
+    def test_defaults_and_unknown_names(self):
+        self.assertIsInstance(get_model('object_detector'), MockObjectDetector)
+        with self.assertRaises(ImproperlyConfigured):
+            get_model('segmenter')
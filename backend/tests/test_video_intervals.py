@@ -0,0 +1,125 @@
+import random
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, Event
+from videos.intervals import IntervalTree, clear_event_trees
+from videos.views import VideoEventsView, video_active_events
+
+User = get_user_model()
+
+
+class IntervalTreeTests(TestCase):
+    """Test cases for the centered interval tree"""
+
+    def test_matches_brute_force(self):
+        """Stabbing and overlap queries agree with a linear scan"""
+        rng = random.Random(0)
+        spans = []
+        for index in range(500):
+            start = rng.uniform(0, 100)
+            spans.append((start, start + rng.choice([0.0, rng.uniform(0, 10), rng.uniform(0, 60)]), index))
+        tree = IntervalTree(spans)
+
+        for _ in range(200):
+            time = rng.uniform(-5, 110)
+            expected = {index for start, end, index in spans if start <= time <= end}
+            self.assertEqual(set(tree.at(time)), expected)
+
+            low, high = sorted((rng.uniform(-5, 110), rng.uniform(-5, 110)))
+            expected = {index for start, end, index in spans if start <= high and end >= low}
+            found = tree.overlapping(low, high)
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(set(found), expected)
+
+    def test_empty_tree(self):
+        tree = IntervalTree([])
+        self.assertEqual(tree.at(1.0), [])
+        self.assertEqual(tree.overlapping(0.0, 10.0), [])
+
+
+class EventTimeQueryTests(TestCase):
+    """Test cases for the event time range and playback queries"""
+
+    def setUp(self):
+        clear_event_trees()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=120),
+            status='completed'
+        )
+        self.long = self.create_event('long', 10.0, end_time=80.0)
+        self.short = self.create_event('short', 40.0, end_time=45.0)
+        self.open = self.create_event('open', 50.0, duration=5.0)
+        self.late = self.create_event('late', 90.0, end_time=95.0)
+
+    def create_event(self, event_type, start_time, end_time=None, duration=None):
+        return Event.objects.create(
+            video=self.video,
+            event_type=event_type,
+            title='Test Event',
+            description='Test',
+            start_time=start_time,
+            end_time=end_time,
+            duration=duration,
+            confidence=0.9,
+            detected_by='test_detector'
+        )
+
+    def list_events(self, **params):
+        request = self.factory.get(f'/api/v1/videos/{self.video.id}/events/', params)
+        force_authenticate(request, user=self.user)
+        response = VideoEventsView.as_view()(request, video_id=self.video.id)
+        return [event['event_type'] for event in response.data['results']]
+
+    def active_events(self, user=None, **params):
+        request = self.factory.get(f'/api/v1/videos/{self.video.id}/events/active/', params)
+        force_authenticate(request, user=user or self.user)
+        return video_active_events(request, video_id=self.video.id)
+
+    def test_events_list_time_filters(self):
+        """The events list answers activity and overlap queries"""
+        self.assertEqual(self.list_events(at='42'), ['long', 'short'])
+        self.assertEqual(self.list_events(at='54'), ['long', 'open'])
+        self.assertEqual(self.list_events(overlaps='81,92'), ['late'])
+        self.assertEqual(self.list_events(overlaps='0,9'), [])
+
+    def test_active_events(self):
+        """Playback queries are answered from the interval tree"""
+        response = self.active_events(at='42')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event['event_type'] for event in response.data['events']], ['long', 'short'])
+
+        response = self.active_events(overlaps='52,91')
+        self.assertEqual(
+            [event['event_type'] for event in response.data['events']], ['long', 'open', 'late']
+        )
+
+        # A cached tree answers without any query
+        with self.assertNumQueries(0):
+            self.active_events(at='43')
+
+    def test_active_events_follow_event_changes(self):
+        """The tree is rebuilt once the video's events change"""
+        self.active_events(at='42')
+        self.short.delete()
+        response = self.active_events(at='42')
+        self.assertEqual([event['event_type'] for event in response.data['events']], ['long'])
+
+    def test_active_events_validation(self):
+        self.assertEqual(self.active_events().status_code, 400)
+        self.assertEqual(self.active_events(at='soon').status_code, 400)
+        self.assertEqual(self.active_events(overlaps='9,1').status_code, 400)
+
+        other = User.objects.create_user(username='other', email='other@example.com', password='x')
+        self.active_events(at='42')
+        self.assertEqual(self.active_events(user=other, at='42').status_code, 404)
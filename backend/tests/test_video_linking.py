@@ -0,0 +1,117 @@
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.linking import covered_frames, event_frame_ranges, link_video_events
+from videos.views import VideoFramesView
+
+User = get_user_model()
+
+
+class EventLinkingTests(TestCase):
+    """Test cases for linking events to the frames and detections they cover"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=10),
+            status='completed'
+        )
+        self.frames = [
+            VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=True
+            )
+            for second in range(10)
+        ]
+        self.detections = {
+            (frame.timestamp, track_id): DetectedObject.objects.create(
+                frame=frame,
+                class_name='car',
+                confidence=0.9,
+                bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2,
+                track_id=track_id
+            )
+            for frame in self.frames
+            for track_id in ('car_1', 'car_2')
+        }
+
+    def create_event(self, start_time, end_time=None, duration=None, metadata=None):
+        return Event.objects.create(
+            video=self.video,
+            event_type='vehicle_movement',
+            title='Test Event',
+            description='Test',
+            start_time=start_time,
+            end_time=end_time,
+            duration=duration,
+            confidence=0.8,
+            detected_by='test_detector',
+            metadata=metadata or {}
+        )
+
+    def test_frame_ranges(self):
+        """Each interval covers the run of frames inside it, ends included"""
+        timestamps = np.arange(10, dtype=np.float64)
+        first, last = event_frame_ranges(np.array([1.5, 4.0, 9.5]), np.array([3.0, 4.0, 12.0]), timestamps)
+        self.assertEqual(first.tolist(), [2, 4, 10])
+        self.assertEqual(last.tolist(), [4, 5, 10])
+        self.assertEqual(
+            np.flatnonzero(covered_frames(first, last, len(timestamps))).tolist(), [2, 3, 4]
+        )
+
+    def test_link_frames_and_detections(self):
+        """Covered frames are flagged and linked to the event's detections"""
+        movement = self.create_event(1.5, 3.0)
+        stop = self.create_event(6.0, duration=1.0, metadata={'track_id': 'car_2'})
+        VideoFrame._default_manager.filter(timestamp=9.0).update(has_events=True)
+
+        self.assertEqual(link_video_events(self.video), 6)
+
+        flagged = VideoFrame._default_manager.filter(video=self.video, has_events=True)
+        self.assertEqual(
+            sorted(flagged.values_list('timestamp', flat=True)), [2.0, 3.0, 6.0, 7.0]
+        )
+        self.assertEqual(
+            set(movement.related_objects.all()),
+            {self.detections[(time, track)] for time in (2.0, 3.0) for track in ('car_1', 'car_2')}
+        )
+        self.assertEqual(
+            set(stop.related_objects.all()),
+            {self.detections[(6.0, 'car_2')], self.detections[(7.0, 'car_2')]}
+        )
+
+        # Linking again adds nothing
+        link_video_events(self.video)
+        self.assertEqual(movement.related_objects.count(), 4)
+
+    def test_frames_of_event(self):
+        """The frames endpoint narrows to the frames of an event"""
+        event = self.create_event(4.0, 5.0)
+        link_video_events(self.video)
+
+        def frames(event_id):
+            request = self.factory.get(f'/api/v1/videos/{self.video.id}/frames/', {'event': event_id})
+            force_authenticate(request, user=self.user)
+            return VideoFramesView.as_view()(request, video_id=self.video.id)
+
+        response = frames(str(event.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([frame['timestamp'] for frame in response.data['results']], [4.0, 5.0])
+        self.assertEqual(frames('not-a-uuid').status_code, 400)
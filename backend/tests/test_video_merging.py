@@ -0,0 +1,97 @@
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.merging import cluster_intervals, merge_video_events
+
+User = get_user_model()
+
+
+class EventMergingTests(TestCase):
+    """Test cases for the temporal merging of duplicate events"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=60),
+            status='processing'
+        )
+        self.frame = VideoFrame._default_manager.create(
+            video=self.video,
+            frame_number=0,
+            timestamp=0.0,
+            image='frames/test.jpg',
+            width=640,
+            height=480,
+            file_size=1024,
+            has_objects=True
+        )
+
+    def create_event(self, event_type, start_time, end_time, confidence=0.8, severity='info', objects=()):
+        event = Event.objects.create(
+            video=self.video,
+            event_type=event_type,
+            title='Test Event',
+            description='Test',
+            severity=severity,
+            start_time=start_time,
+            end_time=end_time,
+            confidence=confidence,
+            detected_by='test_detector'
+        )
+        event.related_objects.set(objects)
+        return event
+
+    def create_detection(self, class_name):
+        return DetectedObject.objects.create(
+            frame=self.frame,
+            class_name=class_name,
+            confidence=0.9,
+            bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+        )
+
+    def test_cluster_intervals(self):
+        """Clusters follow the furthest end seen, and restart with each group"""
+        labels = cluster_intervals(
+            groups=np.array([0, 0, 0, 0, 1]),
+            starts=np.array([0.0, 1.0, 6.0, 9.5, 9.6]),
+            ends=np.array([8.0, 2.0, 7.0, 10.0, 11.0]),
+            gap=1.0
+        )
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 2])
+
+    def test_overlapping_events_are_merged(self):
+        """The most confident event absorbs its duplicates and their objects"""
+        car, truck = self.create_detection('car'), self.create_detection('truck')
+        self.create_event('sudden_stop', 1.0, 3.0, confidence=0.7, objects=[car])
+        keeper = self.create_event('sudden_stop', 2.5, 4.0, confidence=0.9, severity='warning')
+        self.create_event('sudden_stop', 4.5, 6.0, confidence=0.6, objects=[car, truck])
+        other_type = self.create_event('vehicle_movement', 2.0, 5.0)
+        later = self.create_event('sudden_stop', 20.0, 21.0)
+
+        self.assertEqual(merge_video_events(self.video, gap=1.0), 2)
+
+        self.assertEqual(
+            set(self.video.events.values_list('id', flat=True)), {keeper.id, other_type.id, later.id}
+        )
+        keeper.refresh_from_db()
+        self.assertEqual((keeper.start_time, keeper.end_time, keeper.duration), (1.0, 6.0, 5.0))
+        self.assertEqual(keeper.confidence, 0.9)
+        self.assertEqual(keeper.severity, 'warning')
+        self.assertEqual(keeper.metadata['merged_events'], 3)
+        self.assertEqual(set(keeper.related_objects.all()), {car, truck})
+
+    def test_nothing_to_merge(self):
+        """Separate events are left untouched"""
+        self.create_event('sudden_stop', 1.0, 2.0)
+        self.create_event('sudden_stop', 5.0, 6.0)
+        self.assertEqual(merge_video_events(self.video, gap=1.0), 0)
+        self.assertEqual(self.video.events.count(), 2)
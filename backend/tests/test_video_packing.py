@@ -0,0 +1,141 @@
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, DetectedObject
+from videos.export import detection_table
+from videos.packing import (
+    PACKED_DETECTION, DetectionVocabulary, count_detections, pack_detections, unpack_detections
+)
+from videos.classmasks import build_frame_class_index
+from videos.snapshots import build_snapshot_document
+from videos.tasks import perform_object_detection
+from videos.views import VideoFramesView
+
+User = get_user_model()
+
+
+def box(class_name, confidence, x=0.1, track_id=None):
+    return {
+        'class_name': class_name, 'confidence': confidence,
+        'bbox_x': x, 'bbox_y': 0.2, 'bbox_width': 0.25, 'bbox_height': 0.5,
+        'track_id': track_id,
+    }
+
+
+class PackedDetectionTests(TestCase):
+    """Test cases for the packed storage of per-frame detections"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=10),
+            status='completed'
+        )
+
+    def create_frame(self, second, packed=None):
+        return VideoFrame._default_manager.create(
+            video=self.video,
+            frame_number=second * 30,
+            timestamp=float(second),
+            image='frames/test.jpg',
+            width=640,
+            height=480,
+            file_size=1024,
+            has_objects=True,
+            packed_detections=packed
+        )
+
+    def create_packed_frames(self):
+        vocabulary = DetectionVocabulary()
+        self.create_frame(1, pack_detections([box('car', 0.6, track_id='car_1'), box('person', 0.9)], vocabulary))
+        self.create_frame(3, pack_detections([box('car', 0.8, x=0.3, track_id='car_1')], vocabulary))
+        self.video.packed_vocabulary = vocabulary.as_json()
+        self.video.save()
+
+    def test_pack_round_trip(self):
+        """Records are fixed-width and keep their values"""
+        vocabulary = DetectionVocabulary({'classes': ['person'], 'tracks': []})
+        data = pack_detections([box('car', 0.5, track_id='car_7'), box('person', 0.75)], vocabulary)
+        self.assertEqual(len(data), 2 * PACKED_DETECTION.itemsize)
+        self.assertEqual(vocabulary.as_json(), {'classes': ['person', 'car'], 'tracks': ['car_7']})
+
+        records = unpack_detections(data)
+        self.assertEqual(records['class_id'].tolist(), [1, 0])
+        self.assertEqual(records['track'].tolist(), [0, -1])
+        np.testing.assert_allclose(records['bbox'][0], [0.1, 0.2, 0.25, 0.5])
+        np.testing.assert_allclose(records['confidence'], [0.5, 0.75])
+
+    def test_frames_endpoint_decodes_packed_detections(self):
+        """Packed frames list their detections like rows, filters included"""
+        self.create_packed_frames()
+        row_frame = self.create_frame(2)
+        DetectedObject.objects.create(
+            frame=row_frame, class_name='bus', confidence=0.7,
+            bbox_x=0.5, bbox_y=0.5, bbox_width=0.1, bbox_height=0.1
+        )
+
+        def frames(**params):
+            request = self.factory.get(f'/api/v1/videos/{self.video.id}/frames/', params)
+            force_authenticate(request, user=self.user)
+            response = VideoFramesView.as_view()(request, video_id=self.video.id)
+            self.assertEqual(response.status_code, 200)
+            return response.data['results']
+
+        results = frames()
+        self.assertEqual(
+            [[obj['class_name'] for obj in frame['objects']] for frame in results],
+            [['person', 'car'], ['bus'], ['car']]
+        )
+        packed_car = results[0]['objects'][1]
+        self.assertIsNone(packed_car['id'])
+        self.assertEqual(packed_car['track_id'], 'car_1')
+        self.assertAlmostEqual(packed_car['confidence'], 0.6, places=6)
+
+        results = frames(min_confidence='0.7', fields='timestamp,objects.class_name')
+        self.assertEqual(
+            [[obj['class_name'] for obj in frame['objects']] for frame in results],
+            [['person'], ['bus'], ['car']]
+        )
+
+    def test_readers_combine_both_storages(self):
+        """Columnar readers, class indexes and counts include packed detections"""
+        self.create_packed_frames()
+        row_frame = self.create_frame(2)
+        DetectedObject.objects.create(
+            frame=row_frame, class_name='car', confidence=0.7,
+            bbox_x=0.2, bbox_y=0.2, bbox_width=0.25, bbox_height=0.5, track_id='car_1'
+        )
+
+        table = detection_table(self.video)
+        self.assertEqual(table['timestamp'].tolist(), [1.0, 1.0, 2.0, 3.0])
+        self.assertEqual(table['track_id'].tolist(), ['car_1', '', 'car_1', 'car_1'])
+        class_names = [str(table['class_names'][code]) for code in table['class_id']]
+        self.assertEqual(class_names, ['car', 'person', 'car', 'car'])
+
+        self.assertEqual(count_detections(self.video), 4)
+        self.assertEqual(build_frame_class_index(self.video), ['car', 'person'])
+        frame = VideoFrame._default_manager.get(video=self.video, timestamp=1.0)
+        self.assertEqual(frame.class_counts, {'car': 1, 'person': 1})
+        self.assertEqual(build_snapshot_document(self.video)['class_counts'], {'car': 3, 'person': 1})
+
+    @override_settings(DETECTION_STORAGE='packed')
+    def test_detection_stage_writes_packed_frames(self):
+        """In packed storage the detection stage creates no rows"""
+        frames = [self.create_frame(second) for second in range(5)]
+        perform_object_detection(self.video, frames)
+
+        self.assertFalse(DetectedObject.objects.filter(frame__video=self.video).exists())
+        self.video.refresh_from_db()
+        total = sum(sum(frame.class_counts.values()) for frame in frames)
+        self.assertEqual(count_detections(self.video), total)
+        self.assertEqual(sorted(self.video.packed_vocabulary['classes']), sorted(self.video.class_vocabulary))
@@ -0,0 +1,105 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject
+from videos.views import VideoFramesView, VideoEventsView, VideoDetailView
+
+User = get_user_model()
+
+
+class VideoEndpointQueryTests(TestCase):
+    """Query counts of the video endpoints must not depend on page size"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4'
+        )
+
+    def create_frames(self, count, objects_per_frame=3):
+        for frame_number in range(count):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=frame_number,
+                timestamp=float(frame_number),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for i in range(objects_per_frame):
+                DetectedObject.objects.create(
+                    frame=frame,
+                    class_name='car' if i % 2 else 'person',
+                    confidence=0.5 + i * 0.1,
+                    bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+                )
+
+    def get(self, view, path, **kwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        return view.as_view()(request, **kwargs)
+
+    def test_frames_page_query_count(self):
+        """A frames page costs count + frames + detections queries"""
+        self.create_frames(15)
+        with self.assertNumQueries(3):
+            response = self.get(VideoFramesView, '/frames/', video_id=self.video.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 15)
+        self.assertEqual(len(response.data['results'][0]['objects']), 3)
+
+    def test_frames_detection_filters(self):
+        """Confidence and class filters are applied inside the prefetch"""
+        self.create_frames(2)
+        response = self.get(
+            VideoFramesView, '/frames/?min_confidence=0.55&classes=car',
+            video_id=self.video.id
+        )
+        objects = response.data['results'][0]['objects']
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(objects[0]['class_name'], 'car')
+
+    def test_frames_unknown_video(self):
+        """An empty page for a video the user does not own is a 404"""
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123'
+        )
+        video = Video.objects.create(user=other, title='Other', file='videos/o.mp4')
+        response = self.get(VideoFramesView, '/frames/', video_id=video.id)
+        self.assertEqual(response.status_code, 404)
+
+    def test_events_and_detail_query_count(self):
+        """Event related objects are prefetched for lists and the detail view"""
+        self.create_frames(1, objects_per_frame=2)
+        for i in range(12):
+            event = Event.objects.create(
+                video=self.video,
+                event_type='vehicle_movement',
+                title='Vehicle Movement Detected',
+                description='A vehicle moved',
+                start_time=float(i),
+                end_time=float(i) + 1,
+                confidence=0.9,
+                detected_by='test'
+            )
+            event.related_objects.set(DetectedObject.objects.all())
+
+        with self.assertNumQueries(3):
+            response = self.get(VideoEventsView, '/events/', video_id=self.video.id)
+        self.assertEqual(len(response.data['results']), 12)
+
+        with self.assertNumQueries(3):
+            response = self.get(VideoDetailView, '/', pk=self.video.id)
+        self.assertEqual(len(response.data['events']), 10)
+        self.assertEqual(len(response.data['events'][0]['related_objects']), 2)
+        self.assertEqual(response.data['frames_count'], 1)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from analytics.models import AnalysisSession
+from videos.models import Video, Event
+from videos.results import aggregate_event_counts
+from videos.tasks import complete_analysis_session, generate_summary_events
+
+User = get_user_model()
+
+
+class VideoResultsTests(TestCase):
+    """Test cases for the aggregated results of an analysis run"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='completed'
+        )
+
+    def create_event(self, event_type, severity, is_violation=False, detected_by='test_detector'):
+        return Event.objects.create(
+            video=self.video,
+            event_type=event_type,
+            title='Test Event',
+            description='Test',
+            severity=severity,
+            start_time=2.0,
+            end_time=4.0,
+            confidence=0.9,
+            is_violation=is_violation,
+            detected_by=detected_by
+        )
+
+    def test_aggregate_event_counts_uses_one_query(self):
+        """Totals and breakdowns come from a single grouped query"""
+        self.create_event('speeding', 'violation', is_violation=True)
+        self.create_event('speeding', 'violation', is_violation=True, detected_by='speed_detector')
+        self.create_event('vehicle_detected', 'info')
+
+        with self.assertNumQueries(1):
+            counts = aggregate_event_counts(self.video)
+
+        self.assertEqual(counts['events_total'], 3)
+        self.assertEqual(counts['violations_total'], 2)
+        self.assertEqual(counts['by_type'], {'speeding': 2, 'vehicle_detected': 1})
+        self.assertEqual(counts['by_severity'], {'violation': 2, 'info': 1})
+        self.assertEqual(counts['by_detector'], {'test_detector': 2, 'speed_detector': 1})
+
+    def test_summary_event_does_not_count_events(self):
+        """The summary event is created from the counts without reading events"""
+        self.create_event('speeding', 'violation', is_violation=True)
+        self.create_event('vehicle_detected', 'info')
+        counts = aggregate_event_counts(self.video)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = generate_summary_events(self.video, counts)
+
+        event_table = Event._meta.db_table
+        reads = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and f'FROM "{event_table}"' in query['sql']
+        ]
+        self.assertEqual(reads, [])
+        self.assertEqual(summary.title, 'Analysis Complete: 1 Violations Found')
+        self.assertEqual(counts['events_total'], 3)
+        self.assertEqual(counts['by_type']['summary'], 1)
+        self.assertEqual(counts, aggregate_event_counts(self.video))
+
+    def test_no_summary_without_violations(self):
+        """Videos without violations get no summary event"""
+        self.create_event('vehicle_detected', 'info')
+        self.assertIsNone(generate_summary_events(self.video))
+        self.assertEqual(self.video.events.count(), 1)
+
+    def test_complete_analysis_session(self):
+        """Session totals are filled from the aggregated counts"""
+        self.create_event('speeding', 'violation', is_violation=True)
+        self.video.processing_started_at = self.video.uploaded_at
+        self.video.processing_completed_at = self.video.uploaded_at + timedelta(seconds=12)
+        session = AnalysisSession.objects.create(
+            user=self.user, video=self.video, status='in_progress'
+        )
+
+        complete_analysis_session(session, self.video, [None] * 5, aggregate_event_counts(self.video))
+
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+        self.assertEqual(session.total_events_detected, 1)
+        self.assertEqual(session.total_violations_detected, 1)
+        self.assertEqual(session.total_objects_detected, 0)
+        self.assertEqual(session.frames_processed, 5)
+        self.assertEqual(session.processing_time, timedelta(seconds=12))
@@ -0,0 +1,98 @@
+import random
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+from videos.models import Video, VideoFrame, DetectedObject
+from videos.decoding import LETTERBOX_FILL, Letterbox, decode_frame
+from videos.roi import region_of_interest
+from videos.rules import RuleError
+from videos.serializers import check_custom_rules
+from videos.tasks import perform_object_detection
+
+User = get_user_model()
+
+LANE = [[0.5, 0.5], [1.0, 0.5], [1.0, 1.0]]
+
+
+class RegionOfInterestTests(TestCase):
+    """Test cases for regions of interest parsed from custom rules"""
+
+    def test_parse(self):
+        self.assertIsNone(region_of_interest({'rules': []}))
+        self.assertIsNone(region_of_interest(None))
+        roi = region_of_interest({'roi': {'polygons': [LANE], 'mode': 'mask'}})
+        self.assertEqual((roi.bounds, roi.mode), ((0.5, 0.5, 1.0, 1.0), 'mask'))
+        self.assertEqual(roi.crop_box(1920, 1080), (960, 540, 1920, 1080))
+        self.assertEqual(roi.contains([[0.9, 0.6], [0.6, 0.9]]).tolist(), [True, False])
+
+    def test_invalid_roi_is_rejected(self):
+        for spec in ([LANE], {'polygons': []}, {'polygons': [[[0, 0], [1, 1]]]},
+                     {'polygons': [LANE], 'mode': 'blur'}):
+            with self.assertRaises(RuleError):
+                region_of_interest({'roi': spec})
+        with self.assertRaises(serializers.ValidationError):
+            check_custom_rules({'roi': {'polygons': 'lane'}})
+
+    def test_letterbox_maps_region_boxes_to_full_frame(self):
+        """Boxes in input pixels of a cropped region come back in full-frame coordinates"""
+        roi = region_of_interest({'roi': {'polygons': [LANE]}})
+        letterbox = Letterbox.fit(1920, 1080, 640, roi)
+        self.assertEqual((letterbox.width, letterbox.height, letterbox.region), (640, 360, (0.5, 0.5, 1.0, 1.0)))
+        np.testing.assert_allclose(letterbox.to_normalized([[0, 140, 320, 180]]), [[0.5, 0.5, 0.25, 0.25]])
+        boxes = np.array([[0.6, 0.7, 0.1, 0.2]])
+        np.testing.assert_allclose(letterbox.to_normalized(letterbox.to_input(boxes)), boxes)
+
+    def test_decode_frame_crops_and_masks_the_region(self):
+        roi = region_of_interest({'roi': {'polygons': [LANE], 'mode': 'mask'}})
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        stored, analysis, flow = decode_frame(frame, 1280, 640, roi)
+        self.assertEqual((stored.shape, analysis.shape, flow.shape), ((720, 1280, 3), (360, 640, 3), (180, 320)))
+        # Below the diagonal of the lane triangle is masked, above it is kept
+        self.assertEqual(analysis[300, 20].tolist(), [LETTERBOX_FILL] * 3)
+        self.assertEqual(analysis[20, 600].tolist(), [0, 0, 0])
+
+
+class RegionOfInterestDetectionTests(TestCase):
+    """Test cases for detection restricted to a region of interest"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='processing',
+            custom_rules={'roi': {'polygons': [LANE]}}
+        )
+
+    def test_detections_outside_the_region_are_not_stored(self):
+        frames = [
+            VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=1280,
+                height=720,
+                file_size=1024
+            )
+            for second in range(30)
+        ]
+        random.seed(0)
+        perform_object_detection(self.video, frames)
+
+        detections = DetectedObject.objects.filter(frame__video=self.video)
+        self.assertTrue(detections.exists())
+        centers = [
+            (obj.bbox_x + obj.bbox_width / 2, obj.bbox_y + obj.bbox_height / 2) for obj in detections
+        ]
+        self.assertTrue(all(x >= 0.5 and y >= 0.5 and y <= x for x, y in centers))
+        for frame in frames:
+            self.assertEqual(frame.has_objects, detections.filter(frame=frame).exists())
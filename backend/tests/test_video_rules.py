@@ -0,0 +1,131 @@
+import numpy as np
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from videos.models import Video, VideoFrame, DetectedObject
+from videos.rules import DetectionArrays, RuleError, compile_rules, points_in_polygon
+from videos.serializers import VideoAnalysisRequestSerializer
+from videos.tasks import check_guideline_adherence
+
+User = get_user_model()
+
+ROAD = [[0.0, 0.5], [1.0, 0.5], [1.0, 1.0], [0.0, 1.0]]
+
+
+class RuleCompilationTests(TestCase):
+    """Test cases for compiling custom rules"""
+
+    def test_rule_sets_are_cached_by_content(self):
+        """Documents with the same content share one compiled rule set"""
+        first = compile_rules({'rules': [{'type': 'speed_limit', 'max_speed': 0.5, 'name': 'Limit'}]})
+        second = compile_rules({'rules': [{'name': 'Limit', 'max_speed': 0.5, 'type': 'speed_limit'}]})
+        self.assertIs(first, second)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(compile_rules({})), 0)
+
+    def test_invalid_rules_are_rejected(self):
+        """Malformed rules raise RuleError and fail request validation"""
+        for custom_rules in (
+            {'rules': [{'type': 'teleport'}]},
+            {'rules': [{'type': 'zone', 'polygon': [[0, 0], [1, 1]]}]},
+            {'rules': [{'type': 'speed_limit'}]},
+            {'rules': [{'type': 'time_window', 'start': 10, 'end': 5}]},
+        ):
+            with self.assertRaises(RuleError):
+                compile_rules(custom_rules)
+
+        serializer = VideoAnalysisRequestSerializer(data={
+            'analysis_types': ['guideline_adherence'],
+            'custom_rules': {'rules': [{'type': 'allowed_classes'}]}
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('custom_rules', serializer.errors)
+
+    def test_points_in_polygon(self):
+        """The even-odd test handles points on either side of every edge"""
+        triangle = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+        points = np.array([[0.2, 0.2], [0.8, 0.8], [-0.1, 0.5], [0.4, 0.4]])
+        self.assertEqual(points_in_polygon(points, triangle).tolist(), [True, False, False, True])
+
+    def test_rules_over_arrays(self):
+        """Every rule type is evaluated over the detection columns at once"""
+        arrays = DetectionArrays(
+            timestamp=[0.0, 1.0, 2.0, 0.0, 5.0],
+            class_id=[0, 0, 0, 1, 1],
+            class_names=['car', 'person'],
+            confidence=[0.9, 0.9, 0.9, 0.8, 0.4],
+            center=[[0.1, 0.1], [0.3, 0.1], [0.9, 0.1], [0.5, 0.8], [0.5, 0.8]],
+            track_ids=['a', 'a', 'a', 'b', '']
+        )
+        np.testing.assert_allclose(arrays.speed[:3], [np.nan, 0.2, 0.6])
+        rules = compile_rules({'violation_threshold': 0.5, 'rules': [
+            {'type': 'zone', 'polygon': ROAD, 'classes': ['person']},
+            {'type': 'allowed_classes', 'allowed': ['car']},
+            {'type': 'time_window', 'start': 1.5, 'mode': 'allowed'},
+        ]}).rules
+        masks = [rule.evaluate(arrays).tolist() for rule in rules]
+        self.assertEqual(masks, [
+            [False, False, False, True, False],
+            [False, False, False, True, False],
+            [True, True, False, True, False],
+        ])
+
+
+class GuidelineAdherenceTests(TestCase):
+    """Test cases for the guideline checker of the pipeline"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='processing'
+        )
+        for second in range(10):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=True
+            )
+            # A pedestrian walks onto the road for seconds 3 to 6
+            on_road = 3 <= second <= 6
+            DetectedObject.objects.create(
+                frame=frame,
+                class_name='person',
+                confidence=0.9,
+                bbox_x=0.4, bbox_y=0.6 if on_road else 0.1, bbox_width=0.1, bbox_height=0.2,
+                track_id='track_1'
+            )
+
+    def test_zone_violation_events(self):
+        """Consecutive violating detections of a track become one event"""
+        self.video.custom_rules = {'rules': [
+            {'name': 'No pedestrians on the road', 'type': 'zone', 'polygon': ROAD, 'classes': ['person']}
+        ]}
+
+        events = check_guideline_adherence(self.video)
+
+        self.assertEqual(len(events), 1)
+        event = self.video.events.get()
+        self.assertEqual(event.event_type, 'zone_violation')
+        self.assertTrue(event.is_violation)
+        self.assertEqual((event.start_time, event.end_time), (3.0, 6.0))
+        self.assertEqual(event.guideline_reference, 'No pedestrians on the road')
+        self.assertEqual(event.metadata['track_id'], 'track_1')
+        self.assertEqual(event.metadata['detections'], 4)
+
+    def test_no_rules_no_violations(self):
+        """Videos without custom rules get no violations"""
+        self.assertEqual(check_guideline_adherence(self.video), [])
+        self.assertFalse(self.video.events.exists())
@@ -0,0 +1,180 @@
+import json
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from chat.models import Conversation, Message
+from videos.models import Video, Event, SearchEntry, VideoTimeline
+from videos.signals import deferred_invalidation
+from videos.timeline import build_video_timeline
+from videos.views import search_videos, search_all
+
+User = get_user_model()
+
+
+class VideoSearchTests(TestCase):
+    """Test cases for the video search endpoint"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        for i in range(5):
+            video = Video.objects.create(
+                user=self.user,
+                title=f'Intersection {i}',
+                description='Traffic camera footage',
+                file=f'videos/{i}.mp4',
+                analysis_types=['object_detection'] + (['guideline_adherence'] if i % 2 else [])
+            )
+            if i % 2:
+                Event.objects.create(
+                    video=video,
+                    event_type='speed_violation',
+                    title='Speed Limit Violation',
+                    description='Vehicle exceeded speed limit',
+                    start_time=1.0,
+                    confidence=0.9,
+                    detected_by='guideline_checker',
+                    is_violation=True
+                )
+
+    def search(self, data, path='/search/'):
+        request = self.factory.post(path, data, format='json')
+        force_authenticate(request, user=self.user)
+        return search_videos(request)
+
+    def test_keyset_pages(self):
+        """Pages follow each other through the cursor without overlap"""
+        response = self.search({}, path='/search/?page_size=2')
+        first = [video['id'] for video in response.data['videos']]
+        self.assertEqual(len(first), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        seen = list(first)
+        next_link = response.data['next']
+        while next_link:
+            response = self.search({}, path=next_link)
+            seen.extend(video['id'] for video in response.data['videos'])
+            next_link = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_violation_and_analysis_type_filters(self):
+        """Violation and analysis type filters use EXISTS conditions"""
+        response = self.search({'has_violations': True})
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(all(video['violations_count'] == 1 for video in response.data['videos']))
+
+        response = self.search({'has_violations': False})
+        self.assertEqual(response.data['count'], 3)
+
+        response = self.search({'analysis_types': ['guideline_adherence']})
+        self.assertEqual(response.data['count'], 2)
+
+    def test_ndjson_stream(self):
+        """Streamed results contain one JSON document per line"""
+        response = self.search({'stream': True, 'query': 'intersection'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertIn('events_count', json.loads(lines[0]))
+
+
+class FullTextSearchTests(TestCase):
+    """Test cases for the full-text search index"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.crossing = Video.objects.create(
+            user=self.user,
+            title='Pedestrian crossing',
+            description='Crossing near the school',
+            file='videos/crossing.mp4'
+        )
+        self.highway = Video.objects.create(
+            user=self.user,
+            title='Highway',
+            description='Trucks on the highway, one pedestrian',
+            file='videos/highway.mp4'
+        )
+        self.event = Event.objects.create(
+            video=self.highway,
+            event_type='red_light_violation',
+            title='Red Light Violation',
+            description='Vehicle ran through red light',
+            start_time=3.0,
+            confidence=0.9,
+            detected_by='guideline_checker',
+            is_violation=True,
+            guideline_reference='Traffic Signal Compliance'
+        )
+        conversation = Conversation.objects.create(user=self.user, video=self.highway)
+        self.message = Message.objects.create(
+            conversation=conversation,
+            sender='user',
+            content='Which trucks ran the signal?'
+        )
+
+    def test_index_kept_in_sync(self):
+        """Writes and deletes are mirrored into the search entries"""
+        self.assertEqual(SearchEntry.objects.count(), 4)
+        self.crossing.title = 'Renamed'
+        self.crossing.save()
+        entry = SearchEntry.objects.get(entity_type='video', object_id=self.crossing.id)
+        self.assertEqual(entry.title, 'Renamed')
+
+        self.event.delete()
+        self.assertFalse(SearchEntry.objects.filter(entity_type='event').exists())
+
+    def test_writes_during_analysis_are_deferred(self):
+        """Event writes of a video under analysis are indexed once it is done"""
+        build_video_timeline(self.highway)
+        with deferred_invalidation(self.highway.id):
+            added = Event.objects.create(
+                video=self.highway,
+                event_type='sudden_stop',
+                title='Sudden Vehicle Stop',
+                description='A truck stopped suddenly',
+                start_time=5.0,
+                confidence=0.8,
+                detected_by='test'
+            )
+            deleted_id = self.event.id
+            self.event.delete()
+            self.assertTrue(SearchEntry.objects.filter(object_id=deleted_id).exists())
+            self.assertFalse(SearchEntry.objects.filter(object_id=added.id).exists())
+            self.assertTrue(VideoTimeline.objects.filter(video=self.highway).exists())
+
+        entries = SearchEntry.objects.filter(entity_type='event')
+        self.assertEqual([(entry.object_id, entry.title) for entry in entries], [(added.id, 'Sudden Vehicle Stop')])
+        self.assertFalse(VideoTimeline.objects.filter(video=self.highway).exists())
+
+    def test_ranked_video_search(self):
+        """Title matches rank above description-only matches"""
+        request = self.factory.post('/search/', {'query': 'pedestrian'}, format='json')
+        force_authenticate(request, user=self.user)
+        response = search_videos(request)
+        ids = [video['id'] for video in response.data['videos']]
+        self.assertEqual(ids, [str(self.crossing.id), str(self.highway.id)])
+
+    def test_cross_entity_search(self):
+        """Events and messages are searchable next to videos"""
+        request = self.factory.get('/search/all/?q=signal')
+        force_authenticate(request, user=self.user)
+        response = search_all(request)
+        types = {result['entity_type'] for result in response.data['results']}
+        self.assertEqual(types, {'event', 'message'})
+
+        request = self.factory.get('/search/all/?q=truck&types=message')
+        force_authenticate(request, user=self.user)
+        response = search_all(request)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['object_id'], str(self.message.id))
@@ -0,0 +1,123 @@
+import json
+import msgpack
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject, VideoSnapshot
+from videos.snapshots import build_video_snapshot
+from videos.views import video_snapshot
+
+User = get_user_model()
+
+
+class VideoSnapshotTests(TestCase):
+    """Test cases for the denormalized analysis snapshot"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='completed'
+        )
+        frame = VideoFrame._default_manager.create(
+            video=self.video,
+            frame_number=0,
+            timestamp=1.0,
+            image='frames/test.jpg',
+            width=640,
+            height=480,
+            file_size=1024,
+            has_objects=True
+        )
+        for class_name in ('car', 'car', 'person'):
+            DetectedObject.objects.create(
+                frame=frame,
+                class_name=class_name,
+                confidence=0.8,
+                bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+            )
+        for severity, is_violation in (('info', False), ('critical', True), ('warning', False)):
+            self.create_event(severity, is_violation)
+
+    def create_event(self, severity, is_violation=False):
+        return Event.objects.create(
+            video=self.video,
+            event_type=f'{severity}_event',
+            title='Test Event',
+            description='Test',
+            severity=severity,
+            start_time=2.0,
+            end_time=4.0,
+            confidence=0.9,
+            detected_by='test',
+            is_violation=is_violation
+        )
+
+    def get(self, **headers):
+        request = self.factory.get('/snapshot/', **headers)
+        force_authenticate(request, user=self.user)
+        response = video_snapshot(request, video_id=self.video.id)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_document(self):
+        """The snapshot holds stats, top events, class counts, violations and timeline"""
+        build_video_snapshot(self.video)
+        with self.assertNumQueries(1):
+            response = self.get()
+        document = json.loads(response.content)
+        self.assertEqual(document['stats']['events_count'], 3)
+        self.assertEqual(document['stats']['violations_count'], 1)
+        self.assertEqual(document['stats']['frames_with_objects'], 1)
+        self.assertEqual(document['class_counts'], {'car': 2, 'person': 1})
+        self.assertEqual(
+            [event['severity'] for event in document['top_events']],
+            ['critical', 'warning', 'info']
+        )
+        self.assertNotIn('related_objects', document['top_events'][0])
+        self.assertEqual(len(document['violations']), 1)
+        self.assertEqual(document['timeline']['events']['critical'][2], 1)
+
+        msgpack_response = self.get(HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(msgpack.unpackb(msgpack_response.content), document)
+
+    def test_conditional_get(self):
+        """An unchanged snapshot answers If-None-Match with a 304"""
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_event_writes_rebuild(self):
+        """Event writes discard the snapshot and the next read rebuilds it"""
+        etag = self.get()['ETag']
+        self.create_event('violation', True)
+        self.assertFalse(VideoSnapshot.objects.filter(video=self.video).exists())
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['stats']['violations_count'], 2)
+
+    def test_video_edits_rebuild(self):
+        """Edits to the video fields the snapshot shows discard it"""
+        self.get()
+        self.video.save(update_fields=['custom_rules', 'updated_at'])
+        self.assertTrue(VideoSnapshot.objects.filter(video=self.video).exists())
+
+        self.video.title = 'Renamed'
+        self.video.save(update_fields=['title', 'updated_at'])
+        self.assertFalse(VideoSnapshot.objects.filter(video=self.video).exists())
+        self.assertEqual(json.loads(self.get().content)['video']['title'], 'Renamed')
+
+    def test_unfinished_video(self):
+        """Videos still being analysed have no snapshot"""
+        self.video.status = 'processing'
+        self.video.save()
+        self.assertEqual(self.get().status_code, 404)
@@ -0,0 +1,172 @@
+import random
+import uuid
+from datetime import timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, DetectedObject, VideoSpatialIndex
+from videos.spatial import build_spatial_index, clear_spatial_arrays, load_spatial_index, query_region
+from videos.tracks import build_video_tracks
+from videos.views import video_region_query
+
+User = get_user_model()
+
+
+class SpatialIndexTests(TestCase):
+    """Test cases for the grid spatial index and region queries"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='completed'
+        )
+        self.frames = [
+            VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=True
+            )
+            for second in range(10)
+        ]
+
+    def create_detection(self, frame, class_name, x, y, width=0.1, height=0.1, track_id=None):
+        return DetectedObject.objects.create(
+            frame=frame,
+            class_name=class_name,
+            confidence=0.9,
+            bbox_x=x, bbox_y=y, bbox_width=width, bbox_height=height,
+            track_id=track_id
+        )
+
+    def query(self, **body):
+        request = self.factory.post(f'/api/v1/videos/{self.video.id}/region/', body, format='json')
+        force_authenticate(request, user=self.user)
+        return video_region_query(request, video_id=self.video.id)
+
+    def test_matches_brute_force(self):
+        """Indexed region queries agree with a scan of every detection"""
+        rng = random.Random(0)
+        detections = [
+            self.create_detection(
+                rng.choice(self.frames), rng.choice(['car', 'person']),
+                rng.uniform(0, 0.9), rng.uniform(0, 0.9), rng.uniform(0.01, 0.3), rng.uniform(0.01, 0.3)
+            )
+            for _ in range(200)
+        ]
+        index = build_spatial_index(self.video)
+        arrays = load_spatial_index(index)
+
+        for _ in range(25):
+            x0, x1 = sorted((rng.random(), rng.random()))
+            y0, y1 = sorted((rng.random(), rng.random()))
+            start, end = sorted((rng.uniform(0, 9), rng.uniform(0, 9)))
+            for mode in ('center', 'intersects'):
+                matches = query_region(
+                    arrays, index.grid_size, region=(x0, y0, x1, y1), start_time=start, end_time=end, mode=mode
+                )
+                found = {arrays['id'][row].tobytes() for row in matches}
+                expected = set()
+                for detection in detections:
+                    if not start <= detection.frame.timestamp <= end:
+                        continue
+                    if mode == 'center':
+                        cx = detection.bbox_x + detection.bbox_width / 2
+                        cy = detection.bbox_y + detection.bbox_height / 2
+                        hit = x0 <= cx <= x1 and y0 <= cy <= y1
+                    else:
+                        hit = (
+                            detection.bbox_x <= x1 and detection.bbox_x + detection.bbox_width >= x0
+                            and detection.bbox_y <= y1 and detection.bbox_y + detection.bbox_height >= y0
+                        )
+                    if hit:
+                        expected.add(detection.id.bytes)
+                self.assertEqual(found, expected)
+
+    def test_region_query_endpoint(self):
+        """Detections entering a crosswalk polygon are returned with their tracks"""
+        crosswalk = [[0.4, 0.6], [0.6, 0.6], [0.6, 0.8], [0.4, 0.8]]
+        for second, frame in enumerate(self.frames):
+            # A pedestrian crosses from left to right, a car stays away
+            self.create_detection(frame, 'person', 0.1 * second, 0.65, track_id='person_1')
+            self.create_detection(frame, 'car', 0.1, 0.1, track_id='car_1')
+        build_video_tracks(self.video)
+
+        response = self.query(polygon=crosswalk, start_time=0, end_time=9)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['detections_count'], 2)
+        self.assertEqual([d['timestamp'] for d in response.data['detections']], [4.0, 5.0])
+        self.assertEqual([track['track_id'] for track in response.data['tracks']], ['person_1'])
+        self.assertTrue(VideoSpatialIndex.objects.filter(video=self.video).exists())
+
+        response = self.query(polygon=crosswalk, start_time=5, end_time=9, classes=['person'], limit=0)
+        self.assertEqual(response.data['detections_count'], 1)
+        self.assertEqual(response.data['detections'], [])
+
+    def test_index_follows_detection_changes(self):
+        """Detection writes discard the stored index"""
+        self.create_detection(self.frames[0], 'car', 0.1, 0.1)
+        build_spatial_index(self.video)
+        self.create_detection(self.frames[1], 'car', 0.1, 0.1)
+        self.assertFalse(VideoSpatialIndex.objects.filter(video=self.video).exists())
+        self.assertEqual(self.query(region=[0, 0, 1, 1]).data['detections_count'], 2)
+
+    def test_frame_deletion_discards_index_once(self):
+        """Detections deleted with their frame leave the invalidation to the frame"""
+        for x in range(5):
+            self.create_detection(self.frames[0], 'car', x / 10, 0.1)
+        self.create_detection(self.frames[1], 'car', 0.1, 0.1)
+        build_spatial_index(self.video)
+        with CaptureQueriesContext(connection) as queries:
+            self.frames[0].delete()
+        self.assertFalse(VideoSpatialIndex.objects.filter(video=self.video).exists())
+        index_deletes = [query for query in queries if 'video_spatial_index' in query['sql'] and 'DELETE' in query['sql']]
+        self.assertLessEqual(len(index_deletes), 1)
+        self.assertEqual(self.query(region=[0, 0, 1, 1]).data['detections_count'], 1)
+
+    def test_loaded_index_is_reused(self):
+        """Repeated queries reuse the loaded arrays until detections change"""
+        clear_spatial_arrays()
+        self.create_detection(self.frames[0], 'car', 0.1, 0.1)
+        build_spatial_index(self.video)
+        self.query(region=[0, 0, 1, 1])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(region=[0, 0, 0.5, 0.5])
+        self.assertEqual(response.data['detections_count'], 1)
+        self.assertFalse([query for query in queries if 'video_spatial_indexes' in query['sql']])
+
+        self.create_detection(self.frames[1], 'car', 0.2, 0.2)
+        self.assertEqual(self.query(region=[0, 0, 0.5, 0.5]).data['detections_count'], 2)
+
+    def test_ids_ending_in_nul_bytes(self):
+        """Detection ids whose last bytes are zero survive the fixed-width id column"""
+        detection_id = uuid.UUID(bytes=bytes(range(1, 13)) + bytes(4))
+        DetectedObject.objects.create(
+            id=detection_id, frame=self.frames[0], class_name='car', confidence=0.9,
+            bbox_x=0.1, bbox_y=0.1, bbox_width=0.1, bbox_height=0.1
+        )
+        response = self.query(region=[0, 0, 1, 1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([d['id'] for d in response.data['detections']], [str(detection_id)])
+
+    def test_invalid_region_queries(self):
+        self.assertEqual(self.query().status_code, 400)
+        self.assertEqual(self.query(region=[0.5, 0.5, 0.1, 0.1]).status_code, 400)
+        self.assertEqual(
+            self.query(polygon=[[0, 0], [1, 0], [1, 1]], mode='intersects').status_code, 400
+        )
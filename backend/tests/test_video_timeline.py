@@ -0,0 +1,109 @@
+from datetime import timedelta
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, Event, DetectedObject, VideoTimeline
+from videos.timeline import build_video_timeline, interval_counts
+from videos.views import video_timeline
+
+User = get_user_model()
+
+
+class VideoTimelineTests(TestCase):
+    """Test cases for the precomputed density timeline"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=20)
+        )
+        for frame_number, timestamp in enumerate([0.5, 6.0, 6.5]):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=frame_number,
+                timestamp=timestamp,
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for class_name in ('car', 'car', 'person'):
+                DetectedObject.objects.create(
+                    frame=frame,
+                    class_name=class_name,
+                    confidence=0.8,
+                    bbox_x=0.1, bbox_y=0.1, bbox_width=0.2, bbox_height=0.2
+                )
+        self.create_event(1.0, 7.0, 'info')
+        self.create_event(12.0, None, 'critical', is_violation=True)
+
+    def create_event(self, start_time, end_time, severity, is_violation=False):
+        return Event.objects.create(
+            video=self.video,
+            event_type='test',
+            title='Test Event',
+            description='Test',
+            severity=severity,
+            start_time=start_time,
+            end_time=end_time,
+            confidence=0.9,
+            detected_by='test',
+            is_violation=is_violation
+        )
+
+    def get(self, path):
+        request = self.factory.get(path)
+        force_authenticate(request, user=self.user)
+        return video_timeline(request, video_id=self.video.id)
+
+    def test_interval_counts(self):
+        """Intervals count in every bucket they overlap"""
+        counts = interval_counts(
+            np.array([0.0, 4.0]), np.array([12.0, 4.5]), np.array([0, 0]), 1, 5, 4
+        )
+        self.assertEqual(counts.tolist(), [[2, 1, 1, 0]])
+
+    def test_histograms(self):
+        """Events, violations and detections are bucketed at each width"""
+        timeline = build_video_timeline(self.video)
+        self.assertEqual(timeline.bucket_widths[:2], [1, 5])
+
+        response = self.get('/timeline/?bucket_width=5')
+        self.assertEqual(response.data['bucket_width'], 5)
+        self.assertEqual(response.data['buckets'], 4)
+        self.assertEqual(response.data['events']['info'], [1, 1, 0, 0])
+        self.assertEqual(response.data['events']['critical'], [0, 0, 1, 0])
+        self.assertEqual(response.data['violations'], [0, 0, 1, 0])
+        self.assertEqual(response.data['detections'], {'car': [2, 4, 0, 0], 'person': [1, 2, 0, 0]})
+
+        response = self.get('/timeline/?bucket_width=1&start=6&end=8')
+        self.assertEqual(response.data['start'], 6)
+        self.assertEqual(response.data['detections']['car'], [4, 0])
+
+    def test_single_read(self):
+        """A stored timeline is served with one lookup per table, then from the cache"""
+        build_video_timeline(self.video)
+        with self.assertNumQueries(2):
+            self.get('/timeline/?max_buckets=10')
+        with self.assertNumQueries(0):
+            response = self.get('/timeline/?max_buckets=10')
+        self.assertEqual(response.data['bucket_width'], 5)
+
+    def test_event_writes_discard_timeline(self):
+        """New events make the next read recompute the timeline"""
+        build_video_timeline(self.video)
+        self.create_event(16.0, 17.0, 'warning')
+        self.assertFalse(VideoTimeline.objects.filter(video=self.video).exists())
+        response = self.get('/timeline/?bucket_width=5')
+        self.assertEqual(response.data['events']['warning'], [0, 0, 0, 1])
@@ -0,0 +1,242 @@
+import random
+import numpy as np
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.models import Video, VideoFrame, DetectedObject, Event, TrackSummary
+from videos.rules import DetectionArrays, compile_rules
+from videos.inference import clear_models
+from videos.tasks import (
+    ANALYSIS_STAGE_ORDER, check_guideline_adherence, perform_object_detection, process_video_analysis
+)
+from videos.tracks import TrackAssociator, build_video_tracks, compute_track_summaries, track_arrays
+from videos.views import VideoTracksView
+
+User = get_user_model()
+
+
+class TrackSummaryComputationTests(TestCase):
+    """Test cases for the vectorized track summaries"""
+
+    def test_compute_track_summaries(self):
+        """Speed, heading, dwell time and class are reduced per track"""
+        arrays = DetectionArrays(
+            timestamp=[2.0, 0.0, 1.0, 0.0, 3.0, 1.0],
+            class_id=[0, 0, 1, 1, 1, 0],
+            class_names=['car', 'truck'],
+            confidence=[0.9, 0.7, 0.8, 0.6, 0.6, 0.5],
+            center=[[0.5, 0.5], [0.1, 0.5], [0.3, 0.5], [0.5, 0.2], [0.5, 0.8], [0.2, 0.2]],
+            track_ids=['a', 'a', 'a', 'b', 'b', '']
+        )
+
+        summaries = compute_track_summaries(arrays)
+
+        self.assertEqual(summaries['track_id'], ['a', 'b'])
+        self.assertEqual(summaries['class_name'], ['car', 'truck'])
+        np.testing.assert_allclose(summaries['dwell_time'], [2.0, 3.0])
+        np.testing.assert_allclose(summaries['distance'], [0.4, 0.6])
+        np.testing.assert_allclose(summaries['mean_speed'], [0.2, 0.2])
+        np.testing.assert_allclose(summaries['max_speed'], [0.2, 0.2])
+        # Track a moves right, track b moves down the image
+        np.testing.assert_allclose(summaries['heading'], [0.0, 270.0])
+        self.assertEqual(summaries['detections_count'].tolist(), [3, 2])
+
+    def test_no_tracked_detections(self):
+        """Videos without tracked detections have no tracks"""
+        arrays = DetectionArrays([], [], [], [], [], [])
+        self.assertEqual(compute_track_summaries(arrays)['track_id'], [])
+
+
+class TrackAssociationTests(TestCase):
+    """Test cases for linking detections across frames into tracks"""
+
+    def test_boxes_follow_tracks(self):
+        """Overlapping boxes of a class keep their track until it goes unseen too long"""
+        associator = TrackAssociator(iou_threshold=0.3, max_age=1)
+        first = associator.update(['car', 'person'], [[0.1, 0.1, 0.2, 0.2], [0.5, 0.5, 0.1, 0.1]])
+        self.assertEqual(len(set(first)), 2)
+        # The car moved a little; a truck where the person was is a new track
+        second = associator.update(['truck', 'car'], [[0.5, 0.5, 0.1, 0.1], [0.13, 0.1, 0.2, 0.2]])
+        self.assertEqual(second[1], first[0])
+        self.assertNotIn(second[0], first)
+        self.assertEqual(associator.update([], []), [])
+        self.assertEqual(associator.update(['car'], [[0.15, 0.1, 0.2, 0.2]]), [first[0]])
+        associator.update([], [])
+        associator.update([], [])
+        self.assertNotEqual(associator.update(['car'], [[0.15, 0.1, 0.2, 0.2]]), [first[0]])
+
+    def test_detection_stage_links_frames(self):
+        """Tracks built after the detection stage span several frames"""
+        user = User.objects.create_user(username='tracker', password='testpass123')
+        video = Video.objects.create(
+            user=user,
+            title='Tracked Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=10),
+            status='processing'
+        )
+        frames = [
+            VideoFrame._default_manager.create(
+                video=video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for second in range(10)
+        ]
+        random.seed(0)
+        clear_models()
+        perform_object_detection(video, frames)
+        tracks = build_video_tracks(video)
+
+        self.assertTrue(any(track.detections_count > 1 for track in tracks))
+        self.assertTrue(any(track.dwell_time > 0 and track.heading is not None for track in tracks))
+        track_ids = DetectedObject.objects.filter(frame__video=video).values_list('track_id', flat=True)
+        self.assertNotIn(None, track_ids)
+
+
+class SpeedingCarDetector:
+    """Detector seeing one car drive right by 5% of the frame per call"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def detect(self, image, letterbox):
+        x = 0.05 * self.calls
+        self.calls += 1
+        return [('car', 0.9, tuple(letterbox.to_input([x, 0.4, 0.3, 0.2])[0]))]
+
+
+class AnalysisStageOrderTests(TestCase):
+    """Test cases for the order analysis stages run in"""
+
+    @override_settings(VIDEO_MODELS={
+        'object_detector': {'loader': f'{__name__}.SpeedingCarDetector', 'version': 'speeding'}
+    })
+    def test_stages_run_in_dependency_order(self):
+        """Rules see the tracks of the detection stage even when requested first"""
+        user = User.objects.create_user(username='pipeline', password='testpass123')
+        video = Video.objects.create(
+            user=user,
+            title='Pipeline Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=10),
+            custom_rules={'rules': [{'type': 'speed_limit', 'max_speed': 0.03}]}
+        )
+        frames = [
+            VideoFrame._default_manager.create(
+                video=video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024
+            )
+            for second in range(5)
+        ]
+        clear_models()
+        with mock.patch('videos.tasks.extract_video_metadata'), \
+                mock.patch('videos.tasks.extract_video_frames', return_value=frames):
+            result = process_video_analysis(
+                video.id, {'analysis_types': list(reversed(ANALYSIS_STAGE_ORDER))}
+            )
+
+        self.assertEqual(result['status'], 'success')
+        violation = Event.objects.get(video=video, event_type='speed_violation')
+        self.assertEqual((violation.start_time, violation.end_time), (0.0, 4.0))
+
+
+class VideoTracksTests(TestCase):
+    """Test cases for stored track summaries and the rules reading them"""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.video = Video.objects.create(
+            user=self.user,
+            title='Test Video',
+            file='videos/test.mp4',
+            duration=timedelta(seconds=30),
+            status='completed'
+        )
+        for second in range(5):
+            frame = VideoFrame._default_manager.create(
+                video=self.video,
+                frame_number=second * 30,
+                timestamp=float(second),
+                image='frames/test.jpg',
+                width=640,
+                height=480,
+                file_size=1024,
+                has_objects=True
+            )
+            # A fast car driving left and a parked truck
+            self.create_detection(frame, 'car', 0.8 - second * 0.15, 'car_1')
+            self.create_detection(frame, 'truck', 0.1, 'truck_1')
+        build_video_tracks(self.video)
+
+    def create_detection(self, frame, class_name, x, track_id):
+        return DetectedObject.objects.create(
+            frame=frame,
+            class_name=class_name,
+            confidence=0.9,
+            bbox_x=x, bbox_y=0.5, bbox_width=0.1, bbox_height=0.1,
+            track_id=track_id
+        )
+
+    def get_tracks(self, **params):
+        request = self.factory.get(f'/api/v1/videos/{self.video.id}/tracks/', params)
+        force_authenticate(request, user=self.user)
+        return VideoTracksView.as_view()(request, video_id=self.video.id)
+
+    def test_tracks_are_stored(self):
+        """One summary row is stored per track, replacing earlier ones"""
+        build_video_tracks(self.video)
+        tracks = {track.track_id: track for track in TrackSummary.objects.filter(video=self.video)}
+        self.assertEqual(set(tracks), {'car_1', 'truck_1'})
+        self.assertAlmostEqual(tracks['car_1'].max_speed, 0.15)
+        self.assertAlmostEqual(tracks['car_1'].heading, 180.0)
+        self.assertEqual(tracks['truck_1'].max_speed, 0.0)
+        self.assertIsNone(tracks['truck_1'].heading)
+
+    def test_fast_vehicles_query(self):
+        """Tracks can be filtered and ordered by their motion"""
+        response = self.get_tracks(min_speed='0.1', ordering='-max_speed')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([track['track_id'] for track in response.data['results']], ['car_1'])
+
+        response = self.get_tracks(classes='truck', fields='track_id,dwell_time')
+        self.assertEqual(response.data['results'], [{'track_id': 'truck_1', 'dwell_time': 4.0}])
+
+        self.assertEqual(self.get_tracks(min_speed='fast').status_code, 400)
+
+    def test_motion_rules_read_tracks(self):
+        """Speed, direction and dwell rules produce one violation per track"""
+        rule_set = compile_rules({'rules': [
+            {'type': 'speed_limit', 'max_speed': 0.1, 'name': 'Speed limit'},
+            {'type': 'direction', 'heading': 0, 'classes': ['car'], 'name': 'One way'},
+            {'type': 'dwell', 'max_dwell': 3, 'classes': ['truck'], 'name': 'No parking'},
+        ]})
+        self.assertTrue(rule_set.uses('tracks'))
+        self.assertFalse(rule_set.uses('detections'))
+        violations = rule_set.evaluate(tracks=track_arrays(self.video))
+        self.assertEqual(
+            [(violation['rule'].name, violation['track_id']) for violation in violations],
+            [('Speed limit', 'car_1'), ('One way', 'car_1'), ('No parking', 'truck_1')]
+        )
+
+        self.video.custom_rules = {'rules': [{'type': 'speed_limit', 'max_speed': 0.1}]}
+        event = check_guideline_adherence(self.video)[0]
+        self.assertEqual(event.event_type, 'speed_violation')
+        self.assertEqual((event.start_time, event.end_time), (0.0, 4.0))
+        self.assertEqual(event.metadata['detections'], 5)
@@ -0,0 +1,266 @@
+"""
+Activity recognition from dense optical flow.
+
+The ``activity_recognition`` analysis computes Farneback optical flow
+between consecutive extracted frames, downscaled to ACTIVITY_FLOW_WIDTH
+pixels wide and converted to grayscale. Frame extraction keeps that small
+image on each frame it decodes (``frame.flow_image``), so the stage does not
+decode the video again; frames without one (e.g. re-analysed videos) are
+read back from their stored images. Frame pairs are processed in a thread
+pool, OpenCV releasing the GIL while it computes the flow.
+
+Each pair yields the frame's motion score (mean flow magnitude, stored in
+``VideoFrame.motion_score``) and, for every detection of the later frame,
+the mean flow inside its box. Flow is in normalized coordinates per second:
+x in frame widths, y in frame heights. Descriptors are grouped per track,
+with untracked boxes, and those of tracks seen in a single frame, grouped by
+class and cell of a 3x3 region grid. Each group is then classified into
+activities:
+
+* stopping: the group moved at ACTIVITY_MOVING_SPEED or more, then stayed
+  under ACTIVITY_STOPPED_SPEED for its last ACTIVITY_STOP_SAMPLES samples;
+* turning: its heading changed by ACTIVITY_TURN_ANGLE degrees or more
+  between its first and last moving samples;
+* crossing: it travelled ACTIVITY_CROSSING_DISTANCE of the frame width or
+  more, mostly horizontally.
+
+Events are reported with ``detected_by='activity_recognizer'``.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from django.conf import settings
+from .export import detection_table
+from .models import VideoFrame, Event
+
+DETECTOR_NAME = 'activity_recognizer'
+
+ACTIVITY_DEFAULTS = {
+    'ACTIVITY_FLOW_WIDTH': 320,
+    'ACTIVITY_WORKERS': min(4, os.cpu_count() or 1),
+    'ACTIVITY_MOVING_SPEED': 0.05,
+    'ACTIVITY_STOPPED_SPEED': 0.01,
+    'ACTIVITY_STOP_SAMPLES': 2,
+    'ACTIVITY_TURN_ANGLE': 45.0,
+    'ACTIVITY_CROSSING_DISTANCE': 0.3,
+}
+
+# Cells per side of the grid grouping untracked detections
+REGION_GRID = 3
+
+# Farneback parameters: pyramid scale, levels, window size, iterations,
+# polynomial neighbourhood and sigma, flags
+FARNEBACK_PARAMS = (0.5, 3, 15, 3, 5, 1.2, 0)
+
+ACTIVITY_TITLES = {
+    'stopping': 'Stopping',
+    'turning': 'Turning',
+    'crossing': 'Crossing',
+}
+
+def activity_setting(name):
+    return getattr(settings, name, ACTIVITY_DEFAULTS[name])
+
+def flow_image(image, width=None):
+    """Downscaled grayscale copy of a BGR or grayscale frame, for optical flow"""
+    width = width or activity_setting('ACTIVITY_FLOW_WIDTH')
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, source_width = image.shape
+    if source_width > width:
+        size = (width, max(1, round(height * width / source_width)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image
+
+def load_flow_image(frame):
+    """The flow image of a frame, decoded during extraction or read from its image"""
+    image = getattr(frame, 'flow_image', None)
+    if image is None and frame.image:
+        image = cv2.imread(frame.image.path, cv2.IMREAD_GRAYSCALE)
+        image = None if image is None else flow_image(image)
+    return image
+
+def box_flows(flow, boxes):
+    """Mean flow (x, y in pixels) inside each normalized (x, y, width, height) box"""
+    height, width = flow.shape[:2]
+    flows = np.zeros((len(boxes), 2))
+    for row, (x, y, box_width, box_height) in enumerate(boxes):
+        x0 = min(int(x * width), width - 1)
+        y0 = min(int(y * height), height - 1)
+        x1 = max(int(np.ceil((x + box_width) * width)), x0 + 1)
+        y1 = max(int(np.ceil((y + box_height) * height)), y0 + 1)
+        flows[row] = flow[y0:y1, x0:x1].reshape(-1, 2).mean(axis=0)
+    return flows
+
+def pair_motion(previous, current, elapsed, boxes):
+    """
+    (motion score, per-box flow) between two flow images, in normalized
+    coordinates per second
+    """
+    if previous.shape != current.shape:
+        current = cv2.resize(current, previous.shape[::-1], interpolation=cv2.INTER_AREA)
+    # Flow is indexed by the pixels of its first image: computing it from the
+    # current frame back to the previous one places it under the current boxes
+    flow = -cv2.calcOpticalFlowFarneback(current, previous, None, *FARNEBACK_PARAMS)
+    height, width = flow.shape[:2]
+    scale = np.array([width, height], dtype=np.float64) * max(elapsed, 1e-6)
+    magnitude = np.hypot(flow[..., 0] / scale[0], flow[..., 1] / scale[1])
+    return float(magnitude.mean()), box_flows(flow, boxes) / scale
+
+def compute_flows(images, timestamps, boxes_per_frame, workers=None):
+    """
+    Motion score (None for the first frame or a missing image) and per-box
+    flow of every frame, pairs being processed in a thread pool
+    """
+    workers = workers or activity_setting('ACTIVITY_WORKERS')
+    scores = [None] * len(images)
+    flows = [np.zeros((len(boxes), 2)) for boxes in boxes_per_frame]
+    pairs = [
+        index for index in range(1, len(images))
+        if images[index - 1] is not None and images[index] is not None
+    ]
+
+    def run(index):
+        return pair_motion(
+            images[index - 1], images[index],
+            timestamps[index] - timestamps[index - 1], boxes_per_frame[index]
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, (score, box_flow) in zip(pairs, executor.map(run, pairs)):
+            scores[index] = score
+            flows[index] = box_flow
+    return scores, flows
+
+def _heading(vector):
+    # Image rows grow downwards, so flip y to measure angles counterclockwise
+    return np.degrees(np.arctan2(-vector[1], vector[0])) % 360
+
+def classify_group(times, centers, flows):
+    """(activity, first sample, last sample, details) found in one group's samples"""
+    speeds = np.hypot(flows[:, 0], flows[:, 1])
+    moving = np.flatnonzero(speeds >= activity_setting('ACTIVITY_MOVING_SPEED'))
+    activities = []
+
+    stop_samples = activity_setting('ACTIVITY_STOP_SAMPLES')
+    if len(moving) and len(speeds) - moving[-1] - 1 >= stop_samples:
+        tail = speeds[moving[-1] + 1:]
+        if (tail[-stop_samples:] < activity_setting('ACTIVITY_STOPPED_SPEED')).all():
+            activities.append(('stopping', moving[-1], len(speeds) - 1, {
+                'speed_before': round(float(speeds[moving[-1]]), 4),
+                'speed_after': round(float(tail[-stop_samples:].mean()), 4),
+            }))
+
+    if len(moving) >= 2:
+        start = _heading(flows[moving[:2]].mean(axis=0))
+        end = _heading(flows[moving[-2:]].mean(axis=0))
+        turn = (end - start + 180) % 360 - 180
+        if abs(turn) >= activity_setting('ACTIVITY_TURN_ANGLE'):
+            activities.append(('turning', moving[0], moving[-1], {
+                'start_heading': round(float(start), 1),
+                'end_heading': round(float(end), 1),
+                'turn': round(float(turn), 1),
+                'direction': 'left' if turn > 0 else 'right',
+            }))
+
+    displacement = centers[-1] - centers[0]
+    if (abs(displacement[0]) >= activity_setting('ACTIVITY_CROSSING_DISTANCE')
+            and abs(displacement[0]) > 2 * abs(displacement[1])):
+        activities.append(('crossing', 0, len(times) - 1, {
+            'distance': round(float(abs(displacement[0])), 4),
+            'direction': 'right' if displacement[0] > 0 else 'left',
+        }))
+    return activities
+
+def _group_keys(table):
+    """
+    Track id of each detection, or its class and region cell when untracked
+    or when its track is seen in a single frame
+    """
+    bbox = table['bbox'].astype(np.float64)
+    centers = bbox[:, :2] + bbox[:, 2:] / 2
+    cells = np.clip((centers * REGION_GRID).astype(np.int64), 0, REGION_GRID - 1)
+    class_names = [str(name) for name in table['class_names']]
+    tracks, track_codes = np.unique(table['track_id'], return_inverse=True)
+    track_codes = track_codes.reshape(-1)
+    # Distinct frames each track is seen in
+    seen = np.unique(np.column_stack([track_codes, table['frame_number']]), axis=0)[:, 0]
+    frames_seen = np.bincount(seen, minlength=len(tracks))[track_codes]
+    return [
+        track_id if track_id and count > 1 else f'region:{class_names[class_id]}:{cell_y},{cell_x}'
+        for track_id, count, class_id, (cell_x, cell_y) in zip(
+            table['track_id'].tolist(), frames_seen.tolist(), table['class_id'].tolist(), cells.tolist()
+        )
+    ]
+
+def recognize_activities(video, frames=None):
+    """
+    Store the motion score of a video's frames and return its unsaved
+    activity events; ``frames`` may carry the flow images decoded during
+    extraction
+    """
+    stored = list(VideoFrame._default_manager.filter(video=video).order_by('timestamp', 'frame_number'))
+    decoded = {frame.id: frame for frame in frames or () if getattr(frame, 'flow_image', None) is not None}
+    frames = [decoded.get(frame.id, frame) for frame in stored]
+    timestamps = np.array([frame.timestamp for frame in frames], dtype=np.float64)
+    position = {frame.frame_number: index for index, frame in enumerate(frames)}
+
+    table = detection_table(video)
+    detection_frames = np.array([position.get(number, -1) for number in table['frame_number'].tolist()], dtype=np.int64)
+    order = np.argsort(detection_frames, kind='stable')
+    bounds = np.searchsorted(detection_frames[order], np.arange(len(frames) + 1))
+    rows_per_frame = [order[bounds[index]:bounds[index + 1]] for index in range(len(frames))]
+    boxes_per_frame = [table['bbox'][rows] for rows in rows_per_frame]
+
+    scores, flows = compute_flows([load_flow_image(frame) for frame in frames], timestamps, boxes_per_frame)
+    for frame, score in zip(frames, scores):
+        frame.motion_score = score
+    VideoFrame._default_manager.bulk_update(frames, ['motion_score'], batch_size=1000)
+
+    # Flow of every detection, NaN where its frame has no previous frame
+    detection_flow = np.full((len(detection_frames), 2), np.nan)
+    for index, rows in enumerate(rows_per_frame):
+        if scores[index] is not None:
+            detection_flow[rows] = flows[index]
+
+    keys = _group_keys(table)
+    bbox = table['bbox'].astype(np.float64)
+    centers = bbox[:, :2] + bbox[:, 2:] / 2
+    class_names = [str(name) for name in table['class_names']]
+    groups = {}
+    for row in np.flatnonzero(~np.isnan(detection_flow[:, 0])).tolist():
+        groups.setdefault(keys[row], []).append(row)
+
+    events = []
+    for key, rows in groups.items():
+        rows = np.array(rows)[np.argsort(table['timestamp'][rows], kind='stable')]
+        if len(rows) < 2:
+            continue
+        times = table['timestamp'][rows]
+        class_name = class_names[np.bincount(table['class_id'][rows]).argmax()]
+        for activity, first, last, details in classify_group(times, centers[rows], detection_flow[rows]):
+            span = rows[first:last + 1]
+            location = centers[span].mean(axis=0)
+            events.append(Event(
+                video=video,
+                event_type=activity,
+                title=f"{class_name.replace('_', ' ').title()} {ACTIVITY_TITLES[activity]}",
+                description=f'{class_name} {activity} between {times[first]:.1f}s and {times[last]:.1f}s.',
+                severity='info',
+                start_time=float(times[first]),
+                end_time=float(times[last]),
+                duration=float(times[last] - times[first]),
+                location_x=float(location[0]),
+                location_y=float(location[1]),
+                confidence=float(table['confidence'][span].mean()),
+                detected_by=DETECTOR_NAME,
+                metadata={
+                    'group': key,
+                    'track_id': None if key.startswith('region:') else key,
+                    'class_name': class_name,
+                    'samples': int(len(rows)),
+                    **details,
+                }
+            ))
+    return events
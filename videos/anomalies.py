@@ -0,0 +1,222 @@
+"""
+Anomaly detection over per-frame time series.
+
+The ``anomaly_detection`` analysis reduces a video to per-frame series: the
+number of detections and the motion, which is the optical flow score of
+each frame when activity recognition measured it, else the mean speed of
+the tracked boxes. It scans them with rolling-window statistics built from
+cumulative sums, so the whole stage is linear in the number of frames:
+
+* spikes: frames whose value is ANOMALY_Z_THRESHOLD or more standard
+  deviations away from the mean of the previous ANOMALY_WINDOW frames; runs
+  of consecutive flagged frames become one event;
+* change points: frames where the mean of the next ANOMALY_WINDOW frames
+  differs from the mean of the previous ones by ANOMALY_CHANGE_THRESHOLD
+  standard errors or more, keeping the strongest frame of each window.
+
+Each series has a noise floor on its standard deviation, so a flat series
+does not turn every small step into an anomaly. Events are reported with
+``detected_by='anomaly_detector'``.
+"""
+import numpy as np
+from django.conf import settings
+from .export import detection_table
+from .models import VideoFrame, Event
+from .rules import DetectionArrays
+
+DETECTOR_NAME = 'anomaly_detector'
+
+DEFAULT_ANOMALY_WINDOW = 30
+DEFAULT_Z_THRESHOLD = 3.0
+DEFAULT_CHANGE_THRESHOLD = 4.0
+
+# Frames of history a spike needs before it is reported
+MIN_HISTORY = 5
+
+# Per-series labels and noise floor of the standard deviation; the count
+# floor scales like Poisson noise, sqrt(mean)
+SERIES = {
+    'object_count': {'label': 'Object Count', 'min_std': 1.0, 'poisson': True},
+    'motion': {'label': 'Motion', 'min_std': 0.02, 'poisson': False},
+}
+
+def anomaly_settings():
+    return (
+        int(getattr(settings, 'ANOMALY_WINDOW', DEFAULT_ANOMALY_WINDOW)),
+        float(getattr(settings, 'ANOMALY_Z_THRESHOLD', DEFAULT_Z_THRESHOLD)),
+        float(getattr(settings, 'ANOMALY_CHANGE_THRESHOLD', DEFAULT_CHANGE_THRESHOLD)),
+    )
+
+def _window_sums(values, starts, ends):
+    """Sums of values and squared values over [start, end) windows"""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+    return sums[ends] - sums[starts], squares[ends] - squares[starts]
+
+def _noise_floor(mean, min_std, poisson):
+    if poisson:
+        return np.maximum(np.sqrt(np.abs(mean)), min_std)
+    return np.full(len(mean), min_std)
+
+def rolling_zscores(values, window, min_std=0.0, poisson=False):
+    """
+    (z-scores, means) of each value against the mean and standard deviation
+    of the previous ``window`` values; z is 0 with fewer than MIN_HISTORY
+    """
+    values = np.asarray(values, dtype=np.float64)
+    index = np.arange(len(values))
+    starts = np.maximum(index - window, 0)
+    counts = index - starts
+    sums, squares = _window_sums(values, starts, index)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, sums / counts, 0.0)
+        std = np.sqrt(np.maximum(np.where(counts > 0, squares / counts, 0.0) - mean * mean, 0.0))
+    std = np.maximum(std, _noise_floor(mean, min_std, poisson))
+    enough = (counts >= min(MIN_HISTORY, window)) & (std > 0)
+    zscores = np.divide(values - mean, std, out=np.zeros(len(values)), where=enough)
+    return zscores, mean
+
+def change_scores(values, window, min_std=0.0, poisson=False):
+    """
+    (scores, means before, means after) of a shift in mean at each value,
+    comparing the ``window`` values before it with the ``window`` values
+    from it on; the score is 0 where either side is shorter than ``window``
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    scores = np.zeros(n)
+    before = np.zeros(n)
+    after = np.zeros(n)
+    if n < 2 * window:
+        return scores, before, after
+    index = np.arange(window, n - window + 1)
+    left_sums, left_squares = _window_sums(values, index - window, index)
+    right_sums, right_squares = _window_sums(values, index, index + window)
+    left, right = left_sums / window, right_sums / window
+    variance = (
+        left_squares / window - left * left + right_squares / window - right * right
+    ) / 2
+    std = np.maximum(np.sqrt(np.maximum(variance, 0.0)), _noise_floor((left + right) / 2, min_std, poisson))
+    scores[index] = np.abs(right - left) / (std * np.sqrt(2.0 / window))
+    before[index], after[index] = left, right
+    return scores, before, after
+
+def window_peaks(scores, window, threshold):
+    """Positions of scores at or above threshold that are the largest within ``window`` on each side"""
+    if not len(scores):
+        return np.zeros(0, dtype=np.int64)
+    padded = np.pad(scores, window, constant_values=-np.inf)
+    neighbourhood = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1).max(axis=1)
+    peaks = (scores >= threshold) & (scores == neighbourhood)
+    # Of equal neighbouring peaks, keep the first
+    candidates = np.flatnonzero(peaks)
+    keep = np.concatenate(([True], np.diff(candidates) > window)) if len(candidates) else candidates
+    return candidates[keep.astype(bool)]
+
+def flagged_runs(mask):
+    """(first, last) positions of the runs of True in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+def frame_series(video):
+    """
+    Timestamps of a video's frames, in time order, with the per-frame
+    series the detector scans
+    """
+    frames = list(
+        VideoFrame._default_manager.filter(video=video)
+        .order_by('timestamp', 'frame_number')
+        .values_list('frame_number', 'timestamp', 'motion_score')
+    )
+    frame_numbers = np.array([frame[0] for frame in frames], dtype=np.int64)
+    timestamps = np.array([frame[1] for frame in frames], dtype=np.float64)
+    motion_scores = np.array([np.nan if frame[2] is None else frame[2] for frame in frames], dtype=np.float64)
+
+    table = detection_table(video)
+    order = np.argsort(frame_numbers, kind='stable')
+    positions = order[np.searchsorted(frame_numbers[order], table['frame_number'])] if len(frames) else []
+    positions = np.asarray(positions, dtype=np.int64)
+
+    counts = np.bincount(positions, minlength=len(frames)).astype(np.float64)
+    speed = DetectionArrays.from_table(table).speed
+    moving = ~np.isnan(speed)
+    speed_sums = np.bincount(positions[moving], weights=speed[moving], minlength=len(frames))
+    speed_counts = np.bincount(positions[moving], minlength=len(frames))
+    motion = np.divide(speed_sums, speed_counts, out=np.zeros(len(frames)), where=speed_counts > 0)
+    # Optical flow, when activity recognition measured it, sees all motion
+    # rather than that of tracked boxes only
+    measured = ~np.isnan(motion_scores)
+    if measured.any():
+        motion = np.where(measured, motion_scores, 0.0)
+    return timestamps, {'object_count': counts, 'motion': motion}
+
+def _confidence(score, threshold):
+    """Confidence rising from 0.5 at the threshold towards 1"""
+    return float(min(0.99, 1.0 - 0.5 * threshold / max(score, threshold)))
+
+def detect_anomalies(video, window=None, z_threshold=None, change_threshold=None):
+    """Unsaved anomaly events of a video"""
+    defaults = anomaly_settings()
+    window = window or defaults[0]
+    z_threshold = z_threshold or defaults[1]
+    change_threshold = change_threshold or defaults[2]
+
+    timestamps, series = frame_series(video)
+    events = []
+    for name, values in series.items():
+        options = SERIES[name]
+        label = options['label']
+        floor = {'min_std': options['min_std'], 'poisson': options['poisson']}
+
+        zscores, baseline = rolling_zscores(values, window, **floor)
+        for first, last in zip(*flagged_runs(np.abs(zscores) >= z_threshold)):
+            run = slice(first, last + 1)
+            peak = first + int(np.argmax(np.abs(zscores[run])))
+            direction = 'spike' if zscores[peak] > 0 else 'drop'
+            events.append(Event(
+                video=video,
+                event_type=f'{name}_anomaly',
+                title=f'Unusual {label} ({direction.title()})',
+                description=(
+                    f'{label} reached {values[peak]:.2f} against a recent mean of '
+                    f'{baseline[peak]:.2f} (z = {zscores[peak]:.1f}).'
+                ),
+                severity='warning',
+                start_time=float(timestamps[first]),
+                end_time=float(timestamps[last]),
+                duration=float(timestamps[last] - timestamps[first]),
+                confidence=_confidence(abs(zscores[peak]), z_threshold),
+                detected_by=DETECTOR_NAME,
+                metadata={
+                    'series': name,
+                    'kind': direction,
+                    'z_score': round(float(zscores[peak]), 3),
+                    'value': float(values[peak]),
+                    'baseline': round(float(baseline[peak]), 3),
+                    'window': window,
+                }
+            ))
+
+        scores, before, after = change_scores(values, window, **floor)
+        for position in window_peaks(scores, window, change_threshold):
+            events.append(Event(
+                video=video,
+                event_type=f'{name}_change',
+                title=f'{label} Change',
+                description=f'{label} changed from a mean of {before[position]:.2f} to {after[position]:.2f}.',
+                severity='info',
+                start_time=float(timestamps[position]),
+                end_time=float(timestamps[position]),
+                duration=0.0,
+                confidence=_confidence(scores[position], change_threshold),
+                detected_by=DETECTOR_NAME,
+                metadata={
+                    'series': name,
+                    'kind': 'change_point',
+                    'score': round(float(scores[position]), 3),
+                    'before': round(float(before[position]), 3),
+                    'after': round(float(after[position]), 3),
+                    'window': window,
+                }
+            ))
+    return events
@@ -0,0 +1,179 @@
+"""
+Versioned response cache for the video read endpoints.
+
+Every video has a version number in the cache that is bumped whenever the
+video, one of its events, frames or detections is written (see
+videos.signals). Cached responses embed that version in their key, so a bump
+makes every stale entry unreachable at once without scanning keys; the stale
+entries simply expire.
+
+The same state yields strong ETags and Last-Modified dates for conditional
+GET requests. Video saves bump the version too, so it already covers the
+video's ``updated_at``, and an unchanged poll is answered with a 304 from the
+cache alone, before any query or serializer runs.
+
+Users have a version of their similarity indexes the same way, bumped when
+the pipeline stores new ones (see videos.vectors).
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+# Endpoints served through cached_response, used to report hit/miss counters
+CACHED_ENDPOINTS = [
+    'video-detail', 'video-events', 'video-frames', 'video-frame-query', 'analysis-status',
+    'video-timeline', 'video-tracks'
+]
+
+def _version_key(video_id):
+    return f'videos:version:{video_id}'
+
+def _modified_key(video_id):
+    return f'videos:modified:{video_id}'
+
+def _embeddings_key(user_id):
+    return f'videos:embeddings:{user_id}'
+
+def _counter_key(endpoint, outcome):
+    return f'videos:cache-stats:{endpoint}:{outcome}'
+
+def _increment(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+def get_video_state(video_id):
+    """Current content version of a video and the time it was last bumped"""
+    keys = [_version_key(video_id), _modified_key(video_id)]
+    values = cache.get_many(keys)
+    if keys[0] not in values:
+        # Start from a fresh value after eviction so that responses cached under
+        # an earlier version can never be served again, and treat the video as
+        # modified now so no client keeps a copy validated by the lost state
+        now = time.time_ns()
+        cache.add(keys[0], now, timeout=None)
+        cache.add(keys[1], now / 1e9, timeout=None)
+        values = cache.get_many(keys)
+    return values.get(keys[0]), values.get(keys[1], time.time())
+
+def get_video_version(video_id):
+    """Current content version of a video"""
+    return get_video_state(video_id)[0]
+
+def bump_video_version(video_id):
+    """Invalidate every cached response of a video"""
+    key = _version_key(video_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    cache.set(_modified_key(video_id), time.time(), timeout=None)
+
+def get_embeddings_version(user_id):
+    """Version of a user's stored similarity indexes"""
+    key = _embeddings_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # As for videos, restart from a fresh value after eviction
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+def bump_embeddings_version(user_id):
+    """Make processes reload a user's similarity indexes"""
+    key = _embeddings_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+def _query_digest(request):
+    return hashlib.md5(
+        '&'.join(sorted(request.GET.urlencode().split('&'))).encode('utf-8')
+    ).hexdigest()
+
+def response_cache_key(request, endpoint, video_id, version=None):
+    """Cache key of a response, covering the user, version and query string"""
+    if version is None:
+        version = get_video_version(video_id)
+    return (
+        f'videos:response:{endpoint}:{video_id}:{version}:'
+        f'{request.user.pk}:{_query_digest(request)}'
+    )
+
+def cached_response(request, endpoint, video_id, build_response, version=None):
+    """
+    Serve a read endpoint from the cache, calling ``build_response`` and
+    storing its data on a miss. Only successful responses are cached.
+    """
+    key = response_cache_key(request, endpoint, video_id, version)
+    data = cache.get(key)
+    if data is not None:
+        _increment(_counter_key(endpoint, 'hits'))
+        return Response(data, status=status.HTTP_200_OK)
+
+    _increment(_counter_key(endpoint, 'misses'))
+    response = build_response()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.VIDEO_RESPONSE_CACHE_TIMEOUT)
+    return response
+
+def conditional_response(request, endpoint, video_id, build_response):
+    """
+    Serve a read endpoint with ETag/Last-Modified validation.
+    
+    The validators are computed from the cached version and modification time
+    of the video, so a matching If-None-Match or If-Modified-Since returns 304
+    without touching the database. ETags are specific to the requesting user
+    and only handed out with successful responses, which check ownership.
+    They also cover the negotiated media type, as JSON and MessagePack
+    renderings of the same data are different representations. Otherwise the
+    response comes from cached_response.
+    """
+    version, modified = get_video_state(video_id)
+    media_type = getattr(request, 'accepted_media_type', '')
+    etag = quote_etag(hashlib.sha1(
+        f'{endpoint}:{video_id}:{version}:{request.user.pk}:'
+        f'{_query_digest(request)}:{media_type}'.encode('utf-8')
+    ).hexdigest())
+    last_modified = int(modified)
+    
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = cached_response(request, endpoint, video_id, build_response, version)
+    if response.status_code not in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        return response
+    
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+def cache_stats():
+    """Hit and miss counters of every cached endpoint"""
+    keys = [
+        _counter_key(endpoint, outcome)
+        for endpoint in CACHED_ENDPOINTS
+        for outcome in ('hits', 'misses')
+    ]
+    values = cache.get_many(keys)
+    stats = {}
+    for endpoint in CACHED_ENDPOINTS:
+        hits = values.get(_counter_key(endpoint, 'hits'), 0)
+        misses = values.get(_counter_key(endpoint, 'misses'), 0)
+        total = hits + misses
+        stats[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else None,
+        }
+    return stats
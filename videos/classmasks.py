@@ -0,0 +1,270 @@
+"""
+Per-frame class presence bitmasks and boolean frame queries.
+
+Every video keeps a vocabulary of the classes detected in it
+(``Video.class_vocabulary``), and every frame stores a bitmask of the classes
+present in it (bit i for class i of the vocabulary) plus its count per
+class. The detection stage writes both, so a query like ``person AND car AND
+NOT traffic_light`` or ``car >= 3`` is evaluated over one integer per frame
+with NumPy bitwise operations instead of joining frames to detections.
+
+Masks are signed 64-bit columns, so only the first MAX_MASK_CLASSES classes
+of a vocabulary get a bit; presence of the others is read from the counts.
+"""
+import re
+from itertools import chain
+import numpy as np
+from django.db.models import Count
+from .cache import bump_video_version
+from .models import VideoFrame, DetectedObject
+from .packing import packed_class_counts
+
+MAX_MASK_CLASSES = 63
+
+QUERY_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<op>&&?|\|\|?|!)
+      | (?P<compare>>=|<=|==?|>|<)
+      | (?P<number>\d+)(?![\w.-])
+      | "(?P<quoted>[^"]+)"
+      | (?P<word>[\w.-]+)
+    )
+''', re.VERBOSE)
+
+KEYWORDS = {'and': '&', 'or': '|', 'not': '!'}
+
+# Bounds on a query, so parsing and evaluating it stay within the recursion
+# limit: parentheses and NOTs nested in each other, and tokens overall
+MAX_QUERY_DEPTH = 32
+MAX_QUERY_TOKENS = 400
+
+class FrameQueryError(ValueError):
+    """Raised when a frame query cannot be parsed"""
+
+def class_mask(vocabulary, class_names):
+    """Bitmask of a set of classes, appending unseen ones to the vocabulary list"""
+    mask = 0
+    for name in class_names:
+        if name not in vocabulary:
+            vocabulary.append(name)
+        bit = vocabulary.index(name)
+        if bit < MAX_MASK_CLASSES:
+            mask |= 1 << bit
+    return mask
+
+def frame_class_fields(vocabulary, class_names):
+    """(class_mask, class_counts) of a frame with detections of the given classes"""
+    counts = {}
+    for name in class_names:
+        counts[name] = counts.get(name, 0) + 1
+    return class_mask(vocabulary, counts), counts
+
+def build_frame_class_index(video):
+    """
+    Recompute the class masks and counts of every frame of a video from its
+    detections, with one grouped query
+    """
+    frame_counts = {}
+    totals = {}
+    groups = (
+        DetectedObject.objects.filter(frame__video=video)
+        .values_list('frame_id', 'class_name')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    packed = ((frame_id, class_name, count) for frame_id, _, class_name, count in packed_class_counts(video))
+    for frame_id, class_name, count in chain(groups, packed):
+        frame_counts.setdefault(frame_id, {})[class_name] = count
+        totals[class_name] = totals.get(class_name, 0) + count
+
+    # The most frequent classes get the bits
+    vocabulary = sorted(totals, key=lambda name: (-totals[name], name))
+    frames = list(VideoFrame._default_manager.filter(video=video).only('id'))
+    for frame in frames:
+        frame.class_counts = frame_counts.get(frame.id, {})
+        frame.class_mask = class_mask(vocabulary, frame.class_counts)
+    VideoFrame._default_manager.bulk_update(frames, ['class_mask', 'class_counts'], batch_size=1000)
+    video.class_vocabulary = vocabulary
+    video.save(update_fields=['class_vocabulary', 'updated_at'])
+    # Bulk writes skip the model signals
+    bump_video_version(video.id)
+    return vocabulary
+
+def tokenize(query):
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = QUERY_TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            raise FrameQueryError(f'Unexpected input at position {position}: {query[position:position + 10]!r}')
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'op', KEYWORDS[value.lower()]
+        elif kind == 'quoted':
+            kind = 'word'
+        elif kind == 'op':
+            value = value[0]
+        tokens.append((kind, value))
+    return tokens
+
+def parse_frame_query(query):
+    """
+    Parse a boolean class expression into a tree of tuples:
+    ('class', name), ('count', name, operator, n), ('not', node),
+    ('and', left, right) and ('or', left, right). NOT binds tighter than
+    AND, which binds tighter than OR.
+    """
+    tokens = tokenize(query)
+    if len(tokens) > MAX_QUERY_TOKENS:
+        raise FrameQueryError(f'The query is too long (at most {MAX_QUERY_TOKENS} terms and operators)')
+    position = 0
+    depth = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else (None, None)
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == ('op', '|'):
+            take()
+            node = ('or', node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == ('op', '&'):
+            take()
+            node = ('and', node, parse_not())
+        return node
+
+    def nested(parse):
+        nonlocal depth
+        depth += 1
+        if depth > MAX_QUERY_DEPTH:
+            raise FrameQueryError(f'The query is nested too deeply (at most {MAX_QUERY_DEPTH} levels)')
+        node = parse()
+        depth -= 1
+        return node
+
+    def parse_not():
+        if peek() == ('op', '!'):
+            take()
+            return ('not', nested(parse_not))
+        if peek() == ('paren', '('):
+            take()
+            node = nested(parse_or)
+            if peek() != ('paren', ')'):
+                raise FrameQueryError('Missing closing parenthesis')
+            take()
+            return node
+        kind, value = peek()
+        if kind != 'word':
+            raise FrameQueryError('Expected a class name')
+        take()
+        if peek()[0] == 'compare':
+            operator = take()[1]
+            if peek()[0] != 'number':
+                raise FrameQueryError(f'Expected a count after {value} {operator}')
+            return ('count', value, '==' if operator == '=' else operator, int(take()[1]))
+        return ('class', value)
+
+    if not tokens:
+        raise FrameQueryError('The query is empty')
+    tree = parse_or()
+    if position != len(tokens):
+        raise FrameQueryError(f'Unexpected {tokens[position][1]!r}')
+    return tree
+
+COMPARISONS = {
+    '>=': np.greater_equal, '<=': np.less_equal, '>': np.greater,
+    '<': np.less, '==': np.equal,
+}
+
+class FrameClassArrays:
+    """Class masks of a video's frames, with counts loaded on demand"""
+
+    def __init__(self, video):
+        self.video = video
+        self.vocabulary = list(video.class_vocabulary)
+        rows = list(
+            VideoFrame._default_manager.filter(video=video)
+            .order_by('timestamp', 'frame_number')
+            .values_list('id', 'frame_number', 'timestamp', 'class_mask')
+        )
+        self.ids = [row[0] for row in rows]
+        self.frame_numbers = np.array([row[1] for row in rows], dtype=np.int64)
+        self.timestamps = np.array([row[2] for row in rows], dtype=np.float64)
+        self.masks = np.array([row[3] for row in rows], dtype=np.int64)
+        self._counts = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def counts(self, name):
+        """Detections of a class in each frame"""
+        if self._counts is None:
+            self._counts = list(
+                VideoFrame._default_manager.filter(video=self.video)
+                .order_by('timestamp', 'frame_number')
+                .values_list('class_counts', flat=True)
+            )
+        return np.array([counts.get(name, 0) for counts in self._counts], dtype=np.int64)
+
+    def present(self, name):
+        """Frames with at least one detection of a class"""
+        if name not in self.vocabulary:
+            return np.zeros(len(self), dtype=bool)
+        bit = self.vocabulary.index(name)
+        if bit >= MAX_MASK_CLASSES:
+            return self.counts(name) > 0
+        return (self.masks & np.int64(1 << bit)) != 0
+
+    def evaluate(self, tree):
+        """Boolean mask of the frames matching a parsed query"""
+        kind = tree[0]
+        if kind == 'class':
+            return self.present(tree[1])
+        if kind == 'count':
+            _, name, operator, count = tree
+            if count == 1 and operator == '>=':
+                return self.present(name)
+            if count == 0 and operator == '==':
+                return ~self.present(name)
+            return COMPARISONS[operator](self.counts(name), count)
+        if kind == 'not':
+            return ~self.evaluate(tree[1])
+        left, right = self.evaluate(tree[1]), self.evaluate(tree[2])
+        return left & right if kind == 'and' else left | right
+
+def query_frames(video, query):
+    """Arrays of a video's frames and the mask of those matching a query"""
+    tree = parse_frame_query(query)
+    arrays = FrameClassArrays(video)
+    return arrays, arrays.evaluate(tree)
+
+def frame_query_payload(video, q, limit=1000):
+    """The matching frames of a query, in time order, up to limit"""
+    arrays, mask = query_frames(video, q)
+    matches = np.flatnonzero(mask)
+    return {
+        'video_id': str(video.id),
+        'query': q,
+        'count': len(matches),
+        'frames': [
+            {
+                'id': str(arrays.ids[row]),
+                'frame_number': int(arrays.frame_numbers[row]),
+                'timestamp': float(arrays.timestamps[row]),
+            }
+            for row in matches[:limit]
+        ],
+    }
@@ -0,0 +1,149 @@
+"""
+Frame decoding at storage and analysis resolutions.
+
+A video is decoded once. Frame extraction only grabs the frames between two
+extracted ones, without converting them to images, and resizes each frame
+it keeps in steps, every image being resized from the previous one:
+
+* the stored image, at most FRAME_STORAGE_SIZE pixels on its longest side
+  (``None`` keeps the source resolution);
+* the analysis image, at most ANALYSIS_INPUT_SIZE pixels on its longest
+  side, kept on the frame (``frame.analysis_image``) for the detection
+  stage;
+* the optical flow image of videos.activity (``frame.flow_image``).
+
+No step upscales. With a region of interest (see videos.roi) the analysis
+image is cut from the decoded frame first, and the flow image comes from
+the stored image, optical flow covering the whole frame.
+
+Detection models take a square ANALYSIS_INPUT_SIZE input: the analysis
+image is letterboxed into it, centred on a gray canvas, and the Letterbox
+maps the boxes the model returns, in input pixels, back to the normalized
+(0-1) frame coordinates DetectedObject stores. Stored coordinates therefore
+do not depend on any of these resolutions, nor on the region of interest.
+"""
+import cv2
+import numpy as np
+from django.conf import settings
+from .activity import flow_image
+
+DECODING_DEFAULTS = {
+    'FRAME_STORAGE_SIZE': 1280,
+    'ANALYSIS_INPUT_SIZE': 640,
+}
+
+# Gray of the letterbox padding, as detectors are commonly trained with
+LETTERBOX_FILL = 114
+
+JPEG_QUALITY = 90
+
+def decoding_setting(name):
+    return getattr(settings, name, DECODING_DEFAULTS[name])
+
+def fit_size(width, height, size):
+    """(width, height) scaled down to at most ``size`` pixels on the longest side"""
+    if not size or max(width, height) <= size:
+        return width, height
+    scale = size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def resize_to(image, size):
+    """Image scaled down to at most ``size`` pixels on its longest side"""
+    height, width = image.shape[:2]
+    target = fit_size(width, height, size)
+    if target == (width, height):
+        return image
+    return cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+
+def decode_frame(frame, storage_size=None, analysis_size=None, roi=None):
+    """(stored, analysis, flow) images of a decoded BGR frame"""
+    if storage_size is None:
+        storage_size = decoding_setting('FRAME_STORAGE_SIZE')
+    analysis_size = analysis_size or decoding_setting('ANALYSIS_INPUT_SIZE')
+    stored = resize_to(frame, storage_size)
+    if roi is None:
+        analysis = resize_to(stored, analysis_size)
+        return stored, analysis, flow_image(analysis)
+    # The region is cut from the source, so the model gets all its detail
+    region, bounds = roi.crop(frame)
+    return stored, roi.mask(resize_to(region, analysis_size), bounds), flow_image(stored)
+
+def encode_jpeg(image):
+    """JPEG bytes of an image"""
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        raise ValueError('Could not encode frame as JPEG')
+    return data.tobytes()
+
+class Letterbox:
+    """
+    Placement of a frame's analysis image in a square model input of
+    ``size`` pixels: ``width`` x ``height`` pixels offset by ``pad_x`` and
+    ``pad_y``, showing the normalized (x0, y0, x1, y1) ``region`` of the
+    frame
+    """
+
+    def __init__(self, width, height, size, region=(0.0, 0.0, 1.0, 1.0)):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.pad_x = (size - width) // 2
+        self.pad_y = (size - height) // 2
+        self.region = tuple(region)
+
+    @classmethod
+    def fit(cls, frame_width, frame_height, size=None, roi=None):
+        """
+        Letterbox of a frame of the given size, at any stored resolution,
+        or of its region of interest
+        """
+        size = size or decoding_setting('ANALYSIS_INPUT_SIZE')
+        if roi is None:
+            return cls(*fit_size(frame_width, frame_height, size), size)
+        x0, y0, x1, y1 = roi.crop_box(frame_width, frame_height)
+        region = (x0 / frame_width, y0 / frame_height, x1 / frame_width, y1 / frame_height)
+        return cls(*fit_size(x1 - x0, y1 - y0, size), size, region)
+
+    def apply(self, image):
+        """Model input holding the image, resized to the letterbox if needed"""
+        if image.shape[:2] != (self.height, self.width):
+            image = cv2.resize(image, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        canvas = np.full((self.size, self.size) + image.shape[2:], LETTERBOX_FILL, dtype=image.dtype)
+        canvas[self.pad_y:self.pad_y + self.height, self.pad_x:self.pad_x + self.width] = image
+        return canvas
+
+    def to_normalized(self, boxes):
+        """
+        Normalized (x, y, width, height) frame boxes of (x, y, width, height)
+        boxes in input pixels, clipped to the region the input shows
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        offset = np.array([self.pad_x, self.pad_y])
+        extent = np.array([self.width, self.height], dtype=np.float64)
+        origin, span = np.array(self.region[:2]), np.subtract(self.region[2:], self.region[:2])
+        start = origin + np.clip((boxes[:, :2] - offset) / extent, 0.0, 1.0) * span
+        end = origin + np.clip((boxes[:, :2] + boxes[:, 2:] - offset) / extent, 0.0, 1.0) * span
+        return np.hstack([start, end - start])
+
+    def to_input(self, boxes):
+        """(x, y, width, height) boxes in input pixels of normalized frame boxes"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        origin, span = np.array(self.region[:2]), np.subtract(self.region[2:], self.region[:2])
+        extent = np.array([self.width, self.height], dtype=np.float64)
+        start = (boxes[:, :2] - origin) / span * extent + [self.pad_x, self.pad_y]
+        return np.hstack([start, boxes[:, 2:] / span * extent])
+
+def analysis_input(frame, size=None, roi=None):
+    """
+    (model input, Letterbox) of a frame or its region of interest, from the
+    analysis image decoded during extraction or else its stored image; the
+    input is None when neither can be read
+    """
+    letterbox = Letterbox.fit(frame.width, frame.height, size, roi)
+    image = getattr(frame, 'analysis_image', None)
+    if image is None and frame.image:
+        image = cv2.imread(frame.image.path)
+        if image is not None and roi is not None:
+            region, bounds = roi.crop(image)
+            image = roi.mask(resize_to(region, letterbox.size), bounds)
+    return (None if image is None else letterbox.apply(image)), letterbox
@@ -0,0 +1,185 @@
+"""
+Columnar export of a video's detections and events.
+
+Offline analytics jobs load a whole video at once, so instead of nested JSON
+pages the rows are read with a server-side iterator into typed NumPy columns
+and written as a single file: an NPZ archive holding both tables, or one
+Parquet table when pyarrow is installed. String columns with few distinct
+values (class names, event types, severities) are stored as small integer
+codes plus a vocabulary array (dictionary-encoded columns in Parquet).
+
+NPZ archive keys are the column names prefixed with the table name, e.g.
+``detections_bbox`` (float32, n x 4: x, y, width, height, normalized) or
+``events_start_time`` (float64 seconds).
+"""
+from itertools import islice
+import numpy as np
+from .models import DetectedObject, Event
+from .packing import packed_detection_arrays
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - depends on the environment
+    pyarrow = None
+
+EXPORT_FORMATS = ['npz', 'parquet']
+EXPORT_TABLES = ['detections', 'events']
+
+# Rows fetched from the database per batch
+EXPORT_CHUNK_SIZE = 10000
+
+# Columns stored as integer codes, mapped to the column holding their vocabulary
+CATEGORICAL_COLUMNS = {
+    'detections': {'class_id': 'class_names'},
+    'events': {'event_type': 'event_types', 'severity': 'severities', 'detected_by': 'detectors'},
+}
+
+def parquet_available():
+    """Whether Parquet export is possible in this environment"""
+    return pyarrow is not None
+
+def _batches(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the rows of a queryset as tuples of columns, one batch at a time"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield list(zip(*batch))
+
+def _encode_categories(values, vocabulary):
+    """Integer codes of values, growing the vocabulary in first-seen order"""
+    return np.array(
+        [vocabulary.setdefault(value, len(vocabulary)) for value in values],
+        dtype=np.int16
+    )
+
+def _optional_floats(values, dtype):
+    return np.array([np.nan if value is None else value for value in values], dtype=dtype)
+
+def _collect(queryset, fields, convert):
+    """
+    Read a queryset batch by batch and concatenate the typed columns that
+    ``convert`` builds from each batch
+    """
+    chunks = [convert(*columns) for columns in _batches(queryset, fields)]
+    if not chunks:
+        chunks = [convert(*([()] * len(fields)))]
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+def detection_table(video):
+    """Typed columns of every detection in a video, ordered by frame time"""
+    queryset = DetectedObject.objects.filter(frame__video=video).order_by(
+        'frame__timestamp', 'frame__frame_number', 'id'
+    )
+    classes = {}
+
+    def convert(frame_number, timestamp, class_name, confidence, x, y, width, height, track_id):
+        return {
+            'frame_number': np.array(frame_number, dtype=np.int32),
+            'timestamp': np.array(timestamp, dtype=np.float64),
+            'class_id': _encode_categories(class_name, classes),
+            'confidence': np.array(confidence, dtype=np.float32),
+            'bbox': np.array([x, y, width, height], dtype=np.float32).reshape(4, -1).T,
+            'track_id': np.array([value or '' for value in track_id], dtype=str),
+        }
+
+    fields = [
+        'frame__frame_number', 'frame__timestamp', 'class_name', 'confidence',
+        'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height', 'track_id'
+    ]
+    table = _collect(queryset, fields, convert)
+    frame_number, timestamp, records, vocabulary = packed_detection_arrays(video)
+    if len(records):
+        class_codes = _encode_categories(vocabulary.classes, classes)
+        packed = {
+            'frame_number': frame_number,
+            'timestamp': timestamp,
+            'class_id': class_codes[records['class_id']],
+            'confidence': records['confidence'].astype(np.float32),
+            'bbox': records['bbox'].astype(np.float32),
+            'track_id': np.array(['', *vocabulary.tracks], dtype=str)[records['track'] + 1],
+        }
+        table = {name: np.concatenate([table[name], packed[name]]) for name in table}
+        # Rows and packed frames are each in time order; merge them
+        order = np.lexsort((table['frame_number'], table['timestamp']))
+        table = {name: values[order] for name, values in table.items()}
+    table['class_names'] = np.array(list(classes), dtype=str)
+    return table
+
+def event_table(video):
+    """Typed columns of every event in a video, ordered by start time"""
+    queryset = Event.objects.filter(video=video).order_by('start_time', 'id')
+    vocabularies = {column: {} for column in CATEGORICAL_COLUMNS['events']}
+
+    def convert(event_id, event_type, severity, detected_by, start_time, end_time,
+                confidence, location_x, location_y, is_violation):
+        return {
+            'id': np.array([str(value) for value in event_id], dtype='<U36'),
+            'event_type': _encode_categories(event_type, vocabularies['event_type']),
+            'severity': _encode_categories(severity, vocabularies['severity']),
+            'detected_by': _encode_categories(detected_by, vocabularies['detected_by']),
+            'start_time': np.array(start_time, dtype=np.float64),
+            'end_time': _optional_floats(end_time, np.float64),
+            'confidence': np.array(confidence, dtype=np.float32),
+            'location': np.stack([
+                _optional_floats(location_x, np.float32),
+                _optional_floats(location_y, np.float32),
+            ], axis=1).reshape(-1, 2),
+            'is_violation': np.array(is_violation, dtype=bool),
+        }
+
+    table = _collect(queryset, [
+        'id', 'event_type', 'severity', 'detected_by', 'start_time', 'end_time',
+        'confidence', 'location_x', 'location_y', 'is_violation'
+    ], convert)
+    for column, vocabulary in vocabularies.items():
+        table[CATEGORICAL_COLUMNS['events'][column]] = np.array(list(vocabulary), dtype=str)
+    return table
+
+TABLE_BUILDERS = {
+    'detections': detection_table,
+    'events': event_table,
+}
+
+def write_npz(video, fileobj):
+    """Write both tables of a video to a compressed NPZ archive"""
+    arrays = {}
+    for name, build in TABLE_BUILDERS.items():
+        for column, values in build(video).items():
+            arrays[f'{name}_{column}'] = values
+    np.savez_compressed(fileobj, **arrays)
+
+def to_arrow(table_name, table):
+    """Convert a table of typed columns to a pyarrow Table"""
+    vocabularies = CATEGORICAL_COLUMNS[table_name]
+    columns = {}
+    for column, values in table.items():
+        if column in vocabularies.values():
+            continue
+        if column in vocabularies:
+            columns[column] = pyarrow.DictionaryArray.from_arrays(
+                values, pyarrow.array(table[vocabularies[column]])
+            )
+        elif values.ndim == 2:
+            columns[column] = pyarrow.FixedSizeListArray.from_arrays(
+                pyarrow.array(values.ravel()), values.shape[1]
+            )
+        else:
+            columns[column] = pyarrow.array(values)
+    return pyarrow.table(columns)
+
+def write_parquet(video, table_name, fileobj):
+    """Write one table of a video to a Parquet file"""
+    if pyarrow is None:
+        raise RuntimeError('Parquet export requires pyarrow')
+    table = TABLE_BUILDERS[table_name](video)
+    pyarrow.parquet.write_table(to_arrow(table_name, table), fileobj, compression='zstd')
+
+def export_video(video, fileobj, file_format='npz', table_name='detections'):
+    """Write a video's columnar export to a binary file object"""
+    if file_format == 'parquet':
+        write_parquet(video, table_name, fileobj)
+    else:
+        write_npz(video, fileobj)
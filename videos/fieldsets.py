@@ -0,0 +1,101 @@
+"""
+Sparse fieldsets for the video, frame and event endpoints.
+
+``?fields=id,timestamp,objects.class_name`` limits a response to the listed
+fields (dotted names select fields of nested objects), and
+``?expand=events`` limits the expandable nested relations (a video's events,
+a frame's detections, an event's related objects) to the listed ones;
+``?expand=`` with no value embeds none of them. Without either parameter
+every field is returned as before.
+
+The same selection prunes the queryset: views only prefetch relations that
+will be serialized, and selected_columns lists the model columns to load with
+``only()``, so unrequested data is never fetched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+def _parse_paths(value):
+    """Parse 'a,b.c,b.d' into the tree {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+class FieldSelection:
+    """Fields and expandable relations requested by a client"""
+
+    def __init__(self, fields=None, expand=None):
+        # None means everything, a tree of names restricts to its keys
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        """Selection of a GET request; other methods always use every field"""
+        if request is None or request.method != 'GET':
+            return cls()
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        return cls(
+            fields=_parse_paths(fields) if fields else None,
+            expand=_parse_paths(expand) if expand is not None else None,
+        )
+
+    @property
+    def is_everything(self):
+        return self.fields is None and self.expand is None
+
+    def includes(self, name, expandable=False):
+        """Whether a field is part of the response"""
+        if self.fields is not None and name not in self.fields:
+            return False
+        if expandable and self.expand is not None and name not in self.expand:
+            return False
+        return True
+
+    def nested(self, name):
+        """Selection applying to the fields of a nested object"""
+        fields = (self.fields or {}).get(name) or None
+        expand = (self.expand or {}).get(name) or None
+        return FieldSelection(fields, expand)
+
+def selected_columns(serializer_class, selection, required=()):
+    """
+    Model columns read by the selected fields of a ModelSerializer, for
+    ``only()``, or None when a field's source is not known and the queryset
+    must load every column.
+
+    Fields backed by a model column are resolved automatically; serializers
+    declare the columns of their method fields in ``Meta.field_requirements``.
+    Nested relations are skipped, as they are prefetched separately.
+    """
+    if selection.fields is None:
+        return None
+
+    serializer = serializer_class(selection=selection)
+    opts = serializer.Meta.model._meta
+    requirements = getattr(serializer.Meta, 'field_requirements', {})
+    columns = {opts.pk.name, *required}
+    for name, field in serializer.fields.items():
+        if name in requirements:
+            columns.update(requirements[name])
+            continue
+        if len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = opts.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        if model_field.one_to_many or model_field.many_to_many:
+            continue
+        columns.add(model_field.name)
+    return sorted(columns)
+
+def prune_columns(queryset, serializer_class, selection, required=()):
+    """Restrict a queryset to the columns the selection needs"""
+    columns = selected_columns(serializer_class, selection, required)
+    if columns is None:
+        return queryset
+    return queryset.only(*columns)
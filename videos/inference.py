@@ -0,0 +1,230 @@
+"""
+Inference models kept resident in each worker process.
+
+Analysis stages get their backends through ``get_model(name)`` rather than
+loading them per task. The VIDEO_MODELS setting maps a model name to the
+dotted path of its loader, a callable returning the model, and a version::
+
+    VIDEO_MODELS = {
+        'object_detector': {'loader': 'myapp.models.load_yolo', 'version': 'v8n-640'},
+    }
+
+Names it leaves out keep the mock backends below. A model is loaded on its
+first use in a process, or as soon as a Celery worker process starts when
+listed in VIDEO_MODELS_PRELOAD, then kept keyed by (name, version), so a new
+version is loaded on its next use. At most MODEL_CACHE_SIZE models stay
+resident; the least recently used one goes first.
+
+``model_stats()`` reports the load time, memory and uses of each resident
+model. Memory is the model's own ``memory_bytes()`` when it has one, else
+the growth of the process' resident set while it loaded (Linux only).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIDEO_MODELS = {
+    'object_detector': {'loader': 'videos.inference.MockObjectDetector', 'version': 'mock'},
+    'event_classifier': {'loader': 'videos.inference.MockEventClassifier', 'version': 'mock'},
+}
+
+DEFAULT_MODEL_CACHE_SIZE = 4
+
+class MockObjectDetector:
+    """
+    Stand-in detector returning random boxes, in input pixels, of objects
+    that drift across the scene from one call to the next
+    """
+
+    classes = [
+        'car', 'truck', 'bus', 'motorcycle', 'bicycle', 'person',
+        'traffic_light', 'stop_sign', 'crosswalk'
+    ]
+
+    def __init__(self):
+        # [class name, x, y, width, height, dx, dy] of the objects in view,
+        # as fractions of the input image
+        self.scene = []
+
+    def detect(self, image, letterbox):
+        """
+        (class name, confidence, (x, y, width, height)) of the objects in a
+        letterboxed input, boxes in input pixels
+        """
+        scene = []
+        for class_name, x, y, width, height, dx, dy in self.scene:
+            x, y = x + dx, y + dy
+            if random.random() < 0.9 and 0 <= x <= 0.8 and 0 <= y <= 0.8:
+                scene.append([class_name, x, y, width, height, dx, dy])
+        for _ in range(random.randint(0, 5) - len(scene)):
+            scene.append([
+                random.choice(self.classes),
+                random.uniform(0, 0.8), random.uniform(0, 0.8),
+                random.uniform(0.1, 0.2), random.uniform(0.1, 0.2),
+                random.uniform(-0.02, 0.02), random.uniform(-0.02, 0.02),
+            ])
+        self.scene = scene
+        return [
+            (class_name, random.uniform(0.7, 0.95), (
+                letterbox.pad_x + x * letterbox.width,
+                letterbox.pad_y + y * letterbox.height,
+                width * letterbox.width,
+                height * letterbox.height,
+            ))
+            for class_name, x, y, width, height, _, _ in scene
+        ]
+
+class MockEventClassifier:
+    """Stand-in classifier reporting random traffic events"""
+
+    # Reported as the detected_by of its events
+    name = 'mock_classifier'
+
+    events = [
+        {
+            'event_type': 'vehicle_movement',
+            'title': 'Vehicle Movement Detected',
+            'description': 'A vehicle was observed moving through the scene',
+            'severity': 'info'
+        },
+        {
+            'event_type': 'pedestrian_crossing',
+            'title': 'Pedestrian Crossing',
+            'description': 'A pedestrian crossed the street',
+            'severity': 'info'
+        },
+        {
+            'event_type': 'traffic_light_change',
+            'title': 'Traffic Light Change',
+            'description': 'Traffic light changed state',
+            'severity': 'info'
+        },
+        {
+            'event_type': 'sudden_stop',
+            'title': 'Sudden Vehicle Stop',
+            'description': 'A vehicle stopped suddenly',
+            'severity': 'warning'
+        }
+    ]
+
+    def classify(self, video, frames):
+        """Event field values of the events found in a video"""
+        results = []
+        for _ in range(random.randint(2, 8)):
+            event = dict(random.choice(self.events))
+            event['start_time'] = random.uniform(0, float(video.duration.total_seconds()) - 5)
+            event['end_time'] = event['start_time'] + random.uniform(1, 5)
+            event['confidence'] = random.uniform(0.7, 0.95)
+            results.append(event)
+        return results
+
+class ResidentModel:
+    """A loaded model with its load statistics"""
+
+    def __init__(self, name, version, model, load_seconds, memory_bytes):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.uses = 0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'load_seconds': round(self.load_seconds, 4),
+            'memory_bytes': self.memory_bytes,
+            'loaded_at': self.loaded_at,
+            'uses': self.uses,
+        }
+
+def model_spec(name):
+    """Loader path and version of a model name"""
+    spec = {**DEFAULT_VIDEO_MODELS, **getattr(settings, 'VIDEO_MODELS', {})}.get(name)
+    if spec is None:
+        raise ImproperlyConfigured(f'No model named {name!r} in VIDEO_MODELS')
+    return spec['loader'], str(spec.get('version', ''))
+
+def _resident_bytes():
+    """Resident set size of the process, None where it cannot be read"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _load(name, loader, version):
+    before = _resident_bytes()
+    start = time.perf_counter()
+    model = import_string(loader)()
+    load_seconds = time.perf_counter() - start
+    if hasattr(model, 'memory_bytes'):
+        memory = int(model.memory_bytes())
+    else:
+        after = _resident_bytes()
+        memory = None if before is None or after is None else max(after - before, 0)
+    logger.info('Loaded model %s (%s) in %.3fs, %s bytes', name, version, load_seconds, memory)
+    return ResidentModel(name, version, model, load_seconds, memory)
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+_loading_locks = {}
+
+def get_model(name):
+    """The resident model of a name, loaded on first use"""
+    loader, version = model_spec(name)
+    key = (name, version)
+    with _models_lock:
+        resident = _models.get(key)
+        if resident is None:
+            load_lock = _loading_locks.setdefault(key, threading.Lock())
+        else:
+            _models.move_to_end(key)
+            resident.uses += 1
+            return resident.model
+
+    # Threads asking for the same model wait for a single load
+    with load_lock:
+        with _models_lock:
+            resident = _models.get(key)
+        if resident is None:
+            resident = _load(name, loader, version)
+            cache_size = max(1, getattr(settings, 'MODEL_CACHE_SIZE', DEFAULT_MODEL_CACHE_SIZE))
+            with _models_lock:
+                _models[key] = resident
+                _loading_locks.pop(key, None)
+                while len(_models) > cache_size:
+                    (evicted, evicted_version), _ = _models.popitem(last=False)
+                    logger.info('Evicted model %s (%s)', evicted, evicted_version)
+    with _models_lock:
+        if key in _models:
+            _models.move_to_end(key)
+        resident.uses += 1
+    return resident.model
+
+def model_stats():
+    """Load statistics of the models resident in this process, most recently used last"""
+    with _models_lock:
+        return [resident.as_dict() for resident in _models.values()]
+
+def clear_models():
+    """Drop every resident model of this process"""
+    with _models_lock:
+        _models.clear()
+
+@worker_process_init.connect
+def preload_models(**kwargs):
+    """Load the VIDEO_MODELS_PRELOAD models as a worker process starts"""
+    for name in getattr(settings, 'VIDEO_MODELS_PRELOAD', []):
+        get_model(name)
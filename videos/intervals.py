@@ -0,0 +1,166 @@
+"""
+In-process interval index of a video's events, for playback queries.
+
+While a user scrubs through a video the player asks which events are active
+at the playhead many times per second. Each worker keeps a centered interval
+tree of the events of recently played videos, keyed by the video's cache
+version (see videos.cache), so the tree is rebuilt only after the video's
+events change and each query is a walk down a shallow tree.
+
+An event spans [start_time, end], its end being end_time, else start_time
+plus duration, else start_time. Overlap queries over [start, end] combine a
+stabbing query at ``start`` with a binary search for the events starting
+inside the range.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from threading import Lock
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from .cache import get_video_version
+from .models import Video, Event
+
+# Videos whose interval trees a worker keeps
+INTERVAL_CACHE_SIZE = 64
+
+# Event fields returned by the playback queries
+INTERVAL_EVENT_FIELDS = [
+    'id', 'event_type', 'title', 'severity', 'start_time', 'end_time', 'duration',
+    'confidence', 'is_violation', 'location_x', 'location_y'
+]
+
+def effective_end():
+    """Database expression of the end of an event"""
+    return Coalesce('end_time', F('start_time') + Coalesce('duration', Value(0.0)))
+
+def at_condition(time):
+    """Events active at a time, for queryset.alias(event_end=effective_end())"""
+    return Q(start_time__lte=time, event_end__gte=time)
+
+def overlap_condition(start, end):
+    """Events overlapping [start, end], for queryset.alias(event_end=effective_end())"""
+    return Q(start_time__lte=end, event_end__gte=start)
+
+class _Node:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+class IntervalTree:
+    """
+    Static centered interval tree over (start, end, item) triples.
+
+    Each node holds the intervals containing its center, sorted by start and
+    by descending end; the others go to the left or right subtree.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.size = len(intervals)
+        self.starts = [interval[0] for interval in intervals]
+        self.sorted_intervals = intervals
+        self.root = self._build(intervals)
+
+    def __len__(self):
+        return self.size
+
+    def _build(self, intervals):
+        # Built with an explicit stack, so that degenerate inputs cannot hit
+        # the recursion limit
+        if not intervals:
+            return None
+        root = _Node()
+        stack = [(root, intervals)]
+        while stack:
+            node, intervals = stack.pop()
+            node.center = intervals[len(intervals) // 2][0]
+            left, here, right = [], [], []
+            for interval in intervals:
+                if interval[1] < node.center:
+                    left.append(interval)
+                elif interval[0] > node.center:
+                    right.append(interval)
+                else:
+                    here.append(interval)
+            node.by_start = here
+            node.by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+            node.left = node.right = None
+            for side, members in (('left', left), ('right', right)):
+                if members:
+                    child = _Node()
+                    setattr(node, side, child)
+                    stack.append((child, members))
+        return root
+
+    def at(self, time):
+        """Items of the intervals containing a time, in no particular order"""
+        found = []
+        node = self.root
+        while node is not None:
+            if time < node.center:
+                for start, _, item in node.by_start:
+                    if start > time:
+                        break
+                    found.append(item)
+                node = node.left
+            else:
+                for _, end, item in node.by_end:
+                    if end < time:
+                        break
+                    found.append(item)
+                node = node.right
+        return found
+
+    def overlapping(self, start, end):
+        """Items of the intervals overlapping [start, end], in no particular order"""
+        found = self.at(start)
+        first = bisect_right(self.starts, start)
+        last = bisect_right(self.starts, end)
+        found.extend(interval[2] for interval in self.sorted_intervals[first:last])
+        return found
+
+def event_intervals(video_id):
+    """(start, end, event dict) triples of a video's events"""
+    intervals = []
+    for values in Event.objects.filter(video_id=video_id).values_list(*INTERVAL_EVENT_FIELDS):
+        event = dict(zip(INTERVAL_EVENT_FIELDS, values))
+        event['id'] = str(event['id'])
+        start = event['start_time']
+        end = event['end_time']
+        if end is None:
+            end = start + (event['duration'] or 0.0)
+        intervals.append((start, end, event))
+    return intervals
+
+_trees = OrderedDict()
+_trees_lock = Lock()
+
+def get_event_tree(video_id, user):
+    """
+    The interval tree of a user's video, rebuilt when the video's version
+    changes, or None when the user has no such video. A cached tree is served
+    without touching the database.
+    """
+    version = get_video_version(video_id)
+    with _trees_lock:
+        entry = _trees.get(video_id)
+        if entry is not None and entry[0] == version:
+            _trees.move_to_end(video_id)
+            return entry[2] if entry[1] == user.pk else None
+
+    owner_id = Video.objects.filter(id=video_id).values_list('user_id', flat=True).first()
+    if owner_id is None:
+        return None
+    tree = IntervalTree(event_intervals(video_id))
+    with _trees_lock:
+        _trees[video_id] = (version, owner_id, tree)
+        _trees.move_to_end(video_id)
+        while len(_trees) > INTERVAL_CACHE_SIZE:
+            _trees.popitem(last=False)
+    return tree if owner_id == user.pk else None
+
+def clear_event_trees():
+    with _trees_lock:
+        _trees.clear()
+
+def sort_events(events):
+    """Order playback results like the events endpoint"""
+    return sorted(events, key=lambda event: event['start_time'])
@@ -0,0 +1,103 @@
+"""
+Links between a video's events and the frames and detections they cover.
+
+After the analysis stages, the events of a video (sorted by start) are
+swept against its frames (sorted by timestamp): each event covers the
+contiguous run of frames whose timestamp lies in [start_time, end], found by
+merging the two sorted sequences, and a difference array over the frame
+positions turns those runs into each frame's ``has_events`` flag in one
+pass. The detections of the covered frames become the event's
+``related_objects`` (only those of the event's track when the event names
+one), written in bulk through the many-to-many table, so the UI can jump
+from an event to its evidence with an indexed lookup.
+"""
+import numpy as np
+from django.db import transaction
+from .cache import bump_video_version
+from .models import VideoFrame, DetectedObject, Event
+
+def event_frame_ranges(starts, ends, timestamps):
+    """
+    [first, last) positions in sorted frame timestamps of the frames covered
+    by each [start, end] interval
+    """
+    first = np.searchsorted(timestamps, starts, side='left')
+    last = np.searchsorted(timestamps, ends, side='right')
+    return first, np.maximum(last, first)
+
+def covered_frames(first, last, frame_count):
+    """Whether each frame lies in at least one of the [first, last) runs"""
+    delta = np.zeros(frame_count + 1, dtype=np.int64)
+    np.add.at(delta, first, 1)
+    np.add.at(delta, last, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def expand_ranges(first, last):
+    """(range index, position) of every position of the [first, last) ranges"""
+    sizes = last - first
+    owner = np.repeat(np.arange(len(first)), sizes)
+    position = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + first[owner]
+    return owner, position
+
+def link_video_events(video):
+    """
+    Set ``has_events`` on the frames of a video and link each event to the
+    detections of the frames it covers; returns the number of links written
+    """
+    frames = list(
+        VideoFrame._default_manager.filter(video=video)
+        .order_by('timestamp', 'frame_number')
+        .only('id', 'timestamp', 'has_events')
+    )
+    events = list(
+        Event.objects.filter(video=video).order_by('start_time')
+        .values_list('id', 'start_time', 'end_time', 'duration', 'metadata')
+    )
+    timestamps = np.array([frame.timestamp for frame in frames], dtype=np.float64)
+    starts = np.array([row[1] for row in events], dtype=np.float64)
+    ends = np.array([
+        end if end is not None else start + (duration or 0.0)
+        for _, start, end, duration, _ in events
+    ], dtype=np.float64)
+    first, last = event_frame_ranges(starts, ends, timestamps)
+
+    covered = covered_frames(first, last, len(frames))
+    changed = []
+    for frame, has_events in zip(frames, covered.tolist()):
+        if frame.has_events != has_events:
+            frame.has_events = has_events
+            changed.append(frame)
+
+    # Detections sorted by frame position, so the detections of a run of
+    # frames are a run as well
+    frame_position = {frame.id: position for position, frame in enumerate(frames)}
+    detections = sorted(
+        (frame_position[frame_id], object_id, track_id or '')
+        for object_id, frame_id, track_id in
+        DetectedObject.objects.filter(frame__video=video).values_list('id', 'frame_id', 'track_id')
+    )
+    detection_frame = np.array([row[0] for row in detections], dtype=np.int64)
+    tracks = {'': 0}
+    detection_track = np.array([tracks.setdefault(row[2], len(tracks)) for row in detections], dtype=np.int64)
+    # Events naming a track that has no detections match none of them
+    event_track = np.array([
+        tracks.get(str(row[4].get('track_id') or ''), -1) for row in events
+    ], dtype=np.int64)
+
+    event, detection = expand_ranges(
+        np.searchsorted(detection_frame, first, side='left'),
+        np.searchsorted(detection_frame, last, side='left')
+    )
+    keep = (event_track[event] == 0) | (event_track[event] == detection_track[detection])
+    related = Event.related_objects.through
+    links = [
+        related(event_id=events[event_row][0], detectedobject_id=detections[detection_row][1])
+        for event_row, detection_row in zip(event[keep].tolist(), detection[keep].tolist())
+    ]
+
+    with transaction.atomic():
+        VideoFrame._default_manager.bulk_update(changed, ['has_events'], batch_size=1000)
+        created = related.objects.bulk_create(links, batch_size=1000, ignore_conflicts=True)
+    # Bulk writes skip the model signals
+    bump_video_version(video.id)
+    return len(created)
@@ -0,0 +1,143 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+from videos.export import detection_table
+from videos.models import Video, VideoFrame, DetectedObject
+from videos.packing import DetectionVocabulary, pack_detections
+from videos.views import VideoFramesView
+
+User = get_user_model()
+
+STORAGE_TABLES = [VideoFrame._meta.db_table, DetectedObject._meta.db_table]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the storage size, frames page latency and full read time of '
+        'row-per-box and packed detections on generated videos (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=2000, help='Frames per video')
+        parser.add_argument('--objects', type=int, default=20, help='Detections per frame')
+        parser.add_argument('--tracks', type=int, default=200, help='Distinct track ids per video')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best is kept')
+
+    def table_bytes(self):
+        """Bytes used by the frame and detection tables with their indexes, when measurable"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT SUM(pg_total_relation_size(name::regclass)) FROM unnest(%s) AS name',
+                    [STORAGE_TABLES]
+                )
+            elif connection.vendor == 'sqlite':
+                try:
+                    cursor.execute(
+                        'SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                        '(SELECT name FROM sqlite_master WHERE tbl_name IN (%s, %s))',
+                        STORAGE_TABLES
+                    )
+                except Exception:
+                    return None
+            else:
+                return None
+            return cursor.fetchone()[0] or 0
+
+    def generate_detections(self, frame_count, object_count, track_count):
+        rng = random.Random(0)
+        classes = ['car', 'truck', 'bus', 'person', 'bicycle', 'motorcycle', 'traffic_light']
+        return [
+            [
+                {
+                    'class_name': rng.choice(classes),
+                    'confidence': rng.uniform(0.3, 1.0),
+                    'bbox_x': rng.random(),
+                    'bbox_y': rng.random(),
+                    'bbox_width': rng.uniform(0.01, 0.3),
+                    'bbox_height': rng.uniform(0.01, 0.3),
+                    'track_id': f'track_{rng.randrange(track_count)}',
+                }
+                for _ in range(object_count)
+            ]
+            for _ in range(frame_count)
+        ]
+
+    def create_video(self, user, storage, detections):
+        video = Video.objects.create(
+            user=user,
+            title=f'Detection storage benchmark ({storage})',
+            file='videos/benchmark.mp4',
+            duration=timedelta(seconds=len(detections)),
+            status='completed'
+        )
+        vocabulary = DetectionVocabulary()
+        frames = VideoFrame._default_manager.bulk_create([
+            VideoFrame(
+                video=video,
+                frame_number=number * 30,
+                timestamp=float(number),
+                image=f'frames/frame_{number:06d}.jpg',
+                width=1920,
+                height=1080,
+                file_size=250000,
+                has_objects=bool(boxes),
+                packed_detections=pack_detections(boxes, vocabulary) if storage == 'packed' else None
+            )
+            for number, boxes in enumerate(detections)
+        ], batch_size=1000)
+        if storage == 'packed':
+            video.packed_vocabulary = vocabulary.as_json()
+            video.save(update_fields=['packed_vocabulary'])
+        else:
+            DetectedObject.objects.bulk_create([
+                DetectedObject(frame=frame, **box)
+                for frame, boxes in zip(frames, detections)
+                for box in boxes
+            ], batch_size=1000)
+        return video
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    def frames_page(self, user, video):
+        """Serialize the first frames page with detections, as the frames endpoint does"""
+        request = APIRequestFactory().get(f'/api/v1/videos/{video.id}/frames/')
+        force_authenticate(request, user=user)
+        view = VideoFramesView()
+        view.setup(request, video_id=video.id)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        page = view.paginate_queryset(view.filter_queryset(view.get_queryset()))
+        return view.get_serializer(page, many=True).data
+
+    def handle(self, *args, **options):
+        detections = self.generate_detections(options['frames'], options['objects'], options['tracks'])
+        repeat = options['repeat']
+        self.stdout.write(
+            f"{options['frames']} frames with {options['objects']} detections each, "
+            f"{options['tracks']} tracks"
+        )
+        self.stdout.write(f"  {'storage':<8} {'size':>12} {'frames page':>14} {'full read':>12}")
+
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+            for storage in ('rows', 'packed'):
+                before = self.table_bytes()
+                video = self.create_video(user, storage, detections)
+                after = self.table_bytes()
+                size = 'n/a' if before is None else f'{(after - before) / 1024 / 1024:.1f} MiB'
+                page = self.best_of(repeat, lambda: self.frames_page(user, video))
+                read = self.best_of(repeat, lambda: detection_table(video))
+                self.stdout.write(f'  {storage:<8} {size:>12} {page:11.2f} ms {read:9.2f} ms')
+            transaction.set_rollback(True)
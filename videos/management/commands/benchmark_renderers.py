@@ -0,0 +1,101 @@
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from videos.models import VideoFrame, DetectedObject
+from videos.renderers import ORJSONRenderer, MessagePackRenderer, msgpack, orjson
+from videos.serializers import DetectedObjectSerializer, VideoFrameSerializer
+
+
+class StockDetectedObjectSerializer(DetectedObjectSerializer):
+    class Meta(DetectedObjectSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+
+class StockVideoFrameSerializer(VideoFrameSerializer):
+    objects = StockDetectedObjectSerializer(many=True, read_only=True)
+
+    class Meta(VideoFrameSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure serialization and render time and payload size of a frames-with-detections page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=100, help='Frames on the page')
+        parser.add_argument('--objects', type=int, default=25, help='Detections per frame')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best is kept')
+
+    def build_page(self, frame_count, object_count):
+        """Unsaved frames with prefetched detections, like a frames page from the API"""
+        rng = random.Random(0)
+        classes = ['car', 'truck', 'bus', 'person', 'bicycle', 'motorcycle', 'traffic_light']
+        frames = []
+        for number in range(frame_count):
+            frame = VideoFrame(
+                id=uuid.UUID(int=rng.getrandbits(128)),
+                frame_number=number * 30,
+                timestamp=number,
+                image=f'frames/frame_{number:06d}.jpg',
+                width=1920,
+                height=1080,
+                file_size=250000,
+                has_objects=True,
+                is_keyframe=number % 10 == 0
+            )
+            frame._prefetched_objects_cache = {'objects': [
+                DetectedObject(
+                    id=uuid.UUID(int=rng.getrandbits(128)),
+                    frame=frame,
+                    class_name=rng.choice(classes),
+                    confidence=rng.uniform(0.3, 1.0),
+                    bbox_x=rng.random(),
+                    bbox_y=rng.random(),
+                    bbox_width=rng.uniform(0.01, 0.3),
+                    bbox_height=rng.uniform(0.01, 0.3),
+                    track_id=f'track_{rng.randrange(1000)}',
+                    attributes={'color': rng.choice(['red', 'white', 'black'])}
+                )
+                for _ in range(object_count)
+            ]}
+            frames.append(frame)
+        return frames
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000, result
+
+    def handle(self, *args, **options):
+        frames = self.build_page(options['frames'], options['objects'])
+        repeat = options['repeat']
+        self.stdout.write(
+            f"Page of {options['frames']} frames with {options['objects']} detections each"
+        )
+
+        self.stdout.write('\nSerialization')
+        data = None
+        for label, serializer_class in (('stock ListSerializer', StockVideoFrameSerializer),
+                                        ('ReadOnlyListSerializer', VideoFrameSerializer)):
+            elapsed, data = self.best_of(repeat, lambda: serializer_class(frames, many=True).data)
+            self.stdout.write(f'  {label:<24} {elapsed:9.2f} ms')
+
+        self.stdout.write('\nRendering')
+        renderers = [('JSONRenderer', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('ORJSONRenderer', ORJSONRenderer()))
+        else:
+            self.stdout.write('  orjson is not installed, ORJSONRenderer uses the stdlib encoder')
+        if msgpack is not None:
+            renderers.append(('MessagePackRenderer', MessagePackRenderer()))
+        else:
+            self.stdout.write('  msgpack is not installed, skipping MessagePackRenderer')
+        for label, renderer in renderers:
+            elapsed, payload = self.best_of(repeat, lambda: renderer.render(data))
+            self.stdout.write(f'  {label:<24} {elapsed:9.2f} ms {len(payload) / 1024:10.1f} KiB')
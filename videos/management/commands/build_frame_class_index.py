@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from videos.classmasks import build_frame_class_index
+from videos.models import Video
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the per-frame class masks and counts of videos analysed before '
+        'they were stored, or of the given videos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'video_ids', nargs='*',
+            help='Ids of the videos to index (default: videos without a class vocabulary)'
+        )
+
+    def handle(self, *args, **options):
+        if options['video_ids']:
+            try:
+                videos = list(Video.objects.filter(id__in=options['video_ids']))
+            except ValidationError as exc:
+                raise CommandError(str(exc)) from exc
+            if len(videos) != len(set(options['video_ids'])):
+                raise CommandError('Some of the given videos were not found')
+        else:
+            videos = Video.objects.filter(class_vocabulary=[]).iterator()
+
+        indexed = 0
+        for video in videos:
+            build_frame_class_index(video)
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed the frame classes of {indexed} videos'))
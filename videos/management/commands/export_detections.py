@@ -0,0 +1,36 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from videos import export
+from videos.models import Video
+
+
+class Command(BaseCommand):
+    help = "Export a video's detections and events in a columnar format (NPZ or Parquet)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('video_id', help='Id of the video to export')
+        parser.add_argument('--output', help='Output path (default: <video_id>.npz or <video_id>-<table>.parquet)')
+        parser.add_argument('--file-format', choices=export.EXPORT_FORMATS, default='npz')
+        parser.add_argument(
+            '--table', choices=export.EXPORT_TABLES, default='detections',
+            help='Table written by a Parquet export; NPZ archives hold both'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            video = Video.objects.get(id=options['video_id'])
+        except (Video.DoesNotExist, ValidationError) as exc:
+            raise CommandError(f"Video {options['video_id']} not found") from exc
+
+        file_format = options['file_format']
+        if file_format == 'parquet' and not export.parquet_available():
+            raise CommandError('Parquet export requires pyarrow')
+
+        output = options['output']
+        if not output:
+            output = f'{video.id}.npz' if file_format == 'npz' else f"{video.id}-{options['table']}.parquet"
+
+        with open(output, 'wb') as fileobj:
+            export.export_video(video, fileobj, file_format, options['table'])
+
+        self.stdout.write(self.style.SUCCESS(f'Exported video {video.id} to {output}'))
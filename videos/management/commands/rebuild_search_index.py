@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from chat.models import Message
+from videos import search
+from videos.models import Video, Event, SearchEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of videos, events and chat messages'
+
+    def handle(self, *args, **options):
+        SearchEntry.objects.all().delete()
+
+        videos = Video.objects.all()
+        for video in videos.iterator():
+            search.index_video(video)
+
+        events = Event.objects.select_related('video')
+        for event in events.iterator():
+            search.index_event(event)
+
+        messages = Message.objects.filter(is_deleted=False).select_related('conversation')
+        for message in messages.iterator():
+            search.index_message(message)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {SearchEntry.objects.count()} search entries'
+        ))
@@ -0,0 +1,123 @@
+"""
+Temporal non-maximum suppression of a video's events.
+
+Classifiers and guideline rules can report the same occurrence several
+times as overlapping or back-to-back events. After the analysis stages, the
+events of a video are sorted by (type, guideline, start) and swept once with
+NumPy: an event joins the current cluster when it starts at most
+``EVENT_MERGE_GAP`` seconds after the latest end seen in that cluster. Each
+cluster of several events is then collapsed into its most confident event,
+stretched over the whole cluster, with the most severe severity and the
+related objects of every member; the other members are deleted.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import Event
+
+# Seconds between two events of a type under which they are merged
+DEFAULT_MERGE_GAP = 1.0
+
+SEVERITY_RANK = {severity: rank for rank, (severity, _) in enumerate(Event.SEVERITY_CHOICES)}
+
+def merge_gap():
+    return getattr(settings, 'EVENT_MERGE_GAP', DEFAULT_MERGE_GAP)
+
+def cluster_intervals(groups, starts, ends, gap):
+    """
+    Cluster label of each interval, for intervals sorted by (group, start):
+    a new cluster begins with each group and after each gap wider than
+    ``gap`` to the furthest end seen so far in the cluster
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64)
+    # Offsetting every group above the previous ones turns the per-group
+    # running maximum of the ends into one cumulative maximum
+    span = float(np.max(ends) - np.min(starts)) + gap + 1.0
+    offset = (groups - groups[0]) * span
+    reach = np.maximum.accumulate(ends + offset) - offset
+    breaks = (groups[1:] != groups[:-1]) | (starts[1:] > reach[:-1] + gap)
+    return np.concatenate(([0], np.cumsum(breaks)))
+
+def merge_video_events(video, gap=None):
+    """
+    Merge the overlapping events of a video in place; returns the number of
+    events removed
+    """
+    gap = merge_gap() if gap is None else gap
+    rows = list(Event.objects.filter(video=video).values_list(
+        'id', 'event_type', 'guideline_reference', 'start_time', 'end_time', 'duration', 'confidence'
+    ))
+    if len(rows) < 2:
+        return 0
+
+    keys = {}
+    groups = np.array([keys.setdefault((row[1], row[2]), len(keys)) for row in rows], dtype=np.int64)
+    starts = np.array([row[3] for row in rows], dtype=np.float64)
+    ends = np.array([
+        end if end is not None else start + (duration or 0.0)
+        for _, _, _, start, end, duration, _ in rows
+    ], dtype=np.float64)
+    confidence = np.array([row[6] for row in rows], dtype=np.float64)
+
+    order = np.lexsort((starts, groups))
+    labels = cluster_intervals(groups[order], starts[order], ends[order], gap)
+    first = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+    sizes = np.diff(np.append(first, len(order)))
+    if (sizes == 1).all():
+        return 0
+
+    # The most confident member of each cluster is kept
+    by_confidence = np.lexsort((-confidence[order], labels))
+    keepers = order[by_confidence[first]]
+    cluster_start = np.minimum.reduceat(starts[order], first)
+    cluster_end = np.maximum.reduceat(ends[order], first)
+
+    merged = {}
+    for cluster in np.flatnonzero(sizes > 1):
+        members = order[first[cluster]:first[cluster] + sizes[cluster]]
+        merged[rows[keepers[cluster]][0]] = {
+            'members': [rows[member][0] for member in members],
+            'start_time': float(cluster_start[cluster]),
+            'end_time': float(cluster_end[cluster]),
+        }
+    return apply_merges(merged)
+
+def apply_merges(merged):
+    """Write merged clusters: update each keeper, move related objects, delete the rest"""
+    member_ids = [member for cluster in merged.values() for member in cluster['members']]
+    members = Event.objects.in_bulk(member_ids)
+    related = Event.related_objects.through
+    links = list(related.objects.filter(event_id__in=member_ids).values_list('event_id', 'detectedobject_id'))
+    keeper_of = {
+        member: keeper for keeper, cluster in merged.items() for member in cluster['members']
+    }
+
+    keepers = []
+    for keeper_id, cluster in merged.items():
+        events = [members[member] for member in cluster['members']]
+        keeper = members[keeper_id]
+        keeper.start_time = cluster['start_time']
+        keeper.end_time = cluster['end_time']
+        keeper.duration = cluster['end_time'] - cluster['start_time']
+        keeper.severity = max(
+            (event.severity for event in events), key=lambda severity: SEVERITY_RANK.get(severity, -1)
+        )
+        keeper.is_violation = any(event.is_violation for event in events)
+        keeper.metadata = {**keeper.metadata, 'merged_events': len(events)}
+        keepers.append(keeper)
+
+    removed = [member for member in member_ids if member not in merged]
+    with transaction.atomic():
+        related.objects.bulk_create([
+            related(event_id=keeper_of[event_id], detectedobject_id=object_id)
+            for event_id, object_id in links
+            if keeper_of[event_id] != event_id
+        ], ignore_conflicts=True)
+        Event.objects.bulk_update(
+            keepers, ['start_time', 'end_time', 'duration', 'severity', 'is_violation', 'metadata']
+        )
+        # Deleting through the queryset still sends the signals that
+        # unindex the events and invalidate the video's caches
+        Event.objects.filter(id__in=removed).delete()
+    return len(removed)
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE search_entries_fts USING fts5(
+        title, body, content='search_entries', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER search_entries_ai AFTER INSERT ON search_entries BEGIN
+        INSERT INTO search_entries_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER search_entries_ad AFTER DELETE ON search_entries BEGIN
+        INSERT INTO search_entries_fts(search_entries_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER search_entries_au AFTER UPDATE ON search_entries BEGIN
+        INSERT INTO search_entries_fts(search_entries_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_entries_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS search_entries_au',
+    'DROP TRIGGER IF EXISTS search_entries_ad',
+    'DROP TRIGGER IF EXISTS search_entries_ai',
+    'DROP TABLE IF EXISTS search_entries_fts',
+]
+
+POSTGRESQL_FORWARD = [
+    """ALTER TABLE search_entries ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(body, '')), 'B')
+        ) STORED""",
+    'CREATE INDEX search_entries_vector_idx ON search_entries USING GIN (search_vector)',
+]
+
+POSTGRESQL_REVERSE = [
+    'DROP INDEX IF EXISTS search_entries_vector_idx',
+    'ALTER TABLE search_entries DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+create_fulltext_index = run_vendor_sql({
+    'sqlite': SQLITE_FORWARD,
+    'postgresql': POSTGRESQL_FORWARD,
+})
+
+drop_fulltext_index = run_vendor_sql({
+    'sqlite': SQLITE_REVERSE,
+    'postgresql': POSTGRESQL_REVERSE,
+})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('video', 'Video'), ('event', 'Event'), ('message', 'Message')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videos.video')),
+            ],
+            options={
+                'verbose_name': 'Search Entry',
+                'verbose_name_plural': 'Search Entries',
+                'db_table': 'search_entries',
+                'unique_together': {('entity_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0002_search_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Embedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('frame', 'Frame'), ('event', 'Event')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('model_name', models.CharField(max_length=100)),
+                ('dimensions', models.PositiveIntegerField()),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='videos.video')),
+            ],
+            options={
+                'verbose_name': 'Embedding',
+                'verbose_name_plural': 'Embeddings',
+                'db_table': 'embeddings',
+                'unique_together': {('entity_type', 'object_id', 'model_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_embeddings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoTimeline',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline', serialize=False, to='videos.video')),
+                ('duration', models.FloatField()),
+                ('bucket_widths', models.JSONField(default=list)),
+                ('data', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Video Timeline',
+                'verbose_name_plural': 'Video Timelines',
+                'db_table': 'video_timelines',
+            },
+        ),
+    ]
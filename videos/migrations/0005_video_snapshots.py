@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_video_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoSnapshot',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='videos.video')),
+                ('schema_version', models.PositiveIntegerField()),
+                ('revision', models.PositiveIntegerField(default=1)),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Video Snapshot',
+                'verbose_name_plural': 'Video Snapshots',
+                'db_table': 'video_snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:14
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_video_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackSummary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('track_id', models.CharField(max_length=50)),
+                ('class_name', models.CharField(max_length=100)),
+                ('first_seen', models.FloatField()),
+                ('last_seen', models.FloatField()),
+                ('dwell_time', models.FloatField()),
+                ('detections_count', models.PositiveIntegerField()),
+                ('mean_confidence', models.FloatField()),
+                ('start_x', models.FloatField()),
+                ('start_y', models.FloatField()),
+                ('end_x', models.FloatField()),
+                ('end_y', models.FloatField()),
+                ('distance', models.FloatField()),
+                ('mean_speed', models.FloatField()),
+                ('max_speed', models.FloatField()),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='videos.video')),
+            ],
+            options={
+                'verbose_name': 'Track Summary',
+                'verbose_name_plural': 'Track Summaries',
+                'db_table': 'track_summaries',
+                'ordering': ['first_seen'],
+                'indexes': [models.Index(fields=['video', 'max_speed'], name='track_summa_video_i_eee257_idx'), models.Index(fields=['video', 'first_seen'], name='track_summa_video_i_1820dd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('video', 'track_id'), name='unique_video_track')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_track_summaries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['video', 'start_time', 'end_time'], name='events_video_i_8eb923_idx'),
+        ),
+    ]
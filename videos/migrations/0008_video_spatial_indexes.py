@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_event_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoSpatialIndex',
+            fields=[
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spatial_index', serialize=False, to='videos.video')),
+                ('grid_size', models.PositiveIntegerField()),
+                ('detections_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Video Spatial Index',
+                'verbose_name_plural': 'Video Spatial Indexes',
+                'db_table': 'video_spatial_indexes',
+            },
+        ),
+    ]
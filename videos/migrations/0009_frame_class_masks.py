@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='class_vocabulary',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='videoframe',
+            name='class_counts',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='videoframe',
+            name='class_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
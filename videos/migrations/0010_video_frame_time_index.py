@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_frame_class_masks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='videoframe',
+            index=models.Index(fields=['video', 'timestamp'], name='video_frame_video_i_cd4d90_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0010_video_frame_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='packed_vocabulary',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='videoframe',
+            name='packed_detections',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_packed_detections'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoframe',
+            name='motion_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0012_frame_motion_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('frame', 'Frame'), ('event', 'Event')], max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('vectors_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Embedding Index',
+                'verbose_name_plural': 'Embedding Indexes',
+                'db_table': 'embedding_indexes',
+                'unique_together': {('user', 'entity_type', 'model_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def discard_spatial_indexes(apps, schema_editor):
+    # Stored indexes kept detection ids as fixed-width bytes; the next region
+    # query of each video rebuilds its index with the current layout
+    apps.get_model('videos', 'VideoSpatialIndex').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0013_embedding_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(discard_spatial_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def discard_embedding_indexes(apps, schema_editor):
+    # Stored indexes held every vector of their user; until the periodic
+    # retraining rebuilds them as trained index plus per-video segments,
+    # queries fall back to an exact index over the embeddings
+    apps.get_model('videos', 'EmbeddingIndex').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0014_discard_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(discard_embedding_indexes, migrations.RunPython.noop),
+        migrations.RenameField(
+            model_name='embeddingindex',
+            old_name='vectors_count',
+            new_name='trained_count',
+        ),
+        migrations.AddField(
+            model_name='embeddingindex',
+            name='kind',
+            field=models.CharField(choices=[('flat', 'Exact'), ('ivf', 'Inverted file')], default='flat', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='embeddingindex',
+            name='generation',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='EmbeddingSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('frame', 'Frame'), ('event', 'Event')], max_length=20)),
+                ('model_name', models.CharField(max_length=100)),
+                ('generation', models.PositiveIntegerField()),
+                ('vectors_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='videos.video')),
+            ],
+            options={
+                'verbose_name': 'Embedding Segment',
+                'verbose_name_plural': 'Embedding Segments',
+                'db_table': 'embedding_segments',
+                'unique_together': {('video', 'entity_type', 'model_name')},
+            },
+        ),
+    ]
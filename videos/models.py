@@ -53,6 +53,12 @@ class Video(models.Model):
     analysis_types = models.JSONField(default=list)  # Types of analysis to perform
     custom_rules = models.JSONField(default=dict)  # Custom rules for guideline adherence
     
+    # Detected classes, in the order of their bits in VideoFrame.class_mask
+    class_vocabulary = models.JSONField(default=list)
+    
+    # Class names and track ids coded in VideoFrame.packed_detections
+    packed_vocabulary = models.JSONField(default=dict)
+    
     # Timestamps
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -112,12 +118,29 @@ class VideoFrame(models.Model):
     has_events = models.BooleanField(default=False)
     is_keyframe = models.BooleanField(default=False)
     
+    # Detected classes: bit i is set when class i of the video's
+    # class_vocabulary is present, counts are keyed by class name
+    class_mask = models.BigIntegerField(default=0)
+    class_counts = models.JSONField(default=dict)
+    
+    # Mean optical flow magnitude since the previous frame, in normalized
+    # coordinates per second (see videos.activity)
+    motion_score = models.FloatField(null=True, blank=True)
+    
+    # Detections in packed storage (see videos.packing), instead of
+    # DetectedObject rows
+    packed_detections = models.BinaryField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'video_frames'
         ordering = ['timestamp']
         unique_together = ['video', 'frame_number']
+        indexes = [
+            # Frames of a video within a time range, e.g. those of an event
+            models.Index(fields=['video', 'timestamp']),
+        ]
         verbose_name = 'Video Frame'
         verbose_name_plural = 'Video Frames'
     
@@ -204,6 +227,10 @@ class Event(models.Model):
     class Meta:
         db_table = 'events'
         ordering = ['start_time']
+        indexes = [
+            # Time range and overlap queries of a video's events
+            models.Index(fields=['video', 'start_time', 'end_time']),
+        ]
         verbose_name = 'Event'
         verbose_name_plural = 'Events'
     
@@ -219,3 +246,256 @@ class Event(models.Model):
             return self.end_time - self.start_time
         return 0
 
+
+class SearchEntry(models.Model):
+    """
+    Model for storing the searchable text of videos, events and chat messages
+    
+    Each row mirrors one source record and is indexed by the database's
+    full-text engine (an FTS5 table on SQLite, a tsvector column with a GIN
+    index on PostgreSQL), see videos.search.
+    """
+    
+    ENTITY_TYPE_CHOICES = [
+        ('video', 'Video'),
+        ('event', 'Event'),
+        ('message', 'Message'),
+    ]
+    
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPE_CHOICES)
+    object_id = models.UUIDField()
+    
+    # Ownership, used to scope searches to the requesting user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    
+    # Indexed text
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'search_entries'
+        unique_together = ['entity_type', 'object_id']
+        verbose_name = 'Search Entry'
+        verbose_name_plural = 'Search Entries'
+    
+    def __str__(self):
+        return f"{self.entity_type} {self.object_id}"
+
+class Embedding(models.Model):
+    """Model for storing vector embeddings of frames and events for similarity search"""
+    
+    ENTITY_TYPE_CHOICES = [
+        ('frame', 'Frame'),
+        ('event', 'Event'),
+    ]
+    
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPE_CHOICES)
+    object_id = models.UUIDField()
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='embeddings')
+    
+    # Embedding information
+    model_name = models.CharField(max_length=100)  # Embedding function that produced the vector
+    dimensions = models.PositiveIntegerField()
+    vector = models.BinaryField()  # float32 values, little-endian
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'embeddings'
+        unique_together = ['entity_type', 'object_id', 'model_name']
+        verbose_name = 'Embedding'
+        verbose_name_plural = 'Embeddings'
+    
+    def __str__(self):
+        return f"{self.model_name} embedding of {self.entity_type} {self.object_id}"
+
+class EmbeddingIndex(models.Model):
+    """
+    Model for storing the trained similarity index over a user's embeddings
+    
+    ``data`` is an NPZ archive with what the index learnt, centroids and
+    codebooks, and is empty for an exact index. The vectors themselves are
+    encoded per video in EmbeddingSegment, see videos.vectors.
+    """
+    
+    KIND_CHOICES = [
+        ('flat', 'Exact'),
+        ('ivf', 'Inverted file'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    entity_type = models.CharField(max_length=20, choices=Embedding.ENTITY_TYPE_CHOICES)
+    model_name = models.CharField(max_length=100)
+    
+    # Index information
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='flat')
+    generation = models.PositiveIntegerField(default=1)  # Bumped on every training
+    trained_count = models.PositiveIntegerField()  # Vectors the index was trained on
+    data = models.BinaryField()
+    
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'embedding_indexes'
+        unique_together = ['user', 'entity_type', 'model_name']
+        verbose_name = 'Embedding Index'
+        verbose_name_plural = 'Embedding Indexes'
+    
+    def __str__(self):
+        return f"{self.model_name} index of {self.entity_type} embeddings of {self.user_id}"
+
+class EmbeddingSegment(models.Model):
+    """
+    Model for storing a video's embeddings encoded with its owner's index
+    
+    ``data`` is an NPZ archive with the object ids, inverted lists and
+    encoded vectors, valid for the index generation it was encoded with.
+    """
+    
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='+')
+    entity_type = models.CharField(max_length=20, choices=Embedding.ENTITY_TYPE_CHOICES)
+    model_name = models.CharField(max_length=100)
+    
+    # Segment information
+    generation = models.PositiveIntegerField()
+    vectors_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'embedding_segments'
+        unique_together = ['video', 'entity_type', 'model_name']
+        verbose_name = 'Embedding Segment'
+        verbose_name_plural = 'Embedding Segments'
+    
+    def __str__(self):
+        return f"{self.model_name} segment of {self.entity_type} embeddings of {self.video_id}"
+
+class VideoTimeline(models.Model):
+    """
+    Model for storing precomputed density histograms of a video
+    
+    ``data`` is a compressed NPZ archive with event, violation and detection
+    counts per time bucket at several bucket widths, see videos.timeline.
+    """
+    
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='timeline')
+    
+    # Timeline information
+    duration = models.FloatField()  # Seconds covered by the histograms
+    bucket_widths = models.JSONField(default=list)  # Available widths in seconds
+    data = models.BinaryField()
+    
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'video_timelines'
+        verbose_name = 'Video Timeline'
+        verbose_name_plural = 'Video Timelines'
+    
+    def __str__(self):
+        return f"Timeline of {self.video_id}"
+
+class VideoSnapshot(models.Model):
+    """
+    Model for storing the denormalized analysis results of a completed video
+    
+    ``data`` is a zlib-compressed JSON document with summary stats, top
+    events, class counts, violations and timeline buckets, see
+    videos.snapshots. ``revision`` grows every time the document is rebuilt.
+    """
+    
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    
+    # Snapshot information
+    schema_version = models.PositiveIntegerField()
+    revision = models.PositiveIntegerField(default=1)
+    data = models.BinaryField()
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'video_snapshots'
+        verbose_name = 'Video Snapshot'
+        verbose_name_plural = 'Video Snapshots'
+    
+    def __str__(self):
+        return f"Snapshot {self.revision} of {self.video_id}"
+
+class TrackSummary(models.Model):
+    """
+    Model for storing the motion summary of one tracked object in a video
+    
+    Built from the DetectedObject boxes sharing a track_id, see videos.tracks.
+    Positions are bounding box centers and speeds are in frame widths per
+    second (coordinates are normalized 0-1).
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='tracks')
+    track_id = models.CharField(max_length=50)
+    class_name = models.CharField(max_length=100)  # Most frequent class of the track
+    
+    # Temporal information
+    first_seen = models.FloatField()  # Seconds
+    last_seen = models.FloatField()  # Seconds
+    dwell_time = models.FloatField()  # Seconds between first and last detection
+    detections_count = models.PositiveIntegerField()
+    mean_confidence = models.FloatField()
+    
+    # Trajectory
+    start_x = models.FloatField()
+    start_y = models.FloatField()
+    end_x = models.FloatField()
+    end_y = models.FloatField()
+    distance = models.FloatField()  # Length of the path
+    mean_speed = models.FloatField()
+    max_speed = models.FloatField()
+    heading = models.FloatField(null=True, blank=True)  # Degrees of the net displacement, 0 = right, 90 = up
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'track_summaries'
+        ordering = ['first_seen']
+        verbose_name = 'Track Summary'
+        verbose_name_plural = 'Track Summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'track_id'], name='unique_video_track')
+        ]
+        indexes = [
+            models.Index(fields=['video', 'max_speed']),
+            models.Index(fields=['video', 'first_seen']),
+        ]
+    
+    def __str__(self):
+        return f"{self.class_name} track {self.track_id} in {self.video_id}"
+
+class VideoSpatialIndex(models.Model):
+    """
+    Model for storing the grid spatial index of a video's detections
+    
+    ``data`` is a compressed NPZ archive with the detection columns and, per
+    grid cell, the detections whose boxes cover it, see videos.spatial.
+    """
+    
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, primary_key=True, related_name='spatial_index')
+    
+    # Index information
+    grid_size = models.PositiveIntegerField()  # Cells per side
+    detections_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'video_spatial_indexes'
+        verbose_name = 'Video Spatial Index'
+        verbose_name_plural = 'Video Spatial Indexes'
+    
+    def __str__(self):
+        return f"Spatial index of {self.video_id}"
@@ -0,0 +1,224 @@
+"""
+Packed storage of per-frame detections.
+
+By default every detected box is a DetectedObject row, with its UUID key,
+frame key, timestamps and index entries. With ``DETECTION_STORAGE =
+'packed'`` the detection stage instead writes a frame's boxes as one array
+of fixed-width records in ``VideoFrame.packed_detections``: float32 box and
+confidence, a uint16 code into the video's packed class vocabulary and an
+int32 code into its track vocabulary (-1 for untracked boxes), 26 bytes a
+box. The vocabularies only ever grow, so stored codes stay valid.
+
+Readers go through the helpers below, which decode packed frames into the
+same shapes the row queries return: unsaved DetectedObject instances (with
+no id) for the frames endpoint and embeddings, and values_list-style tuples
+for the columnar readers. Packed boxes have no primary key, so they are not
+linked to events as related objects.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Sum
+from django.db.models.functions import Length
+from .models import Video, VideoFrame, DetectedObject
+
+DETECTION_STORAGE_MODES = ['rows', 'packed']
+
+PACKED_DETECTION = np.dtype([
+    ('bbox', '<f4', (4,)),
+    ('confidence', '<f4'),
+    ('class_id', '<u2'),
+    ('track', '<i4'),
+])
+
+# Detection fields a packed record can answer, for packed_detection_values
+PACKED_VALUE_FIELDS = [
+    'id', 'frame_id', 'frame__frame_number', 'frame__timestamp', 'class_name', 'confidence',
+    'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height', 'track_id'
+]
+
+def detection_storage():
+    """The configured storage of new detections, 'rows' or 'packed'"""
+    storage = getattr(settings, 'DETECTION_STORAGE', 'rows')
+    if storage not in DETECTION_STORAGE_MODES:
+        raise ImproperlyConfigured(
+            f"DETECTION_STORAGE must be one of {', '.join(DETECTION_STORAGE_MODES)}, not {storage!r}"
+        )
+    return storage
+
+class DetectionVocabulary:
+    """
+    Class names and track ids coded in a video's packed detections, stored
+    in ``Video.packed_vocabulary`` as ``{"classes": [...], "tracks": [...]}``
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.classes = list(data.get('classes', []))
+        self.tracks = list(data.get('tracks', []))
+        self._codes = (
+            {name: code for code, name in enumerate(self.classes)},
+            {track_id: code for code, track_id in enumerate(self.tracks)},
+        )
+
+    @staticmethod
+    def _code(values, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def class_code(self, class_name):
+        return self._code(self.classes, self._codes[0], class_name)
+
+    def track_code(self, track_id):
+        """Code of a track id, -1 for untracked boxes"""
+        if not track_id:
+            return -1
+        return self._code(self.tracks, self._codes[1], track_id)
+
+    def class_name(self, code):
+        return self.classes[code]
+
+    def track_id(self, code):
+        return self.tracks[code] if code >= 0 else None
+
+    def as_json(self):
+        return {'classes': self.classes, 'tracks': self.tracks}
+
+def pack_detections(detections, vocabulary):
+    """
+    Packed bytes of a frame's detections, given as dicts of DetectedObject
+    field values; unseen classes and tracks are added to the vocabulary
+    """
+    records = np.zeros(len(detections), dtype=PACKED_DETECTION)
+    for row, detection in enumerate(detections):
+        records[row] = (
+            (detection['bbox_x'], detection['bbox_y'], detection['bbox_width'], detection['bbox_height']),
+            detection['confidence'],
+            vocabulary.class_code(detection['class_name']),
+            vocabulary.track_code(detection.get('track_id')),
+        )
+    return records.tobytes()
+
+def unpack_detections(data):
+    """Record array of packed detections"""
+    if not data:
+        return np.zeros(0, dtype=PACKED_DETECTION)
+    return np.frombuffer(bytes(data), dtype=PACKED_DETECTION)
+
+def video_vocabulary(video_id):
+    return DetectionVocabulary(
+        Video.objects.filter(id=video_id).values_list('packed_vocabulary', flat=True).first()
+    )
+
+def packed_objects(frame, vocabulary, min_confidence=None, class_names=None):
+    """
+    Unsaved DetectedObject instances of a packed frame, most confident
+    first like the rows
+    """
+    objects = []
+    for bbox, confidence, class_id, track in unpack_detections(frame.packed_detections).tolist():
+        class_name = vocabulary.class_name(class_id)
+        if min_confidence is not None and confidence < min_confidence:
+            continue
+        if class_names and class_name not in class_names:
+            continue
+        objects.append(DetectedObject(
+            id=None,
+            frame=frame,
+            class_name=class_name,
+            confidence=confidence,
+            bbox_x=bbox[0],
+            bbox_y=bbox[1],
+            bbox_width=bbox[2],
+            bbox_height=bbox[3],
+            track_id=vocabulary.track_id(track),
+        ))
+    objects.sort(key=lambda obj: obj.confidence, reverse=True)
+    return objects
+
+def attach_packed_objects(frames, min_confidence=None, class_names=None):
+    """
+    Serve the packed detections of frames through ``frame.objects.all()``,
+    as if they had been prefetched
+    """
+    vocabularies = {}
+    for frame in frames:
+        if not frame.packed_detections:
+            continue
+        if frame.video_id not in vocabularies:
+            vocabularies[frame.video_id] = video_vocabulary(frame.video_id)
+        cache = frame.__dict__.setdefault('_prefetched_objects_cache', {})
+        cache['objects'] = packed_objects(frame, vocabularies[frame.video_id], min_confidence, class_names)
+    return frames
+
+def packed_frames(video):
+    """Frames of a video holding packed detections, in time order"""
+    return (
+        VideoFrame._default_manager.filter(video=video, packed_detections__isnull=False)
+        .order_by('timestamp', 'frame_number')
+        .values_list('id', 'frame_number', 'timestamp', 'packed_detections')
+    )
+
+def packed_detection_arrays(video):
+    """
+    (frame numbers, timestamps, records, vocabulary) of every packed
+    detection of a video, in frame time order, decoded without a per-box loop
+    """
+    frames = list(packed_frames(video).iterator(chunk_size=1000))
+    records = [unpack_detections(data) for *_, data in frames]
+    sizes = [len(frame_records) for frame_records in records]
+    return (
+        np.repeat(np.array([frame[1] for frame in frames], dtype=np.int32), sizes),
+        np.repeat(np.array([frame[2] for frame in frames], dtype=np.float64), sizes),
+        np.concatenate(records) if records else unpack_detections(None),
+        video_vocabulary(video.id) if frames else DetectionVocabulary(),
+    )
+
+def packed_detection_values(video, fields):
+    """
+    Tuples of the given DetectedObject fields (see PACKED_VALUE_FIELDS) of
+    every packed detection of a video, in frame time order; the id is None
+    """
+    unknown = set(fields) - set(PACKED_VALUE_FIELDS)
+    if unknown:
+        raise ValueError(f"Packed detections have no {', '.join(sorted(unknown))}")
+    vocabulary = None
+    for frame_id, frame_number, timestamp, data in packed_frames(video).iterator(chunk_size=1000):
+        if vocabulary is None:
+            vocabulary = video_vocabulary(video.id)
+        for bbox, confidence, class_id, track in unpack_detections(data).tolist():
+            values = {
+                'id': None,
+                'frame_id': frame_id,
+                'frame__frame_number': frame_number,
+                'frame__timestamp': timestamp,
+                'class_name': vocabulary.class_name(class_id),
+                'confidence': confidence,
+                'bbox_x': bbox[0],
+                'bbox_y': bbox[1],
+                'bbox_width': bbox[2],
+                'bbox_height': bbox[3],
+                'track_id': vocabulary.track_id(track),
+            }
+            yield tuple(values[field] for field in fields)
+
+def packed_class_counts(video):
+    """(frame id, timestamp, class name, count) of the classes of every packed frame"""
+    vocabulary = None
+    for frame_id, _, timestamp, data in packed_frames(video).iterator(chunk_size=1000):
+        if vocabulary is None:
+            vocabulary = video_vocabulary(video.id)
+        class_ids, counts = np.unique(unpack_detections(data)['class_id'], return_counts=True)
+        for class_id, count in zip(class_ids.tolist(), counts.tolist()):
+            yield frame_id, timestamp, vocabulary.class_name(class_id), count
+
+def count_detections(video):
+    """Number of detections of a video in both storages"""
+    rows = DetectedObject.objects.filter(frame__video=video).count()
+    packed_bytes = VideoFrame._default_manager.filter(video=video).aggregate(
+        total=Sum(Length('packed_detections'))
+    )['total']
+    return rows + (packed_bytes or 0) // PACKED_DETECTION.itemsize
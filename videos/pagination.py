@@ -0,0 +1,28 @@
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from .renderers import dumps_json
+
+class VideoSearchPagination(CursorPagination):
+    """
+    Keyset pagination for video search results.
+
+    Pages are fetched with a WHERE on the last seen upload time instead of an
+    OFFSET, so deep pages cost the same as the first one.
+    """
+
+    ordering = ('-uploaded_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+def stream_ndjson(queryset, serializer_class, chunk_size=500):
+    """
+    Stream a queryset as newline-delimited JSON, one serialized row per line.
+
+    Rows are read with a server-side iterator so the full result set is never
+    held in memory.
+    """
+    def rows():
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            yield dumps_json(serializer_class(instance).data) + b'\n'
+
+    return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
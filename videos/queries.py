@@ -0,0 +1,97 @@
+from django.db import connection
+from django.db.models import BooleanField, Count, Exists, OuterRef, Prefetch, Q
+from django.db.models.expressions import RawSQL
+from .models import Video, DetectedObject, Event
+from .fieldsets import FieldSelection
+
+# Number of events embedded in the video detail payload
+DETAIL_EVENTS_LIMIT = 10
+
+def detected_objects_queryset(min_confidence=None, class_names=None, columns=None):
+    """
+    Detected objects, optionally narrowed by confidence and class and limited
+    to the given columns
+    """
+    queryset = DetectedObject.objects.all()
+    if min_confidence is not None:
+        queryset = queryset.filter(confidence__gte=min_confidence)
+    if class_names:
+        queryset = queryset.filter(class_name__in=class_names)
+    if columns is not None:
+        queryset = queryset.only(*columns)
+    return queryset
+
+def with_frame_objects(queryset, min_confidence=None, class_names=None, columns=None):
+    """Prefetch each frame's detections in a single query"""
+    if columns is not None:
+        # The frame key attaches each detection to its frame
+        columns = [*columns, 'frame']
+    return queryset.prefetch_related(
+        Prefetch('objects', queryset=detected_objects_queryset(min_confidence, class_names, columns))
+    )
+
+def with_event_objects(queryset, min_confidence=None, class_names=None, columns=None):
+    """Prefetch each event's related objects in a single query"""
+    return queryset.prefetch_related(
+        Prefetch('related_objects', queryset=detected_objects_queryset(min_confidence, class_names, columns))
+    )
+
+def with_event_counts(queryset, selection=None):
+    """
+    Annotate videos with their event and violation totals, skipping the
+    owner and totals VideoListSerializer fields left out of the selection
+    """
+    selection = selection or FieldSelection()
+    if selection.includes('user_name'):
+        queryset = queryset.select_related('user')
+    annotations = {}
+    if selection.includes('events_count'):
+        annotations['events_total'] = Count('events')
+    if selection.includes('violations_count'):
+        annotations['violations_total'] = Count('events', filter=Q(events__is_violation=True))
+    return queryset.annotate(**annotations)
+
+def with_detail_relations(queryset, selection=None, event_columns=None, object_columns=None):
+    """
+    Fetch everything VideoDetailSerializer needs up front: the owner, the
+    frame total and the first events together with their related objects.
+    
+    Parts left out of the selection are not fetched, and the embedded events
+    and their objects can be limited to the given columns.
+    """
+    selection = selection or FieldSelection()
+    if selection.includes('user_name'):
+        queryset = queryset.select_related('user')
+    if selection.includes('frames_count'):
+        queryset = queryset.annotate(frames_total=Count('frames'))
+    if not selection.includes('events', expandable=True):
+        return queryset
+    
+    first_events = Event.objects.order_by('start_time')
+    if event_columns is not None:
+        first_events = first_events.only(*event_columns, 'video')
+    if selection.nested('events').includes('related_objects', expandable=True):
+        first_events = with_event_objects(first_events, columns=object_columns)
+    return queryset.prefetch_related(
+        Prefetch(
+            'events',
+            queryset=first_events[:DETAIL_EVENTS_LIMIT],
+            to_attr='first_events',
+        )
+    )
+
+def has_violations_condition():
+    """EXISTS condition matching videos with at least one violation event"""
+    return Exists(Event.objects.filter(video=OuterRef('pk'), is_violation=True))
+
+def analysis_type_condition(analysis_type):
+    """Condition matching videos configured with the given analysis type"""
+    if connection.features.supports_json_field_contains:
+        return Q(analysis_types__contains=[analysis_type])
+    # SQLite has no JSON containment operator, so probe the array with json_each
+    return RawSQL(
+        'EXISTS (SELECT 1 FROM json_each("%s"."analysis_types") '
+        'WHERE json_each.value = %%s)' % Video._meta.db_table,
+        (analysis_type,),
+        output_field=BooleanField()
+    )
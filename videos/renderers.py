@@ -0,0 +1,65 @@
+"""
+Fast renderers for large analysis payloads.
+
+Frame and event pages are long lists of floats, and most of their response
+time goes into JSON encoding. ORJSONRenderer produces the same JSON as DRF's
+JSONRenderer through orjson, and MessagePackRenderer offers a compact binary
+format to clients that send ``Accept: application/msgpack``. Both optional
+dependencies are imported lazily: without orjson the JSON renderer falls back
+to the stdlib encoder, and without msgpack the binary renderer is not offered.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+# Types orjson and msgpack do not know natively (lazy strings, Decimal,
+# timedelta, ...) are converted exactly like DRF's JSON encoder does
+_encode_default = JSONEncoder().default
+
+def dumps_json(data, indent=False):
+    """Encode data as UTF-8 JSON bytes, with orjson when it is installed"""
+    if orjson is None:
+        return JSONEncoder(ensure_ascii=False, indent=2 if indent else None).encode(data).encode('utf-8')
+    # Datetimes are passed to the DRF encoder so they keep its millisecond format
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_encode_default, option=options)
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer backed by orjson, falling back to the stdlib encoder"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return dumps_json(data, indent=bool(indent))
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer for clients that can decode a binary payload"""
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode_default, use_bin_type=True)
+
+# Renderers of the videos and analytics endpoints, in content negotiation order
+API_RENDERER_CLASSES = [ORJSONRenderer]
+if msgpack is not None:
+    API_RENDERER_CLASSES.append(MessagePackRenderer)
@@ -0,0 +1,45 @@
+"""
+Aggregated results of a video analysis run.
+
+The per-video event counts (totals, by type, severity and detector) are
+computed with one grouped query and then kept up to date in memory as the
+pipeline adds events, so the summary event, the Celery task result, the
+AnalysisSession totals and the snapshot never count events row by row.
+"""
+from django.db.models import Count
+from .models import Event
+
+def empty_event_counts():
+    return {
+        'events_total': 0,
+        'violations_total': 0,
+        'by_type': {},
+        'by_severity': {},
+        'by_detector': {},
+    }
+
+def add_event_counts(counts, event_type, severity, detected_by, is_violation, count=1):
+    """Add ``count`` events with the given attributes to aggregated counts"""
+    counts['events_total'] += count
+    if is_violation:
+        counts['violations_total'] += count
+    for key, value in (('by_type', event_type), ('by_severity', severity), ('by_detector', detected_by)):
+        counts[key][value] = counts[key].get(value, 0) + count
+    return counts
+
+def add_event(counts, event):
+    """Add a newly created event to aggregated counts"""
+    return add_event_counts(counts, event.event_type, event.severity, event.detected_by, event.is_violation)
+
+def aggregate_event_counts(video):
+    """Event counts of a video, computed with one grouped query"""
+    counts = empty_event_counts()
+    groups = (
+        Event.objects.filter(video=video)
+        .values_list('event_type', 'severity', 'detected_by', 'is_violation')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for event_type, severity, detected_by, is_violation, count in groups:
+        add_event_counts(counts, event_type, severity, detected_by, is_violation, count)
+    return counts
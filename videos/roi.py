@@ -0,0 +1,107 @@
+"""
+Region of interest of a video, from ``custom_rules['roi']``.
+
+Cameras that only watch a lane or an intersection can restrict detection to
+polygons of the frame, in normalized coordinates::
+
+    {"roi": {"polygons": [[[0.2, 0.4], [0.8, 0.4], [0.9, 1.0], [0.1, 1.0]]],
+             "mode": "crop"}}
+
+Frame extraction then builds the analysis image from the bounding box of
+the polygons only, cut from the decoded frame before it is scaled down, so
+the model sees the region at its full input resolution. In ``mask`` mode
+what lies outside the polygons is also filled with the letterbox gray. The
+detection stage maps boxes back to full-frame coordinates through the
+Letterbox and drops those whose center is outside every polygon, before
+they are stored. Stored images, optical flow and every reader keep working
+on the whole frame.
+"""
+import cv2
+import numpy as np
+from .decoding import LETTERBOX_FILL
+from .rules import RuleError, points_in_polygon
+
+ROI_MODES = ['crop', 'mask']
+
+class RegionOfInterest:
+    """Polygons of the frame detection is restricted to"""
+
+    def __init__(self, polygons, mode='crop'):
+        self.polygons = [np.asarray(polygon, dtype=np.float64) for polygon in polygons]
+        self.mode = mode
+        points = np.vstack(self.polygons)
+        self.bounds = (*np.clip(points.min(axis=0), 0.0, 1.0), *np.clip(points.max(axis=0), 0.0, 1.0))
+
+    def crop_box(self, width, height):
+        """(x0, y0, x1, y1) pixels of the bounds in a width x height image"""
+        x0, y0, x1, y1 = self.bounds
+        left, top = int(np.floor(x0 * width)), int(np.floor(y0 * height))
+        right = min(max(int(np.ceil(x1 * width)), left + 1), width)
+        bottom = min(max(int(np.ceil(y1 * height)), top + 1), height)
+        return min(left, right - 1), min(top, bottom - 1), right, bottom
+
+    def crop(self, image):
+        """(part of an image inside the bounds, its normalized (x0, y0, x1, y1) region)"""
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = self.crop_box(width, height)
+        return image[y0:y1, x0:x1], (x0 / width, y0 / height, x1 / width, y1 / height)
+
+    def mask(self, image, region):
+        """
+        In mask mode, a copy of an image of a cropped region with what lies
+        outside the polygons filled; the image itself otherwise
+        """
+        if self.mode != 'mask':
+            return image
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = region
+        inside = np.zeros((height, width), dtype=np.uint8)
+        for polygon in self.polygons:
+            points = (polygon - [x0, y0]) / [x1 - x0, y1 - y0] * [width, height]
+            cv2.fillPoly(inside, [np.round(points).astype(np.int32)], 1)
+        image = image.copy()
+        image[inside == 0] = LETTERBOX_FILL
+        return image
+
+    def contains(self, points):
+        """Whether each normalized (x, y) point lies inside one of the polygons"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        inside = np.zeros(len(points), dtype=bool)
+        for polygon in self.polygons:
+            inside |= points_in_polygon(points, polygon)
+        return inside
+
+    def filter_detections(self, detections):
+        """
+        Detections, given as dicts of DetectedObject field values, whose box
+        center lies inside one of the polygons
+        """
+        if not detections:
+            return detections
+        centers = [
+            (detection['bbox_x'] + detection['bbox_width'] / 2, detection['bbox_y'] + detection['bbox_height'] / 2)
+            for detection in detections
+        ]
+        return [detection for detection, inside in zip(detections, self.contains(centers).tolist()) if inside]
+
+def region_of_interest(custom_rules):
+    """RegionOfInterest of a custom_rules document, None when it has none"""
+    spec = custom_rules.get('roi') if isinstance(custom_rules, dict) else None
+    if spec is None:
+        return None
+    if not isinstance(spec, dict):
+        raise RuleError("'roi' must be an object")
+    polygons = spec.get('polygons')
+    if not isinstance(polygons, list) or not polygons:
+        raise RuleError("'roi': 'polygons' must be a non-empty list of polygons")
+    for polygon in polygons:
+        try:
+            points = np.array(polygon, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise RuleError("'roi': each polygon must be a list of [x, y] points")
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise RuleError("'roi': each polygon must be a list of at least 3 [x, y] points")
+    mode = spec.get('mode', ROI_MODES[0])
+    if mode not in ROI_MODES:
+        raise RuleError(f"'roi': 'mode' must be one of: {', '.join(ROI_MODES)}")
+    return RegionOfInterest(polygons, mode)
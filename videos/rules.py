@@ -0,0 +1,479 @@
+"""
+Guideline rules compiled from ``Video.custom_rules``.
+
+``custom_rules['rules']`` lists the guidelines a video is checked against::
+
+    {"rules": [
+        {"name": "No pedestrians on the road", "type": "zone",
+         "polygon": [[0.0, 0.5], [1.0, 0.5], [1.0, 1.0], [0.0, 1.0]],
+         "classes": ["person"]},
+        {"name": "School zone", "type": "speed_limit", "max_speed": 0.25,
+         "classes": ["car", "truck"]},
+        {"name": "Vehicles only", "type": "allowed_classes",
+         "allowed": ["car", "truck", "bus"]},
+        {"name": "No trucks after 60s", "type": "time_window",
+         "start": 60, "classes": ["truck"]}
+    ]}
+
+Motion rules (``speed_limit`` with ``max_speed``, ``direction`` with a
+``heading`` in degrees and a ``tolerance``, ``dwell`` with ``max_dwell``
+seconds) are checked against the track summaries of videos.tracks, one
+violation per track. Coordinates are normalized to the frame (0-1) and
+speeds are in frame widths per second. Every rule
+also accepts ``classes`` and ``min_confidence`` (defaulting to
+``custom_rules['violation_threshold']``) to restrict the detections it
+applies to, plus ``severity``, ``title``, ``description``, ``guideline``,
+``event_type``, ``min_duration`` and ``max_gap`` for the events it produces.
+
+Rule sets compile once per distinct content (they are cached by a hash of
+their canonical JSON) into predicates over NumPy columns, so a whole video's
+detections are checked by each rule with a handful of array operations.
+Violating detections are then grouped per track into time intervals, each
+becoming one violation.
+"""
+import hashlib
+import json
+from functools import lru_cache
+import numpy as np
+from .export import detection_table
+from .models import Event
+
+# Seconds without a violating detection after which a violation ends
+DEFAULT_MAX_GAP = 2.0
+
+# Distinct rule sets kept compiled in each process
+RULES_CACHE_SIZE = 128
+
+SEVERITIES = [severity for severity, _ in Event.SEVERITY_CHOICES]
+
+class RuleError(ValueError):
+    """Raised when custom rules cannot be compiled"""
+
+class ClassColumns:
+    """Columns with a ``class_id`` code per row and its ``class_names`` vocabulary"""
+
+    def __len__(self):
+        return len(self.class_id)
+
+    def class_mask(self, names):
+        """Rows whose class is one of the given names, via a lookup table"""
+        lookup = np.array([name in names for name in self.class_names], dtype=bool)
+        return lookup[self.class_id]
+
+class DetectionArrays(ClassColumns):
+    """Columns of a video's detections, as rules evaluate them"""
+
+    def __init__(self, timestamp, class_id, class_names, confidence, center, track_ids):
+        self.timestamp = np.asarray(timestamp, dtype=np.float64)
+        self.class_id = np.asarray(class_id, dtype=np.int64)
+        self.class_names = list(class_names)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.center = np.asarray(center, dtype=np.float64).reshape(-1, 2)
+        self.track_ids, codes = np.unique(np.asarray(track_ids, dtype=str), return_inverse=True)
+        # Untracked detections are grouped by class instead of by track
+        untracked = np.asarray(track_ids, dtype=str) == ''
+        self.track = np.where(untracked, -1 - self.class_id, codes.reshape(-1))
+        self._speed = None
+
+    @classmethod
+    def from_table(cls, table):
+        """Build the arrays from an export.detection_table"""
+        bbox = table['bbox'].astype(np.float64)
+        return cls(
+            table['timestamp'], table['class_id'], [str(name) for name in table['class_names']],
+            table['confidence'], bbox[:, :2] + bbox[:, 2:] / 2, table['track_id']
+        )
+
+    def track_id(self, track):
+        """Track id of a track code, or None for untracked detections"""
+        return str(self.track_ids[track]) if track >= 0 else None
+
+    @property
+    def speed(self):
+        """
+        Speed of each tracked detection since the previous detection of its
+        track, NaN for the first detection of a track and untracked ones
+        """
+        if self._speed is None:
+            speed = np.full(len(self), np.nan)
+            order = np.lexsort((self.timestamp, self.track))
+            track = self.track[order]
+            elapsed = np.diff(self.timestamp[order])
+            moves = (track[1:] == track[:-1]) & (track[1:] >= 0) & (elapsed > 0)
+            distance = np.linalg.norm(np.diff(self.center[order], axis=0), axis=1)
+            speed[order[1:][moves]] = distance[moves] / elapsed[moves]
+            self._speed = speed
+        return self._speed
+
+def detection_arrays(video):
+    """Detection arrays of a video, read in one pass"""
+    return DetectionArrays.from_table(detection_table(video))
+
+def _number(spec, key, default=None, minimum=None):
+    value = spec.get(key, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"'{key}' must be a number")
+    if minimum is not None and value < minimum:
+        raise RuleError(f"'{key}' must be at least {minimum}")
+    return float(value)
+
+def _names(spec, key, required=False):
+    value = spec.get(key)
+    if value is None:
+        if required:
+            raise RuleError(f"'{key}' is required")
+        return None
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise RuleError(f"'{key}' must be a list of class names")
+    return frozenset(value)
+
+def _choice(spec, key, choices):
+    value = spec.get(key, choices[0])
+    if value not in choices:
+        raise RuleError(f"'{key}' must be one of: {', '.join(choices)}")
+    return value
+
+class Rule:
+    """A compiled guideline rule"""
+
+    rule_type = None
+    level = 'detections'
+    event_type = 'guideline_violation'
+    title = 'Guideline Violation'
+
+    def __init__(self, spec, defaults):
+        self.name = str(spec.get('name') or self.title)
+        self.classes = _names(spec, 'classes')
+        self.min_confidence = _number(spec, 'min_confidence', defaults.get('min_confidence', 0.0), minimum=0.0)
+        self.severity = _choice(spec, 'severity', ['violation'] + [
+            severity for severity in SEVERITIES if severity != 'violation'
+        ])
+        self.event_type = str(spec.get('event_type') or self.event_type)
+        self.title = str(spec.get('title') or self.title)
+        self.description = str(spec.get('description') or self.describe())
+        self.guideline = str(spec.get('guideline') or self.name)
+        self.min_duration = _number(spec, 'min_duration', 0.0, minimum=0.0)
+        self.max_gap = _number(spec, 'max_gap', DEFAULT_MAX_GAP, minimum=0.0)
+
+    def describe(self):
+        return f'{self.name} was not respected'
+
+    def applies(self, arrays):
+        """Detections the rule checks"""
+        mask = arrays.confidence >= self.min_confidence
+        if self.classes is not None:
+            mask &= arrays.class_mask(self.classes)
+        return mask
+
+    def violates(self, arrays):
+        """Detections breaking the rule, among every detection"""
+        raise NotImplementedError
+
+    def evaluate(self, arrays):
+        """Boolean mask of the violating detections"""
+        return self.applies(arrays) & self.violates(arrays)
+
+def points_in_polygon(points, polygon):
+    """Even-odd test of many points against one polygon, one pass per edge"""
+    x, y = np.ascontiguousarray(points[:, 0]), np.ascontiguousarray(points[:, 1])
+    inside = np.zeros(len(points), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, 1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        # x left of the edge at height y, without dividing by the edge height
+        left = (x - x1) * (y2 - y1) < (y - y1) * (x2 - x1)
+        if y2 < y1:
+            left = ~left
+        inside ^= crosses & left
+    return inside
+
+class ZoneRule(Rule):
+    """Detections inside a forbidden zone, or outside a required one"""
+
+    rule_type = 'zone'
+    event_type = 'zone_violation'
+    title = 'Zone Violation'
+
+    def __init__(self, spec, defaults):
+        polygon = spec.get('polygon')
+        try:
+            self.polygon = np.array(polygon, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise RuleError("'polygon' must be a list of [x, y] points")
+        if self.polygon.ndim != 2 or self.polygon.shape[1] != 2 or len(self.polygon) < 3:
+            raise RuleError("'polygon' must be a list of at least 3 [x, y] points")
+        self.mode = _choice(spec, 'mode', ['forbidden', 'required'])
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        where = 'inside' if self.mode == 'forbidden' else 'outside'
+        return f'Object detected {where} the zone of rule "{self.name}"'
+
+    def violates(self, arrays):
+        inside = points_in_polygon(arrays.center, self.polygon)
+        return inside if self.mode == 'forbidden' else ~inside
+
+    def evaluate(self, arrays):
+        # The polygon test is the costliest predicate, so only run it on the
+        # detections the rule applies to
+        mask = self.applies(arrays)
+        candidates = np.flatnonzero(mask)
+        inside = points_in_polygon(arrays.center[candidates], self.polygon)
+        mask[candidates] = inside if self.mode == 'forbidden' else ~inside
+        return mask
+
+class TrackRule(Rule):
+    """A rule checked against the track summaries instead of the detections"""
+
+    level = 'tracks'
+
+class SpeedLimitRule(TrackRule):
+    """Tracks whose peak (or mean) speed exceeds a limit"""
+
+    rule_type = 'speed_limit'
+    event_type = 'speed_violation'
+    title = 'Speed Limit Violation'
+
+    def __init__(self, spec, defaults):
+        self.max_speed = _number(spec, 'max_speed', minimum=0.0)
+        if self.max_speed is None:
+            raise RuleError("'max_speed' is required")
+        self.measure = _choice(spec, 'measure', ['max', 'mean'])
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        return f'Object exceeded the speed limit of rule "{self.name}"'
+
+    def violates(self, tracks):
+        speed = tracks.max_speed if self.measure == 'max' else tracks.mean_speed
+        return speed > self.max_speed
+
+class DirectionRule(TrackRule):
+    """Tracks moving away from an expected heading, e.g. against traffic"""
+
+    rule_type = 'direction'
+    event_type = 'wrong_direction'
+    title = 'Wrong Direction'
+
+    def __init__(self, spec, defaults):
+        self.heading = _number(spec, 'heading')
+        if self.heading is None:
+            raise RuleError("'heading' is required")
+        self.tolerance = _number(spec, 'tolerance', 45.0, minimum=0.0)
+        self.min_distance = _number(spec, 'min_distance', 0.05, minimum=0.0)
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        return f'Object moved against the direction of rule "{self.name}"'
+
+    def violates(self, tracks):
+        deviation = np.abs((tracks.heading - self.heading + 180) % 360 - 180)
+        # NaN headings (tracks that never moved) compare as False
+        with np.errstate(invalid='ignore'):
+            return (tracks.distance >= self.min_distance) & (deviation > self.tolerance)
+
+class DwellRule(TrackRule):
+    """Tracks staying in view longer than allowed"""
+
+    rule_type = 'dwell'
+    event_type = 'loitering'
+    title = 'Loitering'
+
+    def __init__(self, spec, defaults):
+        self.max_dwell = _number(spec, 'max_dwell', minimum=0.0)
+        if self.max_dwell is None:
+            raise RuleError("'max_dwell' is required")
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        return f'Object stayed longer than allowed by rule "{self.name}"'
+
+    def violates(self, tracks):
+        return tracks.dwell_time > self.max_dwell
+
+class AllowedClassesRule(Rule):
+    """Detections of classes outside an allowed list"""
+
+    rule_type = 'allowed_classes'
+    event_type = 'unauthorized_object'
+    title = 'Unauthorized Object'
+
+    def __init__(self, spec, defaults):
+        self.allowed = _names(spec, 'allowed', required=True)
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        return f'Object of a class not allowed by rule "{self.name}"'
+
+    def violates(self, arrays):
+        return ~arrays.class_mask(self.allowed)
+
+class TimeWindowRule(Rule):
+    """Detections inside a forbidden time window, or outside an allowed one"""
+
+    rule_type = 'time_window'
+    event_type = 'time_window_violation'
+    title = 'Time Window Violation'
+
+    def __init__(self, spec, defaults):
+        self.start = _number(spec, 'start', 0.0)
+        self.end = _number(spec, 'end', np.inf)
+        if self.end <= self.start:
+            raise RuleError("'end' must be after 'start'")
+        self.mode = _choice(spec, 'mode', ['forbidden', 'allowed'])
+        super().__init__(spec, defaults)
+
+    def describe(self):
+        when = 'during' if self.mode == 'forbidden' else 'outside'
+        return f'Object detected {when} the time window of rule "{self.name}"'
+
+    def violates(self, arrays):
+        inside = (arrays.timestamp >= self.start) & (arrays.timestamp < self.end)
+        return inside if self.mode == 'forbidden' else ~inside
+
+RULE_TYPES = {
+    rule.rule_type: rule for rule in (
+        ZoneRule, AllowedClassesRule, TimeWindowRule, SpeedLimitRule, DirectionRule, DwellRule
+    )
+}
+
+class RuleSet:
+    """Rules compiled from one custom_rules document"""
+
+    def __init__(self, rules, digest):
+        self.rules = tuple(rules)
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.rules)
+
+    def uses(self, level):
+        """Whether any rule reads the 'detections' or 'tracks' columns"""
+        return any(rule.level == level for rule in self.rules)
+
+    def evaluate(self, detections=None, tracks=None):
+        """
+        Violations of every rule over DetectionArrays and tracks.TrackArrays;
+        rules whose columns are not given are skipped
+        """
+        violations = []
+        for rule in self.rules:
+            if rule.level == 'tracks':
+                if tracks is not None:
+                    violations.extend(find_track_violations(rule, tracks, rule.evaluate(tracks)))
+            elif detections is not None:
+                violations.extend(find_violations(rule, detections, rule.evaluate(detections)))
+        return violations
+
+def find_violations(rule, arrays, mask):
+    """
+    Group the violating detections of a rule per track into intervals whose
+    detections are at most max_gap seconds apart
+    """
+    indices = np.flatnonzero(mask)
+    if not len(indices):
+        return []
+    indices = indices[np.lexsort((arrays.timestamp[indices], arrays.track[indices]))]
+    track = arrays.track[indices]
+    times = arrays.timestamp[indices]
+    breaks = (np.diff(track) != 0) | (np.diff(times) > rule.max_gap)
+    starts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+    sizes = np.diff(np.append(starts, len(indices)))
+
+    confidence = np.add.reduceat(arrays.confidence[indices], starts) / sizes
+    location = np.add.reduceat(arrays.center[indices], starts, axis=0) / sizes[:, None]
+    first = times[starts]
+    last = np.maximum.reduceat(times, starts)
+
+    return [
+        {
+            'rule': rule,
+            'start_time': float(first[group]),
+            'end_time': float(last[group]),
+            'confidence': float(confidence[group]),
+            'location': (float(location[group, 0]), float(location[group, 1])),
+            'track_id': arrays.track_id(track[starts[group]]),
+            'detections': int(sizes[group]),
+        }
+        for group in range(len(starts))
+        if last[group] - first[group] >= rule.min_duration
+    ]
+
+def find_track_violations(rule, tracks, mask):
+    """One violation per violating track, spanning the time it was seen"""
+    mask = mask & (tracks.dwell_time >= rule.min_duration)
+    return [
+        {
+            'rule': rule,
+            'start_time': float(tracks.first_seen[row]),
+            'end_time': float(tracks.last_seen[row]),
+            'confidence': float(tracks.mean_confidence[row]),
+            'location': (float(tracks.end_x[row]), float(tracks.end_y[row])),
+            'track_id': tracks.track_ids[row],
+            'detections': int(tracks.detections_count[row]),
+        }
+        for row in np.flatnonzero(mask)
+    ]
+
+def canonical_rules(custom_rules):
+    """Canonical JSON of a custom_rules document, used as its cache key"""
+    return json.dumps(custom_rules or {}, sort_keys=True, separators=(',', ':'))
+
+@lru_cache(maxsize=RULES_CACHE_SIZE)
+def _compile(digest, canonical):
+    document = json.loads(canonical)
+    if not isinstance(document, dict):
+        raise RuleError('Custom rules must be an object')
+    specs = document.get('rules', [])
+    if not isinstance(specs, list):
+        raise RuleError("'rules' must be a list")
+    defaults = {'min_confidence': _number(document, 'violation_threshold', 0.0, minimum=0.0)}
+
+    rules = []
+    for position, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise RuleError(f'Rule {position}: must be an object')
+        rule_class = RULE_TYPES.get(spec.get('type'))
+        if rule_class is None:
+            raise RuleError(f"Rule {position}: 'type' must be one of: {', '.join(RULE_TYPES)}")
+        try:
+            rules.append(rule_class(spec, defaults))
+        except RuleError as e:
+            raise RuleError(f'Rule {position}: {e}')
+    return RuleSet(rules, digest)
+
+def compile_rules(custom_rules):
+    """The compiled RuleSet of a custom_rules document, cached by content hash"""
+    canonical = canonical_rules(custom_rules)
+    digest = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+    return _compile(digest, canonical)
+
+def violation_event(video, violation, rule_set):
+    """Unsaved Event describing one violation"""
+    rule = violation['rule']
+    return Event(
+        video=video,
+        event_type=rule.event_type,
+        title=rule.title,
+        description=rule.description,
+        severity=rule.severity,
+        start_time=violation['start_time'],
+        end_time=violation['end_time'],
+        duration=violation['end_time'] - violation['start_time'],
+        location_x=violation['location'][0],
+        location_y=violation['location'][1],
+        confidence=violation['confidence'],
+        detected_by='guideline_checker',
+        is_violation=True,
+        guideline_reference=rule.guideline,
+        metadata={
+            'rule': rule.name,
+            'rule_type': rule.rule_type,
+            'rule_set': rule_set.digest,
+            'track_id': violation['track_id'],
+            'detections': violation['detections'],
+        }
+    )
@@ -0,0 +1,196 @@
+"""
+Full-text search over videos, events and chat messages.
+
+Searchable text is copied into SearchEntry rows (kept in sync by the handlers
+in videos.signals) and indexed by the database: an external-content FTS5 table
+on SQLite and a generated tsvector column with a GIN index on PostgreSQL, both
+created by migration 0002. Other backends fall back to substring matching.
+"""
+import re
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from .models import Video, Event, SearchEntry
+
+# Upper bound on results returned by a cross-entity search
+MAX_SEARCH_RESULTS = 100
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# FTS5 ranking with titles weighted above bodies, like the PostgreSQL A/B weights
+SQLITE_RANK = 'bm25(search_entries_fts, 2.0, 1.0)'
+
+def is_available():
+    """Whether the database provides an indexed full-text engine"""
+    return connection.vendor in ('sqlite', 'postgresql')
+
+def to_fts5_query(text):
+    """
+    Turn free text into an FTS5 query matching every word as a prefix.
+
+    Words are quoted so that FTS5 operators typed by the user are matched
+    literally instead of being interpreted.
+    """
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+def _match_sql():
+    """SQL and parameter builder for 'entry id matches the query'"""
+    if connection.vendor == 'sqlite':
+        return (
+            'SELECT rowid FROM search_entries_fts WHERE search_entries_fts MATCH %s',
+            to_fts5_query
+        )
+    return (
+        "SELECT id FROM search_entries "
+        "WHERE search_vector @@ websearch_to_tsquery('english', %s)",
+        lambda text: text
+    )
+
+def _rank_sql(entry_sql):
+    """
+    SQL computing the rank (higher is better) of the entry selected by
+    ``entry_sql`` against the query parameter.
+    """
+    if connection.vendor == 'sqlite':
+        return (
+            f'SELECT -{SQLITE_RANK} FROM search_entries_fts '
+            f'WHERE search_entries_fts MATCH %s AND rowid = ({entry_sql})',
+            to_fts5_query
+        )
+    return (
+        "SELECT ts_rank(search_vector, websearch_to_tsquery('english', %s)) "
+        f"FROM search_entries WHERE id = ({entry_sql})",
+        lambda text: text
+    )
+
+def search_videos(queryset, text):
+    """
+    Restrict a Video queryset to full-text matches on title and description,
+    annotated with ``search_rank`` (higher is better).
+    """
+    if not is_available():
+        return queryset.filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+        ).annotate(search_rank=RawSQL('0', (), output_field=FloatField()))
+
+    if not TOKEN_RE.search(text):
+        return queryset.none()
+
+    video_table = Video._meta.db_table
+    match_sql, to_param = _match_sql()
+    rank_sql, to_rank_param = _rank_sql(
+        "SELECT id FROM search_entries WHERE entity_type = 'video' "
+        f'AND object_id = "{video_table}"."id"'
+    )
+    matching_ids = RawSQL(
+        "SELECT object_id FROM search_entries "
+        f"WHERE entity_type = 'video' AND id IN ({match_sql})",
+        (to_param(text),)
+    )
+    return queryset.filter(id__in=matching_ids).annotate(
+        search_rank=RawSQL(rank_sql, (to_rank_param(text),), output_field=FloatField())
+    )
+
+def search_entries(user, text, entity_types=None, limit=MAX_SEARCH_RESULTS):
+    """
+    Search every entity type the user owns and return ranked SearchEntry
+    objects, each with a ``rank`` attribute (higher is better).
+    """
+    filters = ['e.user_id = %s']
+    params = [user.pk]
+    if entity_types:
+        filters.append('e.entity_type IN (%s)' % ', '.join(['%s'] * len(entity_types)))
+        params.extend(entity_types)
+
+    if not is_available():
+        entries = SearchEntry.objects.filter(
+            Q(title__icontains=text) | Q(body__icontains=text),
+            user=user
+        )
+        if entity_types:
+            entries = entries.filter(entity_type__in=entity_types)
+        entries = list(entries.order_by('-updated_at')[:limit])
+        for entry in entries:
+            entry.rank = 0.0
+        return entries
+
+    if not TOKEN_RE.search(text):
+        return []
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f'SELECT e.*, -{SQLITE_RANK} AS rank FROM search_entries_fts '
+            'JOIN search_entries e ON e.id = search_entries_fts.rowid '
+            f"WHERE search_entries_fts MATCH %s AND {' AND '.join(filters)} "
+            'ORDER BY rank DESC LIMIT %s'
+        )
+        query_param = to_fts5_query(text)
+    else:
+        sql = (
+            "SELECT e.*, ts_rank(e.search_vector, q) AS rank FROM search_entries e, "
+            "websearch_to_tsquery('english', %s) q "
+            f"WHERE e.search_vector @@ q AND {' AND '.join(filters)} "
+            'ORDER BY rank DESC LIMIT %s'
+        )
+        query_param = text
+    return list(SearchEntry.objects.raw(sql, [query_param, *params, limit]))
+
+def _upsert(entity_type, object_id, user_id, video_id, title, body):
+    SearchEntry.objects.update_or_create(
+        entity_type=entity_type,
+        object_id=object_id,
+        defaults={
+            'user_id': user_id,
+            'video_id': video_id,
+            'title': title[:255],
+            'body': body,
+        }
+    )
+
+def index_video(video):
+    """Add or refresh the search entry of a video"""
+    _upsert('video', video.id, video.user_id, video.id, video.title, video.description)
+
+def index_event(event):
+    """Add or refresh the search entry of an event"""
+    body = '\n'.join(filter(None, [event.description, event.guideline_reference]))
+    _upsert('event', event.id, event.video.user_id, event.video_id, event.title, body)
+
+def index_video_events(video_id, event_ids):
+    """Add or refresh the search entries of a video's events, in bulk"""
+    events = Event.objects.filter(video_id=video_id, id__in=event_ids).values_list(
+        'id', 'video__user_id', 'title', 'description', 'guideline_reference'
+    )
+    entries = [
+        SearchEntry(
+            entity_type='event',
+            object_id=event_id,
+            user_id=user_id,
+            video_id=video_id,
+            title=title[:255],
+            body='\n'.join(filter(None, [description, guideline_reference])),
+        )
+        for event_id, user_id, title, description, guideline_reference in events
+    ]
+    remove_entries('event', [entry.object_id for entry in entries])
+    SearchEntry.objects.bulk_create(entries, batch_size=1000)
+
+def index_message(message):
+    """Add or refresh the search entry of a chat message"""
+    if message.is_deleted:
+        remove_entry('message', message.id)
+        return
+    conversation = message.conversation
+    _upsert(
+        'message', message.id, conversation.user_id, conversation.video_id,
+        conversation.title, message.content
+    )
+
+def remove_entry(entity_type, object_id):
+    """Drop the search entry of a deleted record"""
+    SearchEntry.objects.filter(entity_type=entity_type, object_id=object_id).delete()
+
+def remove_entries(entity_type, object_ids):
+    """Drop the search entries of deleted records, in bulk"""
+    if object_ids:
+        SearchEntry.objects.filter(entity_type=entity_type, object_id__in=list(object_ids)).delete()
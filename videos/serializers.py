@@ -1,5 +1,133 @@
+from operator import attrgetter
+from django.db import models
 from rest_framework import serializers
-from .models import Video, VideoFrame, DetectedObject, Event
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from .models import Video, VideoFrame, DetectedObject, Event, SearchEntry, TrackSummary
+from .queries import DETAIL_EVENTS_LIMIT
+from .export import EXPORT_FORMATS, EXPORT_TABLES, parquet_available
+from .fieldsets import FieldSelection
+from .rules import RuleError, compile_rules
+from .roi import region_of_interest
+from .classmasks import FrameQueryError, parse_frame_query
+from .timeline import DEFAULT_TIMELINE_BUCKETS, MAX_TIMELINE_BUCKETS
+from .spatial import DEFAULT_REGION_LIMIT, MAX_REGION_LIMIT, REGION_MODES
+
+# Representations of plain model columns that do not depend on field options
+FAST_FIELD_CONVERTERS = {
+    serializers.CharField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    serializers.BooleanField: bool,
+    serializers.UUIDField: str,
+    serializers.JSONField: None,
+}
+
+class ReadOnlyListSerializer(serializers.ListSerializer):
+    """
+    List serializer for read-only payloads.
+    
+    The child's fields are compiled once into accessors: plain columns are read
+    with attrgetter and converted directly, and every other field goes through
+    its own get_attribute/to_representation. This skips DRF's per-item field
+    iteration, which dominates the cost of long frame and detection lists.
+    """
+    
+    def get_accessors(self):
+        accessors = getattr(self, '_accessors', None)
+        if accessors is None:
+            accessors = self._accessors = [
+                (field.field_name, self.compile_field(field))
+                for field in self.child._readable_fields
+            ]
+        return accessors
+    
+    @staticmethod
+    def compile_field(field):
+        field_type = type(field)
+        is_plain = (
+            field_type in FAST_FIELD_CONVERTERS
+            and len(field.source_attrs) == 1
+            and getattr(field, 'uuid_format', 'hex_verbose') == 'hex_verbose'
+            and not getattr(field, 'binary', False)
+        )
+        if is_plain:
+            get = attrgetter(field.source_attrs[0])
+            convert = FAST_FIELD_CONVERTERS[field_type]
+            if convert is None:
+                return get
+            
+            def read_column(instance):
+                value = get(instance)
+                return None if value is None else convert(value)
+            return read_column
+        
+        def read_field(instance):
+            attribute = field.get_attribute(instance)
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            return None if check_for_none is None else field.to_representation(attribute)
+        return read_field
+    
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        accessors = self.get_accessors()
+        rows = []
+        for instance in iterable:
+            row = {}
+            for name, read in accessors:
+                try:
+                    row[name] = read(instance)
+                except SkipField:
+                    continue
+            rows.append(row)
+        return rows
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin dropping the fields a client did not select.
+    
+    The selection is passed with the ``selection`` keyword, or read from the
+    ``selection`` context entry of the top-level serializer. Relations listed
+    in ``Meta.expandable_fields`` are only embedded when the selection expands
+    them, and nested sparse serializers receive their part of the selection.
+    """
+    
+    def __init__(self, *args, selection=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._selection = selection
+    
+    @property
+    def selection(self):
+        if self._selection is None:
+            root = self.root
+            if self is root or (self.parent is root and isinstance(root, serializers.ListSerializer)):
+                self._selection = self.context.get('selection')
+        return self._selection or FieldSelection()
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        if selection.is_everything:
+            return fields
+        
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        for name in list(fields):
+            if not selection.includes(name, expandable=name in expandable):
+                del fields[name]
+                continue
+            nested = getattr(fields[name], 'child', fields[name])
+            if isinstance(nested, SparseFieldsMixin):
+                nested._selection = selection.nested(name)
+        return fields
+
+def check_custom_rules(value):
+    """Reject custom rules the guideline checker cannot compile"""
+    try:
+        compile_rules(value)
+        region_of_interest(value)
+    except RuleError as e:
+        raise serializers.ValidationError(str(e))
+    return value
 
 class VideoUploadSerializer(serializers.ModelSerializer):
     """Serializer for video upload"""
@@ -25,8 +153,11 @@ class VideoUploadSerializer(serializers.ModelSerializer):
             )
         
         return value
+    
+    def validate_custom_rules(self, value):
+        return check_custom_rules(value)
 
-class VideoListSerializer(serializers.ModelSerializer):
+class VideoListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for video list view"""
     
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -42,6 +173,12 @@ class VideoListSerializer(serializers.ModelSerializer):
             'status', 'user_name', 'processing_duration_display',
             'events_count', 'violations_count', 'uploaded_at'
         ]
+        field_requirements = {
+            'user_name': ['user'],
+            'processing_duration_display': ['processing_started_at', 'processing_completed_at'],
+            'events_count': [],
+            'violations_count': [],
+        }
     
     def get_processing_duration_display(self, obj):
         duration = obj.processing_duration
@@ -52,12 +189,17 @@ class VideoListSerializer(serializers.ModelSerializer):
         return None
     
     def get_events_count(self, obj):
+        # Use the annotation from queries.with_event_counts when present
+        if hasattr(obj, 'events_total'):
+            return obj.events_total
         return obj.events.count()
     
     def get_violations_count(self, obj):
+        if hasattr(obj, 'violations_total'):
+            return obj.violations_total
         return obj.events.filter(is_violation=True).count()
 
-class VideoDetailSerializer(serializers.ModelSerializer):
+class VideoDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for detailed video view"""
     
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
@@ -74,37 +216,55 @@ class VideoDetailSerializer(serializers.ModelSerializer):
             'custom_rules', 'user_name', 'events', 'frames_count',
             'uploaded_at', 'updated_at'
         ]
+        expandable_fields = ['events']
+        field_requirements = {
+            'user_name': ['user'],
+            'events': [],
+            'frames_count': [],
+        }
     
     def get_events(self, obj):
-        events = obj.events.all()[:10]  # Limit to first 10 events
-        return EventSerializer(events, many=True).data
+        # Use the prefetch from queries.with_detail_relations when present
+        events = getattr(obj, 'first_events', None)
+        if events is None:
+            events = obj.events.prefetch_related('related_objects')[:DETAIL_EVENTS_LIMIT]
+        return EventSerializer(events, many=True, selection=self.selection.nested('events')).data
     
     def get_frames_count(self, obj):
+        if hasattr(obj, 'frames_total'):
+            return obj.frames_total
         return obj.frames.count()
 
-class DetectedObjectSerializer(serializers.ModelSerializer):
+class DetectedObjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for detected objects"""
     
     class Meta:
         model = DetectedObject
+        list_serializer_class = ReadOnlyListSerializer
         fields = [
             'id', 'class_name', 'confidence', 'bbox_x', 'bbox_y',
             'bbox_width', 'bbox_height', 'track_id', 'attributes'
         ]
 
-class VideoFrameSerializer(serializers.ModelSerializer):
+class VideoFrameSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for video frames"""
     
     objects = DetectedObjectSerializer(many=True, read_only=True)
     
     class Meta:
         model = VideoFrame
+        list_serializer_class = ReadOnlyListSerializer
         fields = [
             'id', 'frame_number', 'timestamp', 'image', 'width', 'height',
-            'has_objects', 'has_events', 'is_keyframe', 'objects'
+            'has_objects', 'has_events', 'is_keyframe', 'class_counts', 'objects'
         ]
+        expandable_fields = ['objects']
+        field_requirements = {
+            # Packed detections are decoded with the video's vocabulary
+            'objects': ['video', 'packed_detections'],
+        }
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for events"""
     
     related_objects = DetectedObjectSerializer(many=True, read_only=True)
@@ -112,6 +272,7 @@ class EventSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Event
+        list_serializer_class = ReadOnlyListSerializer
         fields = [
             'id', 'event_type', 'title', 'description', 'severity',
             'start_time', 'end_time', 'duration', 'duration_display',
@@ -119,6 +280,10 @@ class EventSerializer(serializers.ModelSerializer):
             'is_violation', 'guideline_reference', 'metadata',
             'related_objects', 'created_at'
         ]
+        expandable_fields = ['related_objects']
+        field_requirements = {
+            'duration_display': ['duration', 'start_time', 'end_time'],
+        }
     
     def get_duration_display(self, obj):
         duration = obj.calculated_duration
@@ -144,6 +309,18 @@ class EventCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("End time must be after start time")
         return attrs
 
+class TrackSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for track summaries"""
+    
+    class Meta:
+        model = TrackSummary
+        list_serializer_class = ReadOnlyListSerializer
+        fields = [
+            'id', 'track_id', 'class_name', 'first_seen', 'last_seen', 'dwell_time',
+            'detections_count', 'mean_confidence', 'start_x', 'start_y', 'end_x', 'end_y',
+            'distance', 'mean_speed', 'max_speed', 'heading'
+        ]
+
 class VideoAnalysisRequestSerializer(serializers.Serializer):
     """Serializer for video analysis requests"""
     
@@ -171,6 +348,9 @@ class VideoAnalysisRequestSerializer(serializers.Serializer):
                     f"Allowed types: {', '.join(allowed_types)}"
                 )
         return value
+    
+    def validate_custom_rules(self, value):
+        return check_custom_rules(value)
 
 class VideoSearchSerializer(serializers.Serializer):
     """Serializer for video search requests"""
@@ -187,4 +367,103 @@ class VideoSearchSerializer(serializers.Serializer):
         child=serializers.CharField(max_length=100),
         required=False
     )
+    stream = serializers.BooleanField(required=False, default=False)
 
+
+class EntitySearchSerializer(serializers.Serializer):
+    """Serializer for cross-entity full-text search requests"""
+    
+    q = serializers.CharField(max_length=255)
+    types = serializers.ListField(
+        child=serializers.ChoiceField(choices=SearchEntry.ENTITY_TYPE_CHOICES),
+        required=False
+    )
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    """Serializer for ranked full-text search results"""
+    
+    rank = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = SearchEntry
+        fields = [
+            'entity_type', 'object_id', 'video', 'title', 'body', 'rank', 'updated_at'
+        ]
+
+class SimilaritySearchSerializer(serializers.Serializer):
+    """Serializer for similar frame/event requests"""
+    
+    k = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+
+class TimelineRequestSerializer(serializers.Serializer):
+    """Serializer for timeline requests"""
+    
+    bucket_width = serializers.FloatField(required=False, min_value=0)
+    max_buckets = serializers.IntegerField(
+        required=False, default=DEFAULT_TIMELINE_BUCKETS, min_value=1, max_value=MAX_TIMELINE_BUCKETS
+    )
+    start = serializers.FloatField(required=False, min_value=0)
+    end = serializers.FloatField(required=False, min_value=0)
+    
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end")
+        return data
+
+class VideoExportSerializer(serializers.Serializer):
+    """Serializer for columnar export requests"""
+    
+    file_format = serializers.ChoiceField(choices=EXPORT_FORMATS, required=False, default='npz')
+    table = serializers.ChoiceField(choices=EXPORT_TABLES, required=False, default='detections')
+    
+    def validate_file_format(self, value):
+        if value == 'parquet' and not parquet_available():
+            raise serializers.ValidationError("Parquet export requires pyarrow on the server")
+        return value
+
+class RegionQuerySerializer(serializers.Serializer):
+    """Serializer for region queries over a video's detections"""
+    
+    # Rectangle as [x0, y0, x1, y1] in normalized coordinates
+    region = serializers.ListField(
+        child=serializers.FloatField(), min_length=4, max_length=4, required=False
+    )
+    polygon = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField(), min_length=2, max_length=2),
+        min_length=3, required=False
+    )
+    start_time = serializers.FloatField(required=False, min_value=0)
+    end_time = serializers.FloatField(required=False, min_value=0)
+    mode = serializers.ChoiceField(choices=REGION_MODES, default='center')
+    classes = serializers.ListField(child=serializers.CharField(max_length=100), required=False)
+    limit = serializers.IntegerField(
+        required=False, default=DEFAULT_REGION_LIMIT, min_value=0, max_value=MAX_REGION_LIMIT
+    )
+    
+    def validate_region(self, value):
+        if value[2] < value[0] or value[3] < value[1]:
+            raise serializers.ValidationError("The region must be given as [x0, y0, x1, y1]")
+        return value
+    
+    def validate(self, data):
+        if ('region' in data) == ('polygon' in data):
+            raise serializers.ValidationError("Exactly one of region and polygon is required")
+        if 'polygon' in data and data['mode'] != 'center':
+            raise serializers.ValidationError("Polygon regions only support the center mode")
+        if 'start_time' in data and 'end_time' in data and data['start_time'] > data['end_time']:
+            raise serializers.ValidationError("start_time must not be after end_time")
+        return data
+
+class FrameQuerySerializer(serializers.Serializer):
+    """Serializer for boolean class queries over a video's frames"""
+    
+    q = serializers.CharField(max_length=1000)
+    limit = serializers.IntegerField(required=False, default=1000, min_value=0, max_value=10000)
+    
+    def validate_q(self, value):
+        try:
+            parse_frame_query(value)
+        except FrameQueryError as e:
+            raise serializers.ValidationError(str(e))
+        return value
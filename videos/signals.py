@@ -0,0 +1,147 @@
+import threading
+from contextlib import contextmanager
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from . import search
+from .snapshots import SNAPSHOT_VIDEO_FIELDS, discard_video_snapshot
+from .spatial import discard_spatial_index
+from .timeline import discard_video_timeline
+from .cache import bump_video_version, bump_embeddings_version
+from .models import Video, VideoFrame, DetectedObject, Event
+
+# Fields whose changes must be mirrored into the search index
+VIDEO_SEARCH_FIELDS = {'title', 'description'}
+EVENT_SEARCH_FIELDS = {'title', 'description', 'guideline_reference'}
+
+_deferred = threading.local()
+
+@contextmanager
+def deferred_invalidation(video_id):
+    """
+    Hold back the per-Event search, cache, timeline and snapshot handlers of
+    a video while its analysis rewrites the events, then apply them once
+    """
+    pending = getattr(_deferred, 'videos', None)
+    if pending is None:
+        pending = _deferred.videos = {}
+    if video_id in pending:
+        yield
+        return
+    pending[video_id] = {'saved': set(), 'deleted': set()}
+    try:
+        yield
+    finally:
+        events = pending.pop(video_id)
+        search.remove_entries('event', events['deleted'])
+        search.index_video_events(video_id, events['saved'] - events['deleted'])
+        discard_video_timeline(video_id)
+        discard_video_snapshot(video_id)
+        bump_video_version(video_id)
+
+def deferred_events(video_id):
+    """Saved and deleted event ids held back for a video, None when not deferred"""
+    return getattr(_deferred, 'videos', {}).get(video_id)
+
+def detection_video_id(detection):
+    """Video id of a detection, without loading its frame"""
+    return VideoFrame._default_manager.filter(id=detection.frame_id).values_list('video_id', flat=True).first()
+
+def deleted_with(origin, *models):
+    """Whether a cascade started from an instance or queryset of one of the models"""
+    return issubclass(origin.model if isinstance(origin, QuerySet) else type(origin), models)
+
+def touches(update_fields, fields):
+    """Whether a save with the given update_fields may have changed fields"""
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+@receiver(post_save, sender=Video)
+def index_video(sender, instance, created, update_fields=None, **kwargs):
+    if created or touches(update_fields, VIDEO_SEARCH_FIELDS):
+        search.index_video(instance)
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, created, update_fields=None, **kwargs):
+    if created or touches(update_fields, EVENT_SEARCH_FIELDS):
+        deferred = deferred_events(instance.video_id)
+        if deferred is None:
+            search.index_event(instance)
+        else:
+            deferred['saved'].add(instance.id)
+
+@receiver(post_save, sender='chat.Message')
+def index_message(sender, instance, **kwargs):
+    search.index_message(instance)
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    deferred = deferred_events(instance.video_id)
+    if deferred is None:
+        search.remove_entry('event', instance.id)
+    else:
+        deferred['deleted'].add(instance.id)
+
+@receiver(post_delete, sender='chat.Message')
+def unindex_message(sender, instance, **kwargs):
+    search.remove_entry('message', instance.id)
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_video(sender, instance, **kwargs):
+    bump_video_version(instance.id)
+
+@receiver(post_delete, sender=Video)
+def drop_video_embeddings(sender, instance, **kwargs):
+    # Its embedding segments went with it; loaded indexes must drop them
+    bump_embeddings_version(instance.user_id)
+
+@receiver(post_save, sender=Video)
+def discard_video_results(sender, instance, created, update_fields=None, **kwargs):
+    if not created and touches(update_fields, SNAPSHOT_VIDEO_FIELDS):
+        discard_video_snapshot(instance.id)
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=VideoFrame)
+@receiver(post_delete, sender=VideoFrame)
+def invalidate_video_child(sender, instance, origin=None, **kwargs):
+    # A deleted video is invalidated once by its own handler, a video under
+    # analysis once the analysis is done
+    if not deleted_with(origin, Video) and deferred_events(instance.video_id) is None:
+        bump_video_version(instance.video_id)
+
+@receiver(post_save, sender=DetectedObject)
+@receiver(post_delete, sender=DetectedObject)
+def invalidate_detection(sender, instance, origin=None, **kwargs):
+    # Deleting a frame or a video deletes its detections too, and their own
+    # handlers invalidate once for all of them
+    if deleted_with(origin, Video, VideoFrame):
+        return
+    video_id = detection_video_id(instance)
+    if video_id is not None:
+        bump_video_version(video_id)
+        discard_spatial_index(video_id)
+
+@receiver(m2m_changed, sender=Event.related_objects.through)
+def invalidate_event_objects(sender, instance, action, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Event):
+        bump_video_version(instance.video_id)
+    else:
+        bump_video_version(detection_video_id(instance))
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def discard_precomputed_results(sender, instance, origin=None, **kwargs):
+    # A deleted video takes its timeline and snapshot along
+    if deleted_with(origin, Video) or deferred_events(instance.video_id) is not None:
+        return
+    discard_video_timeline(instance.video_id)
+    discard_video_snapshot(instance.video_id)
+
+@receiver(post_delete, sender=VideoFrame)
+def discard_frame_detections_index(sender, instance, origin=None, **kwargs):
+    # A deleted video takes its spatial index along
+    if not deleted_with(origin, Video):
+        discard_spatial_index(instance.video_id)
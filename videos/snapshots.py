@@ -0,0 +1,140 @@
+"""
+Denormalized analysis snapshots of completed videos.
+
+Completed videos are read far more often than they are written, so when the
+pipeline finishes it assembles everything a results page shows (summary
+stats, top events, class counts, violations and timeline buckets) into one
+JSON document stored zlib-compressed in VideoSnapshot. Reads are then a
+single primary-key lookup, and JSON clients receive the stored bytes as is.
+
+Event writes, and video edits to the fields it shows, discard the snapshot
+(see videos.signals), and the next read of a completed video rebuilds it.
+"""
+import hashlib
+import json
+import zlib
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from django.utils.http import quote_etag
+from .fieldsets import FieldSelection
+from .models import Event, DetectedObject, VideoFrame, VideoSnapshot
+from .packing import packed_class_counts
+from .renderers import dumps_json
+from .results import aggregate_event_counts
+from .serializers import EventSerializer
+from .timeline import get_video_timeline, timeline_payload
+
+# Bumped whenever the document layout changes, so old snapshots get rebuilt
+SNAPSHOT_SCHEMA_VERSION = 1
+
+# Number of events listed under 'top_events'
+SNAPSHOT_TOP_EVENTS = 10
+
+# Video fields copied into the document
+SNAPSHOT_VIDEO_FIELDS = {
+    'title', 'description', 'status', 'duration', 'resolution_width', 'resolution_height',
+    'frame_rate', 'analysis_types', 'processing_started_at', 'processing_completed_at',
+}
+
+# Severities from most to least important
+SEVERITY_RANK = {'critical': 0, 'violation': 1, 'warning': 2, 'info': 3}
+
+def _severity_rank():
+    return Case(
+        *[When(severity=severity, then=Value(rank)) for severity, rank in SEVERITY_RANK.items()],
+        default=Value(len(SEVERITY_RANK)),
+        output_field=IntegerField()
+    )
+
+def _serialize_events(events):
+    # Related objects are left out; they stay available from the events endpoint
+    return EventSerializer(events, many=True, selection=FieldSelection(expand={})).data
+
+def build_snapshot_document(video, event_counts=None):
+    """
+    Assemble the snapshot document of a video, reusing the pipeline's event
+    counts when given
+    """
+    events = Event.objects.filter(video=video)
+    if event_counts is None:
+        event_counts = aggregate_event_counts(video)
+
+    class_counts = dict(
+        DetectedObject.objects.filter(frame__video=video)
+        .values_list('class_name')
+        .annotate(count=Count('id'))
+    )
+    for _, _, class_name, count in packed_class_counts(video):
+        class_counts[class_name] = class_counts.get(class_name, 0) + count
+    class_counts = dict(sorted(class_counts.items(), key=lambda item: (-item[1], item[0])))
+    frames = VideoFrame._default_manager.filter(video=video).aggregate(
+        total=Count('id'),
+        with_objects=Count('id', filter=Q(has_objects=True)),
+    )
+
+    top_events = events.annotate(severity_rank=_severity_rank()).order_by(
+        'severity_rank', '-confidence', 'start_time'
+    )[:SNAPSHOT_TOP_EVENTS]
+
+    return {
+        'schema_version': SNAPSHOT_SCHEMA_VERSION,
+        'video': {
+            'id': str(video.id),
+            'title': video.title,
+            'description': video.description,
+            'status': video.status,
+            'duration': video.duration.total_seconds() if video.duration else None,
+            'resolution_width': video.resolution_width,
+            'resolution_height': video.resolution_height,
+            'frame_rate': video.frame_rate,
+            'analysis_types': video.analysis_types,
+            'processing_started_at': video.processing_started_at,
+            'processing_completed_at': video.processing_completed_at,
+        },
+        'stats': {
+            'frames_count': frames['total'],
+            'frames_with_objects': frames['with_objects'],
+            'detections_count': sum(class_counts.values()),
+            'events_count': event_counts['events_total'],
+            'violations_count': event_counts['violations_total'],
+            'events_by_severity': event_counts['by_severity'],
+            'events_by_type': event_counts['by_type'],
+            'events_by_detector': event_counts['by_detector'],
+        },
+        'class_counts': class_counts,
+        'top_events': _serialize_events(top_events),
+        'violations': _serialize_events(events.filter(is_violation=True).order_by('start_time')),
+        'timeline': timeline_payload(get_video_timeline(video)),
+    }
+
+def build_video_snapshot(video, event_counts=None):
+    """Compute and store the snapshot of a video"""
+    data = zlib.compress(dumps_json(build_snapshot_document(video, event_counts)))
+    snapshot = VideoSnapshot.objects.filter(video=video).first()
+    if snapshot is None:
+        return VideoSnapshot.objects.create(
+            video=video, schema_version=SNAPSHOT_SCHEMA_VERSION, data=data
+        )
+    snapshot.schema_version = SNAPSHOT_SCHEMA_VERSION
+    snapshot.revision += 1
+    snapshot.data = data
+    snapshot.save()
+    return snapshot
+
+def discard_video_snapshot(video_id):
+    """Drop a stored snapshot so the next read rebuilds it"""
+    VideoSnapshot.objects.filter(video_id=video_id).delete()
+
+def snapshot_bytes(snapshot):
+    """The JSON document of a snapshot, as UTF-8 bytes"""
+    return zlib.decompress(bytes(snapshot.data))
+
+def snapshot_document(snapshot):
+    """The decoded JSON document of a snapshot"""
+    return json.loads(snapshot_bytes(snapshot))
+
+def snapshot_etag(snapshot, media_type=''):
+    """Strong ETag of a snapshot in a given representation"""
+    return quote_etag(hashlib.sha1(
+        f'{snapshot.video_id}:{snapshot.revision}:{snapshot.updated_at.isoformat()}:'
+        f'{media_type}'.encode('utf-8')
+    ).hexdigest())
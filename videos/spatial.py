@@ -0,0 +1,250 @@
+"""
+Grid spatial index over the detections of a video.
+
+The normalized frame is divided into SPATIAL_GRID_SIZE x SPATIAL_GRID_SIZE
+cells and every detection is listed under each cell its box covers, cells
+being stored CSR-style (offsets plus member lists) with the members of a
+cell sorted by time. The index holds the detection columns too, so a region
+query over a time range only visits the cells under the region, bisects
+their members by time, runs the exact box test on those candidates and
+answers without reading the detections table. It is stored as one
+compressed NPZ blob in VideoSpatialIndex, rebuilt after object detection
+and discarded when detections change (see videos.signals). Each process
+keeps the arrays of recently queried videos loaded until the video's
+version changes, so a repeated query reads nothing.
+"""
+import io
+import uuid
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from .cache import get_video_version
+from .models import DetectedObject, TrackSummary, VideoSpatialIndex
+from .rules import points_in_polygon
+from .packing import packed_detection_values
+
+# Cells per side of the grid
+SPATIAL_GRID_SIZE = 16
+
+# Matching detections returned by a region query when no limit is given
+DEFAULT_REGION_LIMIT = 1000
+MAX_REGION_LIMIT = 10000
+
+REGION_MODES = ['center', 'intersects']
+
+# Videos whose index arrays each process keeps loaded
+SPATIAL_CACHE_SIZE = 16
+
+def _cell_range(low, high, grid_size):
+    first = np.clip(np.floor(low * grid_size), 0, grid_size - 1).astype(np.int64)
+    last = np.clip(np.floor(high * grid_size), 0, grid_size - 1).astype(np.int64)
+    return first, np.maximum(last, first)
+
+def compute_spatial_index(columns, grid_size=SPATIAL_GRID_SIZE):
+    """
+    Cell offsets and members of detection columns holding ``timestamp`` and
+    ``bbox`` (n x 4: x, y, width, height)
+    """
+    bbox = columns['bbox']
+    x0, x1 = _cell_range(bbox[:, 0], bbox[:, 0] + bbox[:, 2], grid_size)
+    y0, y1 = _cell_range(bbox[:, 1], bbox[:, 1] + bbox[:, 3], grid_size)
+    widths, heights = x1 - x0 + 1, y1 - y0 + 1
+
+    # One (detection, cell) pair per covered cell
+    counts = widths * heights
+    detection = np.repeat(np.arange(len(bbox)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = (
+        (y0[detection] + offset // widths[detection]) * grid_size
+        + x0[detection] + offset % widths[detection]
+    )
+
+    order = np.lexsort((columns['timestamp'][detection], cells))
+    members = detection[order].astype(np.int32)
+    cell_offsets = np.searchsorted(cells[order], np.arange(grid_size * grid_size + 1)).astype(np.int64)
+    return cell_offsets, members
+
+def detection_columns(video):
+    """Columns of every detection of a video, ordered by time"""
+    fields = [
+        'id', 'frame__frame_number', 'frame__timestamp', 'class_name', 'confidence',
+        'bbox_x', 'bbox_y', 'bbox_width', 'bbox_height', 'track_id'
+    ]
+    rows = list(
+        DetectedObject.objects.filter(frame__video=video)
+        .order_by('frame__timestamp', 'id')
+        .values_list(*fields)
+        .iterator(chunk_size=10000)
+    )
+    packed = list(packed_detection_values(video, fields))
+    if packed:
+        rows = sorted(rows + packed, key=lambda row: (row[2], row[1]))
+    classes, tracks = {}, {'': 0}
+    return {
+        # Raw UUID bytes, one row each; packed detections have no id and get
+        # the null UUID
+        'id': np.frombuffer(
+            b''.join(row[0].bytes if row[0] else bytes(16) for row in rows), dtype=np.uint8
+        ).reshape(-1, 16),
+        'frame_number': np.array([row[1] for row in rows], dtype=np.int32),
+        'timestamp': np.array([row[2] for row in rows], dtype=np.float64),
+        'class_id': np.array([classes.setdefault(row[3], len(classes)) for row in rows], dtype=np.int16),
+        'confidence': np.array([row[4] for row in rows], dtype=np.float32),
+        'bbox': np.array([row[5:9] for row in rows], dtype=np.float32).reshape(-1, 4),
+        'track': np.array([tracks.setdefault(row[9] or '', len(tracks)) for row in rows], dtype=np.int32),
+        'class_names': np.array(list(classes), dtype=str),
+        'track_ids': np.array(list(tracks), dtype=str),
+    }
+
+def build_spatial_index(video, grid_size=SPATIAL_GRID_SIZE):
+    """Compute and store the spatial index of a video"""
+    columns = detection_columns(video)
+    cell_offsets, members = compute_spatial_index(columns, grid_size)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, cell_offsets=cell_offsets, members=members, **columns)
+    index, _ = VideoSpatialIndex.objects.update_or_create(
+        video=video,
+        defaults={
+            'grid_size': grid_size,
+            'detections_count': len(columns['id']),
+            'data': buffer.getvalue(),
+        }
+    )
+    return index
+
+def get_spatial_index(video):
+    """The stored spatial index of a video, computing it when missing"""
+    index = VideoSpatialIndex.objects.filter(video=video).first()
+    if index is None:
+        index = build_spatial_index(video)
+    return index
+
+def discard_spatial_index(video_id):
+    """Drop a stored spatial index so the next query recomputes it"""
+    VideoSpatialIndex.objects.filter(video_id=video_id).delete()
+
+def load_spatial_index(index):
+    with np.load(io.BytesIO(bytes(index.data))) as archive:
+        return {name: archive[name] for name in archive.files}
+
+_loaded = OrderedDict()
+_loaded_lock = Lock()
+
+def get_spatial_arrays(video):
+    """
+    (grid size, arrays) of a video's spatial index, loaded again only when
+    the video's version changes
+    """
+    version = get_video_version(video.id)
+    with _loaded_lock:
+        entry = _loaded.get(video.id)
+        if entry is not None and entry[0] == version:
+            _loaded.move_to_end(video.id)
+            return entry[1]
+
+    index = get_spatial_index(video)
+    loaded = (index.grid_size, load_spatial_index(index))
+    with _loaded_lock:
+        _loaded[video.id] = (version, loaded)
+        _loaded.move_to_end(video.id)
+        while len(_loaded) > SPATIAL_CACHE_SIZE:
+            _loaded.popitem(last=False)
+    return loaded
+
+def clear_spatial_arrays():
+    with _loaded_lock:
+        _loaded.clear()
+
+def _candidates(arrays, grid_size, bounds, start_time, end_time):
+    """Detections listed under the cells covering bounds, within the time range"""
+    x0, x1 = _cell_range(np.array([bounds[0]]), np.array([bounds[2]]), grid_size)
+    y0, y1 = _cell_range(np.array([bounds[1]]), np.array([bounds[3]]), grid_size)
+    offsets, members, timestamps = arrays['cell_offsets'], arrays['members'], arrays['timestamp']
+    found = []
+    for row in range(int(y0[0]), int(y1[0]) + 1):
+        for cell in range(row * grid_size + int(x0[0]), row * grid_size + int(x1[0]) + 1):
+            cell_members = members[offsets[cell]:offsets[cell + 1]]
+            if start_time is not None or end_time is not None:
+                times = timestamps[cell_members]
+                first = 0 if start_time is None else np.searchsorted(times, start_time, side='left')
+                last = len(times) if end_time is None else np.searchsorted(times, end_time, side='right')
+                cell_members = cell_members[first:last]
+            found.append(cell_members)
+    return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int32)
+
+def query_region(arrays, grid_size, region=None, polygon=None, start_time=None, end_time=None,
+                 mode='center', classes=None):
+    """
+    Indices into the index columns of the detections inside a region over a
+    time range, in time order. The region is a
+    rectangle (x0, y0, x1, y1) or a polygon of [x, y] points; in 'center'
+    mode a box matches when its center lies in the region, in 'intersects'
+    mode (rectangles only) when it overlaps it.
+    """
+    if polygon is not None:
+        polygon = np.asarray(polygon, dtype=np.float64)
+        bounds = (*polygon.min(axis=0), *polygon.max(axis=0))
+    else:
+        bounds = region
+
+    candidates = _candidates(arrays, grid_size, bounds, start_time, end_time)
+    bbox = arrays['bbox'][candidates].astype(np.float64)
+    if mode == 'intersects':
+        mask = (
+            (bbox[:, 0] <= bounds[2]) & (bbox[:, 0] + bbox[:, 2] >= bounds[0])
+            & (bbox[:, 1] <= bounds[3]) & (bbox[:, 1] + bbox[:, 3] >= bounds[1])
+        )
+    else:
+        centers = bbox[:, :2] + bbox[:, 2:] / 2
+        if polygon is not None:
+            mask = points_in_polygon(centers, polygon)
+        else:
+            mask = (
+                (centers[:, 0] >= bounds[0]) & (centers[:, 0] <= bounds[2])
+                & (centers[:, 1] >= bounds[1]) & (centers[:, 1] <= bounds[3])
+            )
+    if classes:
+        lookup = np.array([str(name) in classes for name in arrays['class_names']], dtype=bool)
+        mask &= lookup[arrays['class_id'][candidates]]
+
+    # np.unique sorted the candidates by position, which follows time
+    return candidates[mask]
+
+def _detection_id(value):
+    # Packed detections have the null UUID
+    return str(uuid.UUID(bytes=value.tobytes())) if value.any() else None
+
+def region_payload(video, limit=DEFAULT_REGION_LIMIT, **query):
+    """
+    Matching detections (up to limit) and a queryset of the summaries of
+    the tracks they belong to
+    """
+    grid_size, arrays = get_spatial_arrays(video)
+    matches = query_region(arrays, grid_size, **query)
+    class_names = [str(name) for name in arrays['class_names']]
+    track_ids = [str(track_id) for track_id in arrays['track_ids']]
+
+    detections = [
+        {
+            'id': _detection_id(arrays['id'][row]),
+            'frame_number': int(arrays['frame_number'][row]),
+            'timestamp': float(arrays['timestamp'][row]),
+            'class_name': class_names[arrays['class_id'][row]],
+            'confidence': float(arrays['confidence'][row]),
+            'bbox_x': float(arrays['bbox'][row, 0]),
+            'bbox_y': float(arrays['bbox'][row, 1]),
+            'bbox_width': float(arrays['bbox'][row, 2]),
+            'bbox_height': float(arrays['bbox'][row, 3]),
+            'track_id': track_ids[arrays['track'][row]] or None,
+        }
+        for row in matches[:limit]
+    ]
+    matched_tracks = [track_ids[code] for code in np.unique(arrays['track'][matches]) if code]
+    return {
+        'video_id': str(video.id),
+        'detections_count': len(matches),
+        'detections': detections,
+        'tracks': TrackSummary.objects.filter(
+            video=video, track_id__in=matched_tracks
+        ).order_by('first_seen'),
+    }
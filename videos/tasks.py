@@ -1,27 +1,54 @@
 from celery import shared_task
+from django.core.files.base import ContentFile
 from django.utils import timezone
 from .models import Video, VideoFrame, DetectedObject, Event
+from .vectors import index_video_embeddings, retrain_outgrown_indexes
+from .timeline import build_video_timeline, discard_video_timeline
+from .snapshots import build_video_snapshot, discard_video_snapshot
+from .results import aggregate_event_counts, add_event
+from .rules import compile_rules, detection_arrays, violation_event
+from .tracks import TrackAssociator, build_video_tracks, track_arrays
+from .merging import merge_video_events
+from .spatial import build_spatial_index, discard_spatial_index
+from .linking import link_video_events
+from .classmasks import frame_class_fields
+from .anomalies import detect_anomalies
+from .activity import recognize_activities
+from .decoding import analysis_input, decode_frame, encode_jpeg
+from .inference import get_model
+from .cache import bump_video_version
+from .signals import deferred_invalidation
+from .roi import region_of_interest
+from .packing import DetectionVocabulary, count_detections, detection_storage, pack_detections
+from analytics.models import AnalysisSession
 import cv2
 import numpy as np
 import os
-import tempfile
 from datetime import timedelta
 
+# Analysis stages in dependency order: tracks are built from the detections,
+# activities and anomalies read the tracks, and rules run last, over all of them
+ANALYSIS_STAGE_ORDER = [
+    'object_detection', 'event_classification', 'activity_recognition',
+    'anomaly_detection', 'guideline_adherence',
+]
+
+def analysis_stages(analysis_types):
+    """The requested analysis types in dependency order, whatever order they came in"""
+    return [stage for stage in ANALYSIS_STAGE_ORDER if stage in analysis_types]
+
 @shared_task
 def process_video_analysis(video_id, analysis_config=None):
     """
     Celery task for processing video analysis
     This is a simplified version - in production, this would integrate with actual AI models
     """
+    session = None
     try:
         video = Video.objects.get(id=video_id)
         video.start_processing()
-        
-        # Extract video metadata
-        extract_video_metadata(video)
-        
-        # Extract frames
-        frames = extract_video_frames(video)
+        discard_video_timeline(video.id)
+        discard_video_snapshot(video.id)
         
         # Perform analysis based on configuration
         if analysis_config:
@@ -29,35 +56,109 @@ def process_video_analysis(video_id, analysis_config=None):
         else:
             analysis_types = video.analysis_types
         
-        for analysis_type in analysis_types:
-            if analysis_type == 'object_detection':
-                perform_object_detection(video, frames)
-            elif analysis_type == 'event_classification':
-                perform_event_classification(video, frames)
-            elif analysis_type == 'guideline_adherence':
-                check_guideline_adherence(video)
+        session = AnalysisSession.objects.create(
+            user_id=video.user_id,
+            video=video,
+            status='in_progress',
+            analysis_types=analysis_types,
+            custom_rules=video.custom_rules,
+            current_stage='extracting_frames'
+        )
         
-        # Generate summary events
-        generate_summary_events(video)
+        # Event handlers apply once the events are final, not per write
+        with deferred_invalidation(video.id):
+            # Extract video metadata
+            extract_video_metadata(video)
+            
+            # Extract frames
+            frames = extract_video_frames(video)
+            
+            for analysis_type in analysis_stages(analysis_types):
+                if analysis_type == 'object_detection':
+                    perform_object_detection(video, frames)
+                    build_video_tracks(video)
+                    build_spatial_index(video)
+                elif analysis_type == 'event_classification':
+                    perform_event_classification(video, frames)
+                elif analysis_type == 'guideline_adherence':
+                    check_guideline_adherence(video)
+                elif analysis_type == 'anomaly_detection':
+                    detect_video_anomalies(video)
+                elif analysis_type == 'activity_recognition':
+                    recognize_video_activities(video, frames)
+            
+            # Collapse duplicate reports of the same occurrence
+            merge_video_events(video)
+            
+            # Link the remaining events to the frames and detections they cover
+            link_video_events(video)
+            
+            # Count the results once and keep the counts current in memory
+            event_counts = aggregate_event_counts(video)
+            
+            # Generate summary events
+            generate_summary_events(video, event_counts)
+            
+            # Index frames and events for similarity search
+            index_video_embeddings(video)
+            
+        # Precompute the density timeline served to the dashboard
+        build_video_timeline(video)
         
         video.complete_processing()
         
+        # Store the results document served to completed video pages
+        build_video_snapshot(video, event_counts)
+        
+        complete_analysis_session(session, video, frames, event_counts)
+        
         return {
             'status': 'success',
             'video_id': str(video.id),
             'frames_processed': len(frames),
-            'events_detected': video.events.count()
+            'events_detected': event_counts['events_total'],
+            'violations_detected': event_counts['violations_total'],
+            'events_by_type': event_counts['by_type'],
+            'events_by_severity': event_counts['by_severity'],
+            'events_by_detector': event_counts['by_detector']
         }
         
     except Exception as e:
         video = Video.objects.get(id=video_id)
         video.fail_processing(str(e))
+        if session is not None:
+            session.status = 'failed'
+            session.error_message = str(e)
+            session.completed_at = timezone.now()
+            session.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
         return {
             'status': 'error',
             'video_id': str(video.id),
             'error': str(e)
         }
 
+@shared_task
+def retrain_embedding_indexes():
+    """
+    Periodic task training the similarity indexes that uploads have outgrown;
+    uploads only add their vectors to the trained indexes
+    """
+    return retrain_outgrown_indexes()
+
+def complete_analysis_session(session, video, frames, event_counts):
+    """Record the totals of a finished run on its analysis session"""
+    session.status = 'completed'
+    session.progress_percentage = 100.0
+    session.current_stage = 'completed'
+    session.total_events_detected = event_counts['events_total']
+    session.total_violations_detected = event_counts['violations_total']
+    session.total_objects_detected = count_detections(video)
+    session.frames_processed = len(frames)
+    session.completed_at = video.processing_completed_at
+    if video.processing_started_at and video.processing_completed_at:
+        session.processing_time = video.processing_completed_at - video.processing_started_at
+    session.save()
+
 def extract_video_metadata(video):
     """Extract metadata from video file"""
     try:
@@ -87,52 +188,55 @@ def extract_video_metadata(video):
         print(f"Error extracting metadata: {e}")
 
 def extract_video_frames(video, interval=1.0):
-    """Extract frames from video at specified interval"""
+    """
+    Extract frames from video at specified interval, decoding each once
+    into its stored, analysis and optical flow images (see videos.decoding)
+    """
     frames = []
     
     try:
+        roi = region_of_interest(video.custom_rules)
         cap = cv2.VideoCapture(video.file.path)
         fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps * interval)  # Extract frame every 'interval' seconds
+        frame_interval = max(1, int(fps * interval))  # Extract frame every 'interval' seconds
         
         frame_number = 0
         extracted_count = 0
         
         while True:
+            # Frames between extracted ones are only grabbed, not decoded
+            if frame_number % frame_interval:
+                if not cap.grab():
+                    break
+                frame_number += 1
+                continue
+            
             ret, frame = cap.read()
             if not ret:
                 break
             
-            if frame_number % frame_interval == 0:
-                timestamp = frame_number / fps
-                
-                # Save frame to temporary file
-                with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                    cv2.imwrite(temp_file.name, frame)
-                    
-                    # Create VideoFrame object
-                    video_frame = VideoFrame.objects.create(
-                        video=video,
-                        frame_number=frame_number,
-                        timestamp=timestamp,
-                        width=frame.shape[1],
-                        height=frame.shape[0],
-                        file_size=os.path.getsize(temp_file.name)
-                    )
-                    
-                    # Save frame image
-                    with open(temp_file.name, 'rb') as f:
-                        video_frame.image.save(
-                            f'frame_{frame_number}.jpg',
-                            f,
-                            save=True
-                        )
-                    
-                    frames.append(video_frame)
-                    extracted_count += 1
-                    
-                    # Clean up temp file
-                    os.unlink(temp_file.name)
+            timestamp = frame_number / fps
+            stored, analysis, flow = decode_frame(frame, roi=roi)
+            data = encode_jpeg(stored)
+            
+            # Create VideoFrame object with its image at storage resolution
+            video_frame = VideoFrame(
+                video=video,
+                frame_number=frame_number,
+                timestamp=timestamp,
+                width=stored.shape[1],
+                height=stored.shape[0],
+                file_size=len(data)
+            )
+            video_frame.image.save(f'frame_{frame_number}.jpg', ContentFile(data), save=False)
+            video_frame.save()
+            
+            # Keep the small copies for the analysis stages, so they do not
+            # decode the video again
+            video_frame.analysis_image = analysis
+            video_frame.flow_image = flow
+            frames.append(video_frame)
+            extracted_count += 1
             
             frame_number += 1
         
@@ -145,163 +249,153 @@ def extract_video_frames(video, interval=1.0):
 
 def perform_object_detection(video, frames):
     """
-    Perform object detection on video frames
-    This is a mock implementation - in production, this would use actual AI models
+    Perform object detection on video frames with the worker's resident
+    object detector (a mock unless VIDEO_MODELS configures a real model)
     """
-    # Mock object classes that might be detected in traffic scenarios
-    mock_objects = [
-        'car', 'truck', 'bus', 'motorcycle', 'bicycle', 'person', 
-        'traffic_light', 'stop_sign', 'crosswalk'
-    ]
-    
+    detector = get_model('object_detector')
+    roi = region_of_interest(video.custom_rules)
+    packed = detection_storage() == 'packed'
+    packed_vocabulary = DetectionVocabulary(video.packed_vocabulary)
+    vocabulary = list(video.class_vocabulary)
+    associator = TrackAssociator()
+    detected = []
+    updated = []
     for frame in frames:
-        # Mock detection - randomly generate some objects
-        import random
-        num_objects = random.randint(0, 5)
+        # The detector sees the letterboxed frame, or its region of interest,
+        # and returns boxes in input pixels, mapped back to normalized
+        # full-frame coordinates
+        image, letterbox = analysis_input(frame, roi=roi)
+        results = detector.detect(image, letterbox)
+        boxes = letterbox.to_normalized([result[2] for result in results]).tolist()
         
-        for i in range(num_objects):
-            obj_class = random.choice(mock_objects)
-            confidence = random.uniform(0.7, 0.95)
-            
-            # Random bounding box coordinates (normalized)
-            bbox_x = random.uniform(0, 0.8)
-            bbox_y = random.uniform(0, 0.8)
-            bbox_width = random.uniform(0.1, 0.2)
-            bbox_height = random.uniform(0.1, 0.2)
+        # Detectors that track return a fourth value, the track id; the
+        # boxes of the others are linked to the tracks of earlier frames
+        if results and all(len(result) > 3 for result in results):
+            track_ids = [str(result[3]) if result[3] is not None else None for result in results]
+        else:
+            track_ids = associator.update([result[0] for result in results], boxes)
+        
+        detections = []
+        for (obj_class, confidence, *_), box, track_id in zip(results, boxes, track_ids):
+            bbox_x, bbox_y, bbox_width, bbox_height = box
             
-            DetectedObject.objects.create(
-                frame=frame,
-                class_name=obj_class,
-                confidence=confidence,
-                bbox_x=bbox_x,
-                bbox_y=bbox_y,
-                bbox_width=bbox_width,
-                bbox_height=bbox_height,
-                track_id=f"track_{i}_{frame.frame_number}"
-            )
+            detections.append({
+                'class_name': obj_class,
+                'confidence': confidence,
+                'bbox_x': bbox_x,
+                'bbox_y': bbox_y,
+                'bbox_width': bbox_width,
+                'bbox_height': bbox_height,
+                'track_id': track_id
+            })
+        
+        # Drop detections outside the region of interest before storing them
+        if roi is not None:
+            detections = roi.filter_detections(detections)
+        
+        # The analysis image is not needed past detection
+        frame.analysis_image = None
         
-        frame.has_objects = num_objects > 0
-        frame.save()
+        if packed:
+            frame.packed_detections = pack_detections(detections, packed_vocabulary)
+        else:
+            detected.extend(DetectedObject(frame=frame, **detection) for detection in detections)
+        
+        frame.has_objects = bool(detections)
+        frame.class_mask, frame.class_counts = frame_class_fields(
+            vocabulary, [detection['class_name'] for detection in detections]
+        )
+        updated.append(frame)
+    
+    DetectedObject.objects.bulk_create(detected, batch_size=1000)
+    VideoFrame._default_manager.bulk_update(
+        updated, ['has_objects', 'class_mask', 'class_counts', 'packed_detections'], batch_size=1000
+    )
+    # Bulk writes skip the model signals
+    discard_spatial_index(video.id)
+    bump_video_version(video.id)
+    
+    video.class_vocabulary = vocabulary
+    video.packed_vocabulary = packed_vocabulary.as_json()
+    video.save(update_fields=['class_vocabulary', 'packed_vocabulary', 'updated_at'])
 
 def perform_event_classification(video, frames):
     """
-    Perform event classification
-    This is a mock implementation - in production, this would use actual AI models
+    Perform event classification with the worker's resident event
+    classifier (a mock unless VIDEO_MODELS configures a real model)
     """
-    # Mock events that might be detected
-    mock_events = [
-        {
-            'type': 'vehicle_movement',
-            'title': 'Vehicle Movement Detected',
-            'description': 'A vehicle was observed moving through the scene',
-            'severity': 'info'
-        },
-        {
-            'type': 'pedestrian_crossing',
-            'title': 'Pedestrian Crossing',
-            'description': 'A pedestrian crossed the street',
-            'severity': 'info'
-        },
-        {
-            'type': 'traffic_light_change',
-            'title': 'Traffic Light Change',
-            'description': 'Traffic light changed state',
-            'severity': 'info'
-        },
-        {
-            'type': 'sudden_stop',
-            'title': 'Sudden Vehicle Stop',
-            'description': 'A vehicle stopped suddenly',
-            'severity': 'warning'
-        }
-    ]
-    
-    import random
-    
-    # Generate some random events
-    for i in range(random.randint(2, 8)):
-        event_data = random.choice(mock_events)
-        start_time = random.uniform(0, float(video.duration.total_seconds()) - 5)
-        end_time = start_time + random.uniform(1, 5)
-        
+    classifier = get_model('event_classifier')
+    for event_data in classifier.classify(video, frames):
         Event.objects.create(
             video=video,
-            event_type=event_data['type'],
-            title=event_data['title'],
-            description=event_data['description'],
-            severity=event_data['severity'],
-            start_time=start_time,
-            end_time=end_time,
-            confidence=random.uniform(0.7, 0.95),
-            detected_by='mock_classifier'
+            detected_by=getattr(classifier, 'name', 'event_classifier'),
+            **event_data
         )
 
 def check_guideline_adherence(video):
     """
-    Check for guideline adherence violations
-    This is a mock implementation
+    Check the video's detections and tracks against the guideline rules compiled from
+    its custom_rules, creating one violation event per breach
     """
-    import random
-    
-    # Mock violation scenarios
-    violations = [
-        {
-            'type': 'speed_violation',
-            'title': 'Speed Limit Violation',
-            'description': 'Vehicle exceeded speed limit',
-            'severity': 'violation',
-            'guideline': 'Traffic Speed Regulations'
-        },
-        {
-            'type': 'red_light_violation',
-            'title': 'Red Light Violation',
-            'description': 'Vehicle ran through red light',
-            'severity': 'critical',
-            'guideline': 'Traffic Signal Compliance'
-        },
-        {
-            'type': 'wrong_lane',
-            'title': 'Wrong Lane Usage',
-            'description': 'Vehicle used incorrect lane',
-            'severity': 'warning',
-            'guideline': 'Lane Usage Rules'
-        }
-    ]
+    rule_set = compile_rules(video.custom_rules)
+    if not rule_set:
+        return []
     
-    # Randomly generate some violations
-    for i in range(random.randint(0, 3)):
-        violation = random.choice(violations)
-        start_time = random.uniform(0, float(video.duration.total_seconds()) - 2)
-        
-        Event.objects.create(
-            video=video,
-            event_type=violation['type'],
-            title=violation['title'],
-            description=violation['description'],
-            severity=violation['severity'],
-            start_time=start_time,
-            end_time=start_time + random.uniform(1, 3),
-            confidence=random.uniform(0.8, 0.95),
-            detected_by='guideline_checker',
-            is_violation=True,
-            guideline_reference=violation['guideline']
-        )
+    violations = rule_set.evaluate(
+        detections=detection_arrays(video) if rule_set.uses('detections') else None,
+        tracks=track_arrays(video) if rule_set.uses('tracks') else None
+    )
+    events = []
+    for violation in violations:
+        event = violation_event(video, violation, rule_set)
+        event.save()
+        events.append(event)
+    return events
 
-def generate_summary_events(video):
-    """Generate summary events based on detected events"""
-    events = video.events.all()
-    violations = events.filter(is_violation=True)
+def detect_video_anomalies(video):
+    """
+    Flag unusual object counts and motion, and changes in them, from rolling
+    statistics over the video's per-frame series
+    """
+    events = detect_anomalies(video)
+    for event in events:
+        event.save()
+    return events
+
+def recognize_video_activities(video, frames=None):
+    """
+    Classify the motion of tracked objects and regions into activities from
+    dense optical flow between consecutive frames
+    """
+    events = recognize_activities(video, frames)
+    for event in events:
+        event.save()
+    return events
+
+def generate_summary_events(video, event_counts=None):
+    """
+    Generate summary events based on detected events
     
-    if violations.exists():
-        Event.objects.create(
+    The counts come from results.aggregate_event_counts (computed here when
+    not given), so no further queries run over the events; the summary event
+    itself is added to them.
+    """
+    if event_counts is None:
+        event_counts = aggregate_event_counts(video)
+    
+    violations = event_counts['violations_total']
+    if violations:
+        summary = Event.objects.create(
             video=video,
             event_type='summary',
-            title=f'Analysis Complete: {violations.count()} Violations Found',
-            description=f'Video analysis completed. Found {events.count()} total events, including {violations.count()} violations.',
-            severity='warning' if violations.count() > 0 else 'info',
+            title=f'Analysis Complete: {violations} Violations Found',
+            description=f'Video analysis completed. Found {event_counts["events_total"]} total events, including {violations} violations.',
+            severity='warning',
             start_time=0,
             end_time=float(video.duration.total_seconds()),
             confidence=1.0,
             detected_by='summary_generator'
         )
-
+        add_event(event_counts, summary)
+        return summary
+    return None
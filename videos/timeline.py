@@ -0,0 +1,196 @@
+"""
+Precomputed density timelines of videos.
+
+When the pipeline completes, events (by severity), violations and detections
+(by class) are counted per time bucket at several bucket widths with NumPy
+and stored as one compressed NPZ blob in VideoTimeline. The timeline endpoint
+then answers with a single primary-key read, slicing the width that fits the
+requested number of buckets. Events count in every bucket they overlap,
+detections in the bucket of their frame's timestamp.
+
+Event writes discard the stored timeline (see videos.signals), and the next
+read recomputes it.
+"""
+import io
+import math
+import numpy as np
+from django.db.models import Count, Max
+from .models import VideoFrame, DetectedObject, Event, VideoTimeline
+from .packing import packed_class_counts
+
+# Candidate bucket widths in seconds, finest first
+TIMELINE_BUCKET_WIDTHS = [1, 5, 15, 60, 300, 900, 3600]
+
+# Widths producing more buckets than this are not stored
+MAX_TIMELINE_BUCKETS = 3600
+
+# Buckets returned when the client does not pick a width
+DEFAULT_TIMELINE_BUCKETS = 200
+
+SEVERITIES = [severity for severity, _ in Event.SEVERITY_CHOICES]
+
+def bucket_widths_for(duration):
+    """Widths worth storing for a video, always including the coarsest"""
+    widths = [
+        width for width in TIMELINE_BUCKET_WIDTHS
+        if math.ceil(duration / width) <= MAX_TIMELINE_BUCKETS
+    ]
+    return widths or TIMELINE_BUCKET_WIDTHS[-1:]
+
+def _bucket_count(duration, width):
+    return max(1, math.ceil(duration / width))
+
+def _bucket_index(times, width, buckets):
+    return np.clip((times // width).astype(np.int64), 0, buckets - 1)
+
+def interval_counts(starts, ends, groups, group_count, width, buckets):
+    """
+    Number of intervals of each group overlapping each bucket, computed with a
+    difference array: +1 at the first bucket of an interval, -1 after its last
+    """
+    diff = np.zeros((group_count, buckets + 1), dtype=np.int64)
+    first = _bucket_index(starts, width, buckets)
+    last = np.maximum(_bucket_index(ends, width, buckets), first)
+    np.add.at(diff, (groups, first), 1)
+    np.add.at(diff, (groups, last + 1), -1)
+    return np.cumsum(diff, axis=1)[:, :buckets]
+
+def point_counts(times, groups, weights, group_count, width, buckets):
+    """Weighted number of points of each group falling in each bucket"""
+    cells = groups * buckets + _bucket_index(times, width, buckets)
+    counts = np.bincount(cells, weights=weights, minlength=group_count * buckets)
+    return counts.reshape(group_count, buckets).astype(np.int64)
+
+def _compact(counts):
+    """Store counts in the smallest unsigned type that holds them"""
+    dtype = np.uint16 if counts.size == 0 or counts.max() <= np.iinfo(np.uint16).max else np.uint32
+    return counts.astype(dtype)
+
+def compute_timeline(video):
+    """Return (duration, bucket widths, arrays) of a video's timeline"""
+    events = list(Event.objects.filter(video=video).values_list(
+        'start_time', 'end_time', 'duration', 'severity', 'is_violation'
+    ))
+    detections = list(
+        DetectedObject.objects.filter(frame__video=video)
+        .values_list('frame__timestamp', 'class_name')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    detections.extend(
+        (timestamp, class_name, count) for _, timestamp, class_name, count in packed_class_counts(video)
+    )
+
+    starts = np.array([start for start, *_ in events], dtype=np.float64)
+    ends = np.array([
+        end if end is not None else start + (duration or 0.0)
+        for start, end, duration, *_ in events
+    ], dtype=np.float64)
+    severities = list(SEVERITIES)
+    for *_, severity, _ in events:
+        if severity not in severities:
+            severities.append(severity)
+    severity_ids = np.array([severities.index(severity) for *_, severity, _ in events], dtype=np.int64)
+    violations = np.array([is_violation for *_, is_violation in events], dtype=bool)
+
+    classes = sorted({class_name for _, class_name, _ in detections})
+    class_ids = np.array([classes.index(class_name) for _, class_name, _ in detections], dtype=np.int64)
+    timestamps = np.array([timestamp for timestamp, *_ in detections], dtype=np.float64)
+    weights = np.array([count for *_, count in detections], dtype=np.float64)
+
+    duration = video.duration.total_seconds() if video.duration else 0.0
+    last_frame = VideoFrame._default_manager.filter(video=video).aggregate(last=Max('timestamp'))['last']
+    duration = max(
+        duration,
+        float(ends.max()) if len(ends) else 0.0,
+        float(last_frame or 0.0),
+    )
+
+    widths = bucket_widths_for(duration)
+    arrays = {
+        'severities': np.array(severities, dtype=str),
+        'classes': np.array(classes, dtype=str),
+    }
+    for width in widths:
+        buckets = _bucket_count(duration, width)
+        arrays[f'events_{width}'] = _compact(
+            interval_counts(starts, ends, severity_ids, len(severities), width, buckets)
+        )
+        arrays[f'violations_{width}'] = _compact(interval_counts(
+            starts[violations], ends[violations],
+            np.zeros(violations.sum(), dtype=np.int64), 1, width, buckets
+        )[0])
+        arrays[f'detections_{width}'] = _compact(
+            point_counts(timestamps, class_ids, weights, len(classes), width, buckets)
+        )
+    return duration, widths, arrays
+
+def build_video_timeline(video):
+    """Compute and store the timeline of a video"""
+    duration, widths, arrays = compute_timeline(video)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    timeline, _ = VideoTimeline.objects.update_or_create(
+        video=video,
+        defaults={
+            'duration': duration,
+            'bucket_widths': widths,
+            'data': buffer.getvalue(),
+        }
+    )
+    return timeline
+
+def get_video_timeline(video):
+    """The stored timeline of a video, computing it when missing"""
+    timeline = VideoTimeline.objects.filter(video=video).first()
+    if timeline is None:
+        timeline = build_video_timeline(video)
+    return timeline
+
+def discard_video_timeline(video_id):
+    """Drop a stored timeline so the next read recomputes it"""
+    VideoTimeline.objects.filter(video_id=video_id).delete()
+
+def choose_bucket_width(widths, duration, bucket_width=None, max_buckets=DEFAULT_TIMELINE_BUCKETS):
+    """
+    The stored width to serve: the finest one at least as wide as the
+    requested width, or the finest one giving at most max_buckets buckets
+    """
+    if bucket_width is not None:
+        candidates = [width for width in widths if width >= bucket_width]
+    else:
+        candidates = [width for width in widths if _bucket_count(duration, width) <= max_buckets]
+    return candidates[0] if candidates else widths[-1]
+
+def timeline_payload(timeline, bucket_width=None, max_buckets=DEFAULT_TIMELINE_BUCKETS, start=None, end=None):
+    """Serialize the histograms of one bucket width, optionally limited to a time window"""
+    width = choose_bucket_width(timeline.bucket_widths, timeline.duration, bucket_width, max_buckets)
+    with np.load(io.BytesIO(bytes(timeline.data))) as archive:
+        events = archive[f'events_{width}']
+        violations = archive[f'violations_{width}']
+        detections = archive[f'detections_{width}']
+        severities = [str(severity) for severity in archive['severities']]
+        classes = [str(class_name) for class_name in archive['classes']]
+
+    buckets = len(violations)
+    first = 0 if start is None else min(max(int(start // width), 0), buckets)
+    last = buckets if end is None else min(max(math.ceil(end / width), first), buckets)
+    window = slice(first, last)
+
+    return {
+        'video_id': str(timeline.video_id),
+        'duration': timeline.duration,
+        'bucket_width': width,
+        'available_bucket_widths': timeline.bucket_widths,
+        'start': first * width,
+        'buckets': last - first,
+        'events': {
+            severity: events[index, window].tolist()
+            for index, severity in enumerate(severities)
+        },
+        'violations': violations[window].tolist(),
+        'detections': {
+            class_name: detections[index, window].tolist()
+            for index, class_name in enumerate(classes)
+        },
+    }
@@ -0,0 +1,217 @@
+"""
+Per-track motion summaries of videos.
+
+After object detection, the boxes sharing a track_id are sorted into
+trajectories and reduced with NumPy (one sort, then segment reductions) to
+one TrackSummary row per track: dwell time, path length, mean and peak
+speed, net heading and the most frequent class. Guideline rules about
+motion and "fast vehicles" queries read this table instead of re-scanning
+raw detections.
+
+Detectors that track objects return their own track ids. For the others,
+the detection stage links each frame's boxes to the tracks of the frames
+before it with a TrackAssociator: greedy matching, highest IoU first, of
+same-class boxes against the last box of every live track.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .cache import bump_video_version
+from .models import TrackSummary
+from .rules import ClassColumns, detection_arrays
+
+TRACKING_DEFAULTS = {
+    'TRACK_IOU_THRESHOLD': 0.3,
+    'TRACK_MAX_AGE': 2,
+}
+
+def tracking_setting(name):
+    return getattr(settings, name, TRACKING_DEFAULTS[name])
+
+def box_iou(boxes, others):
+    """Intersection over union of every pair of (x, y, width, height) boxes"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 1, 4)
+    others = np.asarray(others, dtype=np.float64).reshape(1, -1, 4)
+    start = np.maximum(boxes[..., :2], others[..., :2])
+    end = np.minimum(boxes[..., :2] + boxes[..., 2:], others[..., :2] + others[..., 2:])
+    intersection = np.prod(np.clip(end - start, 0.0, None), axis=-1)
+    union = np.prod(boxes[..., 2:], axis=-1) + np.prod(others[..., 2:], axis=-1) - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+class TrackAssociator:
+    """
+    Assigns track ids to the boxes of consecutive frames. A track ends once
+    it goes unmatched for more than ``max_age`` frames.
+    """
+
+    def __init__(self, iou_threshold=None, max_age=None):
+        self.iou_threshold = tracking_setting('TRACK_IOU_THRESHOLD') if iou_threshold is None else iou_threshold
+        self.max_age = tracking_setting('TRACK_MAX_AGE') if max_age is None else max_age
+        self.track_ids = []
+        self.classes = []
+        self.boxes = np.zeros((0, 4))
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.created = 0
+
+    def update(self, class_names, boxes):
+        """Track ids of a frame's boxes, given with their class names"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        iou = box_iou(boxes, self.boxes)
+        iou[np.asarray(class_names, dtype=object).reshape(-1, 1) != np.asarray(self.classes, dtype=object)] = 0.0
+        rows, columns = np.nonzero(iou >= self.iou_threshold)
+        order = np.argsort(-iou[rows, columns], kind='stable')
+        match = np.full(len(boxes), -1, dtype=np.int64)
+        taken = np.zeros(len(self.track_ids), dtype=bool)
+        for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+            if match[row] < 0 and not taken[column]:
+                match[row] = column
+                taken[column] = True
+
+        # Matched tracks move to their new box, unmatched ones age
+        matched = match >= 0
+        self.boxes[match[matched]] = boxes[matched]
+        self.missed[taken] = 0
+        self.missed[~taken] += 1
+        track_ids = [self.track_ids[column] if column >= 0 else None for column in match.tolist()]
+        for row in np.flatnonzero(~matched).tolist():
+            track_ids[row] = f'track_{self.created}'
+            self.created += 1
+        live = self.missed <= self.max_age
+        self.track_ids = [track_id for track_id, alive in zip(self.track_ids, live.tolist()) if alive]
+        self.track_ids += [track_ids[row] for row in np.flatnonzero(~matched).tolist()]
+        self.classes = [name for name, alive in zip(self.classes, live.tolist()) if alive]
+        self.classes += [class_names[row] for row in np.flatnonzero(~matched).tolist()]
+        self.boxes = np.vstack([self.boxes[live], boxes[~matched]])
+        self.missed = np.concatenate([self.missed[live], np.zeros((~matched).sum(), dtype=np.int64)])
+        return track_ids
+
+def _segments(keys):
+    """Start offsets of the runs of equal values in a sorted array"""
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+def _dominant_classes(track_index, class_id, track_count, class_count):
+    """Most frequent class code of each track, ties going to the lowest code"""
+    pairs, counts = np.unique(track_index * class_count + class_id, return_counts=True)
+    tracks, classes = np.divmod(pairs, class_count)
+    order = np.lexsort((classes, -counts, tracks))
+    first = _segments(tracks[order])
+    dominant = np.zeros(track_count, dtype=np.int64)
+    dominant[tracks[order][first]] = classes[order][first]
+    return dominant
+
+def compute_track_summaries(arrays):
+    """
+    Summary columns of every tracked object in a rules.DetectionArrays;
+    untracked detections are ignored
+    """
+    tracked = np.flatnonzero(arrays.track >= 0)
+    order = tracked[np.lexsort((arrays.timestamp[tracked], arrays.track[tracked]))]
+    track = arrays.track[order]
+    times = arrays.timestamp[order]
+    centers = arrays.center[order]
+
+    starts = _segments(track)
+    ends = np.append(starts[1:], len(order)) - 1
+    sizes = ends - starts + 1
+    if not len(starts):
+        starts = ends = sizes = np.zeros(0, dtype=np.int64)
+
+    steps = np.zeros(len(order))
+    if len(order) > 1:
+        same_track = track[1:] == track[:-1]
+        steps[1:] = np.where(same_track, np.linalg.norm(np.diff(centers, axis=0), axis=1), 0.0)
+    speeds = np.nan_to_num(arrays.speed[order], nan=0.0)
+
+    def per_track(values, ufunc=np.add):
+        return ufunc.reduceat(values, starts) if len(starts) else np.zeros(0)
+
+    first_seen = times[starts]
+    last_seen = times[ends]
+    dwell_time = last_seen - first_seen
+    distance = per_track(steps)
+    displacement = centers[ends] - centers[starts]
+    moved = np.any(displacement != 0, axis=1)
+    # Image rows grow downwards, so flip y to measure angles counterclockwise
+    heading = np.degrees(np.arctan2(-displacement[:, 1], displacement[:, 0])) % 360
+
+    dominant = _dominant_classes(
+        np.repeat(np.arange(len(starts)), sizes), arrays.class_id[order],
+        len(starts), max(len(arrays.class_names), 1)
+    )
+    return {
+        'track_id': [arrays.track_id(code) for code in track[starts]],
+        'class_name': [arrays.class_names[code] for code in dominant],
+        'first_seen': first_seen,
+        'last_seen': last_seen,
+        'dwell_time': dwell_time,
+        'detections_count': sizes,
+        'mean_confidence': per_track(arrays.confidence[order]) / np.maximum(sizes, 1),
+        'start': centers[starts],
+        'end': centers[ends],
+        'distance': distance,
+        'mean_speed': np.divide(distance, dwell_time, out=np.zeros(len(starts)), where=dwell_time > 0),
+        'max_speed': per_track(speeds, np.maximum),
+        'heading': np.where(moved, heading, np.nan),
+    }
+
+def build_video_tracks(video, arrays=None):
+    """Compute and store the track summaries of a video, replacing old ones"""
+    if arrays is None:
+        arrays = detection_arrays(video)
+    columns = compute_track_summaries(arrays)
+    tracks = [
+        TrackSummary(
+            video=video,
+            track_id=track_id,
+            class_name=columns['class_name'][row],
+            first_seen=float(columns['first_seen'][row]),
+            last_seen=float(columns['last_seen'][row]),
+            dwell_time=float(columns['dwell_time'][row]),
+            detections_count=int(columns['detections_count'][row]),
+            mean_confidence=float(columns['mean_confidence'][row]),
+            start_x=float(columns['start'][row, 0]),
+            start_y=float(columns['start'][row, 1]),
+            end_x=float(columns['end'][row, 0]),
+            end_y=float(columns['end'][row, 1]),
+            distance=float(columns['distance'][row]),
+            mean_speed=float(columns['mean_speed'][row]),
+            max_speed=float(columns['max_speed'][row]),
+            heading=None if np.isnan(columns['heading'][row]) else float(columns['heading'][row]),
+        )
+        for row, track_id in enumerate(columns['track_id'])
+    ]
+    with transaction.atomic():
+        TrackSummary.objects.filter(video=video).delete()
+        TrackSummary.objects.bulk_create(tracks, batch_size=1000)
+    # Bulk writes skip the model signals
+    bump_video_version(video.id)
+    return tracks
+
+class TrackArrays(ClassColumns):
+    """Columns of a video's track summaries, as rules evaluate them"""
+
+    FIELDS = [
+        'track_id', 'class_name', 'first_seen', 'last_seen', 'dwell_time', 'detections_count',
+        'mean_confidence', 'end_x', 'end_y', 'mean_speed', 'max_speed', 'distance', 'heading'
+    ]
+
+    def __init__(self, rows):
+        columns = list(zip(*rows)) or [()] * len(self.FIELDS)
+        values = dict(zip(self.FIELDS, columns))
+        self.track_ids = list(values['track_id'])
+        self.class_names, class_id = np.unique(np.array(values['class_name'], dtype=str), return_inverse=True)
+        self.class_names = [str(name) for name in self.class_names]
+        self.class_id = class_id.reshape(-1).astype(np.int64)
+        for name in self.FIELDS[2:]:
+            setattr(self, name, np.array(
+                [np.nan if value is None else value for value in values[name]], dtype=np.float64
+            ))
+        self.confidence = self.mean_confidence
+
+def track_arrays(video):
+    """Track summary columns of a video, read in one query"""
+    return TrackArrays(
+        TrackSummary.objects.filter(video=video).order_by('first_seen').values_list(*TrackArrays.FIELDS)
+    )
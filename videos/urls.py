@@ -5,12 +5,23 @@ urlpatterns = [
     path('', views.VideoListView.as_view(), name='video-list'),
     path('upload/', views.VideoUploadView.as_view(), name='video-upload'),
     path('search/', views.search_videos, name='video-search'),
+    path('search/all/', views.search_all, name='search-all'),
     path('statistics/', views.video_statistics, name='video-statistics'),
+    path('cache-stats/', views.video_cache_stats, name='video-cache-stats'),
     path('<uuid:pk>/', views.VideoDetailView.as_view(), name='video-detail'),
     path('<uuid:video_id>/analyze/', views.start_video_analysis, name='start-analysis'),
     path('<uuid:video_id>/status/', views.video_analysis_status, name='analysis-status'),
     path('<uuid:video_id>/frames/', views.VideoFramesView.as_view(), name='video-frames'),
+    path('<uuid:video_id>/frames/query/', views.video_frame_query, name='video-frame-query'),
     path('<uuid:video_id>/events/', views.VideoEventsView.as_view(), name='video-events'),
+    path('<uuid:video_id>/events/active/', views.video_active_events, name='video-active-events'),
+    path('<uuid:video_id>/region/', views.video_region_query, name='video-region-query'),
+    path('<uuid:video_id>/tracks/', views.VideoTracksView.as_view(), name='video-tracks'),
+    path('<uuid:video_id>/export/', views.video_export, name='video-export'),
+    path('<uuid:video_id>/timeline/', views.video_timeline, name='video-timeline'),
+    path('<uuid:video_id>/snapshot/', views.video_snapshot, name='video-snapshot'),
     path('events/<uuid:pk>/', views.EventDetailView.as_view(), name='event-detail'),
+    path('events/<uuid:pk>/similar/', views.similar_events, name='similar-events'),
+    path('frames/<uuid:pk>/similar/', views.similar_frames, name='similar-frames'),
 ]
 
@@ -0,0 +1,570 @@
+"""
+Vector similarity search over frame and event embeddings.
+
+Embeddings are produced by pluggable functions (the VIDEO_EMBEDDING_FUNCTIONS
+setting maps an entity type to a dotted path) and stored as float32 blobs in
+the Embedding table. Queries run against an index per user: an exact
+FlatIndex for small collections and an IVFIndex, optionally with
+product-quantized residuals, once a collection grows past
+APPROXIMATE_INDEX_THRESHOLD vectors.
+
+An index is trained per user and kept in EmbeddingIndex; the pipeline only
+encodes a new video's vectors with it (assigns them to the trained IVF lists)
+into an EmbeddingSegment. The retrain_embedding_indexes task trains indexes
+again once their collections outgrow them. Requests load the segments, once
+per process and then only the changed ones, whenever the user's embeddings
+version (see videos.cache) changes.
+"""
+import hashlib
+import io
+import re
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils.module_loading import import_string
+from .cache import bump_embeddings_version, get_embeddings_version
+from .models import VideoFrame, Embedding, EmbeddingIndex, EmbeddingSegment
+from .packing import attach_packed_objects
+
+EMBEDDING_DIMENSIONS = 64
+
+# Collections at least this large are served by an approximate IVF index
+APPROXIMATE_INDEX_THRESHOLD = 50000
+
+# Approximate indexes are trained again once their collection has grown by
+# this factor since their last training
+RETRAIN_GROWTH = 2.0
+
+# Bytes per vector kept by the approximate index when product quantization is
+# enabled; 0 keeps raw vectors (exact scores, 4 bytes per dimension)
+PQ_SUBVECTORS = 0
+
+# Residuals used to train each product-quantization codebook
+PQ_TRAINING_SIZE = 16384
+
+# Number of per-user indexes kept in memory by each process
+INDEX_CACHE_SIZE = 8
+
+DEFAULT_EMBEDDING_FUNCTIONS = {
+    'frame': 'videos.vectors.frame_detection_embedding',
+    'event': 'videos.vectors.event_text_embedding',
+}
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def _hashed_bucket(token, dimensions):
+    """Stable (bucket, sign) pair for a token, independent of PYTHONHASHSEED"""
+    value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def event_text_embedding(event, dimensions=EMBEDDING_DIMENSIONS):
+    """Deterministic hashed bag of words over an event's text and severity"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    text = ' '.join([event.event_type, event.title, event.description, event.guideline_reference])
+    for token in WORD_RE.findall(text.lower()):
+        bucket, sign = _hashed_bucket(token, dimensions)
+        vector[bucket] += sign
+    bucket, sign = _hashed_bucket(f'severity:{event.severity}', dimensions)
+    vector[bucket] += 2 * sign
+    return _normalize(vector)
+
+def frame_detection_embedding(frame, dimensions=EMBEDDING_DIMENSIONS):
+    """
+    Deterministic summary of a frame's detections: confidence-weighted class
+    counts plus the classes present in each cell of a 3x3 grid
+    """
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for obj in frame.objects.all():
+        column = min(int((obj.bbox_x + obj.bbox_width / 2) * 3), 2)
+        row = min(int((obj.bbox_y + obj.bbox_height / 2) * 3), 2)
+        for token in (obj.class_name, f'{obj.class_name}@{row}{column}'):
+            bucket, sign = _hashed_bucket(token, dimensions)
+            vector[bucket] += sign * obj.confidence
+    return _normalize(vector)
+
+def embedding_function_path(entity_type):
+    """Dotted path of the embedding function configured for an entity type"""
+    functions = getattr(settings, 'VIDEO_EMBEDDING_FUNCTIONS', {})
+    return functions.get(entity_type, DEFAULT_EMBEDDING_FUNCTIONS[entity_type])
+
+def _top_k(scores, positions, k):
+    """Positions and scores of the k best scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        scores, positions = scores[best], positions[best]
+    order = np.argsort(-scores, kind='stable')
+    return positions[order], scores[order]
+
+def _nearest_centroids(data, centroids, chunk_size=65536):
+    """Index of the nearest centroid (squared L2) for every row of data"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        assignments[start:start + chunk_size] = (centroid_norms - 2 * chunk @ centroids.T).argmin(axis=1)
+    return assignments
+
+def kmeans(data, k, iterations=10, seed=0):
+    """Lloyd's k-means, returning a (k, d) float32 centroid matrix"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = _nearest_centroids(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack([
+            np.bincount(assignments, weights=data[:, j], minlength=k)
+            for j in range(data.shape[1])
+        ], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+class FlatIndex:
+    """Exact inner-product search over a dense matrix of unit vectors"""
+
+    def __init__(self, vectors):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query, k):
+        scores = self.vectors @ query
+        return _top_k(scores, np.arange(len(scores)), k)
+
+    def quantizer(self):
+        """Arrays of what the index learnt from its vectors: nothing"""
+        return {}
+
+    def encode(self, vectors):
+        """(inverted list, stored form) of vectors, lists being all 0"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return np.zeros(len(vectors), dtype=np.int32), vectors
+
+    @classmethod
+    def restore(cls, quantizer, lists=None, encoded=None):
+        """Index over encoded vectors"""
+        return cls(np.empty((0, EMBEDDING_DIMENSIONS)) if encoded is None else encoded)
+
+class IVFIndex:
+    """
+    Approximate inner-product search with an inverted file.
+
+    Vectors are bucketed by their nearest coarse centroid and a query scans
+    only the ``nprobe`` closest buckets. With ``pq_subvectors`` set, each
+    vector's residual from its centroid is stored as one byte per subvector
+    (product quantization) and scored through per-query distance tables, which
+    keeps millions of vectors in a few bytes each.
+    """
+
+    def __init__(self, vectors, nlist=None, nprobe=8, pq_subvectors=None, training_size=100000, seed=0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > training_size:
+            sample = vectors[rng.choice(len(vectors), training_size, replace=False)]
+
+        self.nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        self.nprobe = nprobe
+        self.centroids = kmeans(sample, self.nlist, seed=seed)
+        self.nlist = len(self.centroids)
+
+        self.pq_subvectors = pq_subvectors
+        if pq_subvectors:
+            dimensions = vectors.shape[1]
+            if dimensions % pq_subvectors:
+                raise ValueError('Vector dimensions must be divisible by pq_subvectors')
+            self.subvector_size = dimensions // pq_subvectors
+            pq_sample = sample[:PQ_TRAINING_SIZE]
+            sample_residuals = pq_sample - self.centroids[_nearest_centroids(pq_sample, self.centroids)]
+            self.codebooks = np.stack([
+                kmeans(self._split(sample_residuals)[:, m], 256, seed=seed + m)
+                for m in range(pq_subvectors)
+            ])
+        self._fill(*self.encode(vectors))
+
+    def quantizer(self):
+        """Arrays of what the index learnt from its vectors: centroids and codebooks"""
+        arrays = {'centroids': self.centroids, 'nprobe': np.array(self.nprobe)}
+        if self.pq_subvectors:
+            arrays['codebooks'] = self.codebooks
+        return arrays
+
+    def encode(self, vectors):
+        """
+        (inverted list, stored form) of vectors with the trained centroids:
+        the vector itself, or the codes of its residual with product
+        quantization
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        lists = _nearest_centroids(vectors, self.centroids).astype(np.int32)
+        if self.pq_subvectors:
+            return lists, self._encode(vectors - self.centroids[lists])
+        return lists, vectors
+
+    def _fill(self, lists, encoded):
+        order = np.argsort(lists, kind='stable')
+        self.positions = order
+        self.offsets = np.searchsorted(lists[order], np.arange(self.nlist + 1))
+        if self.pq_subvectors:
+            self.codes = encoded[order]
+        else:
+            self.vectors = encoded[order]
+
+    @classmethod
+    def restore(cls, quantizer, lists=None, encoded=None):
+        """
+        Index over encoded vectors with trained centroids and codebooks, or
+        without lists one that can only encode
+        """
+        index = cls.__new__(cls)
+        index.centroids = quantizer['centroids']
+        index.nlist = len(index.centroids)
+        index.nprobe = int(quantizer['nprobe'])
+        index.pq_subvectors = None
+        if 'codebooks' in quantizer:
+            index.codebooks = quantizer['codebooks']
+            index.pq_subvectors, _, index.subvector_size = index.codebooks.shape
+        if lists is not None:
+            index._fill(np.asarray(lists), encoded)
+        return index
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _split(self, vectors):
+        return vectors.reshape(len(vectors), self.pq_subvectors, self.subvector_size)
+
+    def _encode(self, residuals):
+        parts = self._split(residuals)
+        codes = np.empty((len(residuals), self.pq_subvectors), dtype=np.uint8)
+        for m in range(self.pq_subvectors):
+            codes[:, m] = _nearest_centroids(parts[:, m], self.codebooks[m])
+        return codes
+
+    def search(self, query, k):
+        distances = (self.centroids ** 2).sum(axis=1) - 2 * self.centroids @ query
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(distances, nprobe - 1)[:nprobe]
+
+        positions, scores = [], []
+        for probe in probes:
+            start, end = self.offsets[probe], self.offsets[probe + 1]
+            if start == end:
+                continue
+            positions.append(self.positions[start:end])
+            if self.pq_subvectors:
+                residual = (query - self.centroids[probe]).reshape(self.pq_subvectors, 1, self.subvector_size)
+                table = ((self.codebooks - residual) ** 2).sum(axis=2)
+                squared = table[np.arange(self.pq_subvectors), self.codes[start:end]].sum(axis=1)
+                # For unit vectors |q - x|^2 = 2 - 2 q.x
+                scores.append(1.0 - squared / 2.0)
+            else:
+                scores.append(self.vectors[start:end] @ query)
+
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return _top_k(np.concatenate(scores), np.concatenate(positions), k)
+
+def decode_vector(blob):
+    return np.frombuffer(blob, dtype='<f4')
+
+def build_index(vectors):
+    """Pick the exact or approximate index according to collection size"""
+    if len(vectors) < APPROXIMATE_INDEX_THRESHOLD:
+        return FlatIndex(vectors)
+    return IVFIndex(vectors, pq_subvectors=PQ_SUBVECTORS or None)
+
+INDEX_CLASSES = {'flat': FlatIndex, 'ivf': IVFIndex}
+
+def _pack(**arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+def _unpack(data):
+    with np.load(io.BytesIO(bytes(data))) as archive:
+        return {name: archive[name] for name in archive.files}
+
+def _id_bytes(object_ids):
+    """Object ids as a (n, 16) uint8 array of their raw bytes"""
+    raw = b''.join(object_id.bytes for object_id in object_ids)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, 16)
+
+def _user_vectors(user_id, entity_type, model_name):
+    """(object_ids, vectors) of a user's embeddings of an entity type"""
+    rows = list(
+        Embedding.objects.filter(video__user_id=user_id, entity_type=entity_type, model_name=model_name)
+        .values_list('object_id', 'vector')
+    )
+    object_ids = _id_bytes(object_id for object_id, _ in rows)
+    if rows:
+        vectors = np.stack([decode_vector(blob) for _, blob in rows])
+    else:
+        vectors = np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    return object_ids, vectors
+
+def _segment_data(object_ids, lists, encoded):
+    return _pack(object_ids=object_ids, lists=lists, encoded=encoded)
+
+def add_video_vectors(video, entity_type, model_name, object_ids, vectors):
+    """
+    Encode a video's vectors with its owner's trained index and store them as
+    the video's segment; nothing is trained, so this costs O(video) however
+    large the collection is
+    """
+    stored = EmbeddingIndex.objects.filter(
+        user_id=video.user_id, entity_type=entity_type, model_name=model_name
+    ).first()
+    if stored is None:
+        # First index of the user, or embeddings from before indexes were
+        # stored: train one over all of them, this video's included
+        train_user_index(video.user_id, entity_type)
+        return
+    lists, encoded = INDEX_CLASSES[stored.kind].restore(_unpack(stored.data)).encode(vectors)
+    EmbeddingSegment.objects.update_or_create(
+        video=video,
+        entity_type=entity_type,
+        model_name=model_name,
+        defaults={
+            'generation': stored.generation,
+            'vectors_count': len(vectors),
+            'data': _segment_data(object_ids, lists, encoded),
+        }
+    )
+
+def train_user_index(user_id, entity_type):
+    """
+    Train the index over all of a user's embeddings of an entity type and
+    re-encode every video's segment with it
+    """
+    model_name = embedding_function_path(entity_type)
+    rows = list(
+        Embedding.objects.filter(video__user_id=user_id, entity_type=entity_type, model_name=model_name)
+        .order_by('video_id').values_list('video_id', 'object_id', 'vector')
+    )
+    video_ids = [video_id for video_id, _, _ in rows]
+    object_ids = _id_bytes(object_id for _, object_id, _ in rows)
+    if rows:
+        vectors = np.stack([decode_vector(blob) for _, _, blob in rows])
+    else:
+        vectors = np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    index = build_index(vectors)
+    lists, encoded = index.encode(vectors)
+
+    with transaction.atomic():
+        stored = EmbeddingIndex.objects.select_for_update().filter(
+            user_id=user_id, entity_type=entity_type, model_name=model_name
+        ).first()
+        generation = stored.generation + 1 if stored else 1
+        EmbeddingIndex.objects.update_or_create(
+            user_id=user_id,
+            entity_type=entity_type,
+            model_name=model_name,
+            defaults={
+                'kind': 'ivf' if isinstance(index, IVFIndex) else 'flat',
+                'generation': generation,
+                'trained_count': len(vectors),
+                'data': _pack(**index.quantizer()),
+            }
+        )
+        EmbeddingSegment.objects.filter(
+            video__user_id=user_id, entity_type=entity_type, model_name=model_name
+        ).delete()
+        segments = []
+        start = 0
+        while start < len(rows):
+            end = start
+            while end < len(rows) and video_ids[end] == video_ids[start]:
+                end += 1
+            segments.append(EmbeddingSegment(
+                video_id=video_ids[start],
+                entity_type=entity_type,
+                model_name=model_name,
+                generation=generation,
+                vectors_count=end - start,
+                data=_segment_data(object_ids[start:end], lists[start:end], encoded[start:end]),
+            ))
+            start = end
+        EmbeddingSegment.objects.bulk_create(segments, batch_size=100)
+    bump_embeddings_version(user_id)
+    return index
+
+def needs_training(stored, vectors_count):
+    """Whether an index no longer fits the collection it serves"""
+    if stored is None:
+        return vectors_count > 0
+    if stored.kind == 'flat':
+        return vectors_count >= APPROXIMATE_INDEX_THRESHOLD
+    return vectors_count >= RETRAIN_GROWTH * stored.trained_count
+
+def retrain_outgrown_indexes():
+    """
+    Retrain the indexes whose collections outgrew them, and train the missing
+    ones of users with embeddings; returns the number trained
+    """
+    stored = {
+        (index.user_id, index.entity_type, index.model_name): index
+        for index in EmbeddingIndex.objects.all()
+    }
+    counts = {
+        (user_id, entity_type, model_name): count
+        for user_id, entity_type, model_name, count in
+        Embedding.objects.values_list('video__user_id', 'entity_type', 'model_name')
+        .annotate(count=Count('id')).order_by()
+    }
+    trained = 0
+    for (user_id, entity_type, model_name), count in counts.items():
+        if model_name != embedding_function_path(entity_type):
+            continue
+        if needs_training(stored.get((user_id, entity_type, model_name)), count):
+            train_user_index(user_id, entity_type)
+            trained += 1
+    return trained
+
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+def _merge_segments(stored, parts):
+    """(object_ids, index) over the decoded segments of a stored index"""
+    if not parts:
+        return np.empty((0, 16), dtype=np.uint8), FlatIndex(np.empty((0, EMBEDDING_DIMENSIONS)))
+    object_ids, lists, encoded = (
+        np.concatenate([part[i] for part in parts]) for i in (1, 2, 3)
+    )
+    return object_ids, INDEX_CLASSES[stored.kind].restore(_unpack(stored.data), lists, encoded)
+
+def load_index(user, entity_type):
+    """
+    Return (object_ids, index) over the user's embeddings of an entity type,
+    object ids as rows of raw bytes.
+
+    Indexes are cached per process until the user's embeddings version
+    changes; then only the segments added or replaced since are read, unless
+    the index was retrained. Users without a stored index yet, e.g. with
+    embeddings from before indexes were stored, get an exact index over their
+    vectors; nothing is trained here.
+    """
+    model_name = embedding_function_path(entity_type)
+    version = get_embeddings_version(user.pk)
+    key = (user.pk, entity_type, model_name)
+
+    with _index_cache_lock:
+        cached = _index_cache.get(key)
+        if cached and cached['version'] == version:
+            _index_cache.move_to_end(key)
+            return cached['entry']
+
+    stored = EmbeddingIndex.objects.filter(user=user, entity_type=entity_type, model_name=model_name).first()
+    parts = {}
+    if stored is not None:
+        segments = EmbeddingSegment.objects.filter(
+            video__user=user, entity_type=entity_type, model_name=model_name, generation=stored.generation
+        )
+        current = dict(segments.values_list('id', 'computed_at'))
+        if cached and cached['generation'] == stored.generation:
+            parts = {
+                segment_id: part for segment_id, part in cached['parts'].items()
+                if current.get(segment_id) == part[0]
+            }
+        missing = [segment_id for segment_id in current if segment_id not in parts]
+        if missing:
+            if len(missing) < len(current):
+                segments = segments.filter(id__in=missing)
+            for segment_id, computed_at, data in segments.values_list('id', 'computed_at', 'data'):
+                arrays = _unpack(data)
+                parts[segment_id] = (computed_at, arrays['object_ids'], arrays['lists'], arrays['encoded'])
+        entry = _merge_segments(stored, list(parts.values()))
+    else:
+        object_ids, vectors = _user_vectors(user.pk, entity_type, model_name)
+        entry = (object_ids, FlatIndex(vectors))
+
+    with _index_cache_lock:
+        _index_cache[key] = {
+            'version': version,
+            'generation': stored and stored.generation,
+            'parts': parts,
+            'entry': entry,
+        }
+        _index_cache.move_to_end(key)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return entry
+
+def find_similar(user, entity_type, object_id, k=10):
+    """
+    Return up to k (object_id, score) pairs most similar to the given frame or
+    event, best first, or None when it has no embedding
+    """
+    embedding = Embedding.objects.filter(
+        video__user=user,
+        entity_type=entity_type,
+        object_id=object_id,
+        model_name=embedding_function_path(entity_type)
+    ).first()
+    if embedding is None:
+        return None
+
+    object_ids, index = load_index(user, entity_type)
+    if not len(index):
+        return []
+    positions, scores = index.search(decode_vector(embedding.vector), k + 1)
+    own_id = embedding.object_id.bytes
+    results = [
+        (uuid.UUID(bytes=object_ids[position].tobytes()), float(score))
+        for position, score in zip(positions, scores)
+        if object_ids[position].tobytes() != own_id
+    ]
+    return results[:k]
+
+def index_video_embeddings(video):
+    """Compute and store embeddings for all frames and events of a video"""
+    Embedding.objects.filter(video=video).delete()
+
+    sources = {
+        'frame': attach_packed_objects(list(
+            VideoFrame._default_manager.filter(video=video).prefetch_related('objects')
+        )),
+        'event': video.events.all(),
+    }
+    embeddings = []
+    added = {}
+    for entity_type, instances in sources.items():
+        model_name = embedding_function_path(entity_type)
+        embed = import_string(model_name)
+        object_ids, vectors = [], []
+        for instance in instances:
+            vector = np.asarray(embed(instance), dtype='<f4')
+            if not vector.any():
+                continue
+            object_ids.append(instance.id)
+            vectors.append(vector)
+            embeddings.append(Embedding(
+                entity_type=entity_type,
+                object_id=instance.id,
+                video=video,
+                model_name=model_name,
+                dimensions=len(vector),
+                vector=vector.tobytes()
+            ))
+        added[entity_type] = (model_name, object_ids, vectors)
+    Embedding.objects.bulk_create(embeddings, batch_size=1000)
+
+    # Only this video's vectors are encoded; training the owner's index again
+    # is left to the periodic retrain_embedding_indexes task
+    for entity_type, (model_name, object_ids, vectors) in added.items():
+        add_video_vectors(
+            video, entity_type, model_name, _id_bytes(object_ids),
+            np.stack(vectors) if vectors else np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        )
+    bump_embeddings_version(video.user_id)
+    return len(embeddings)
@@ -1,23 +1,141 @@
+import tempfile
+import uuid
 from rest_framework import status, generics, permissions, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Video, VideoFrame, Event, DetectedObject
+from .models import Video, VideoFrame, Event, DetectedObject, VideoSnapshot, TrackSummary
 from .serializers import (
     VideoUploadSerializer, VideoListSerializer, VideoDetailSerializer,
     VideoFrameSerializer, EventSerializer, EventCreateSerializer,
-    VideoAnalysisRequestSerializer, VideoSearchSerializer
+    VideoAnalysisRequestSerializer, VideoSearchSerializer,
+    EntitySearchSerializer, SearchResultSerializer, SimilaritySearchSerializer,
+    VideoExportSerializer, DetectedObjectSerializer, TimelineRequestSerializer,
+    TrackSummarySerializer, RegionQuerySerializer, FrameQuerySerializer
 )
+from .queries import (
+    with_frame_objects, with_event_objects, with_event_counts, with_detail_relations,
+    has_violations_condition, analysis_type_condition
+)
+from .fieldsets import FieldSelection, selected_columns, prune_columns
+from .pagination import VideoSearchPagination, stream_ndjson
+from .renderers import API_RENDERER_CLASSES
+from .packing import attach_packed_objects
+from . import classmasks, export, intervals, search, snapshots, spatial, timeline, vectors
+from .cache import conditional_response, cache_stats
 from .tasks import process_video_analysis  # We'll create this later
 
+def parse_detection_filters(query_params):
+    """Read the optional min_confidence/classes detection filters"""
+    min_confidence = query_params.get('min_confidence')
+    if min_confidence is not None:
+        try:
+            min_confidence = float(min_confidence)
+        except ValueError:
+            raise ValidationError({'min_confidence': 'A valid number is required.'})
+    
+    classes = query_params.get('classes')
+    class_names = [name for name in classes.split(',') if name] if classes else None
+    return min_confidence, class_names
+
+def parse_float_param(query_params, name):
+    """Read an optional numeric query parameter"""
+    value = query_params.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError({name: 'A valid number is required.'})
+
+def parse_time_filters(query_params):
+    """Read the optional ``at=<t>`` and ``overlaps=<start>,<end>`` time filters"""
+    at = parse_float_param(query_params, 'at')
+    overlaps = query_params.get('overlaps')
+    if overlaps is not None:
+        try:
+            start, end = (float(value) for value in overlaps.split(','))
+        except ValueError:
+            raise ValidationError({'overlaps': 'Expected two numbers: start,end.'})
+        if end < start:
+            raise ValidationError({'overlaps': 'End must not be before start.'})
+        overlaps = (start, end)
+    return at, overlaps
+
+def parse_event_param(query_params):
+    """Read the optional ``event=<uuid>`` filter"""
+    value = query_params.get('event')
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        raise ValidationError({'event': 'A valid UUID is required.'})
+
+class SparseFieldsViewMixin:
+    """
+    Mixin for views whose serializers support ``?fields=``/``?expand=``.
+    
+    The selection is handed to the serializer through its context, and
+    get_queryset uses it to skip unneeded columns and prefetches.
+    """
+    
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            self._field_selection = FieldSelection.from_request(self.request)
+        return self._field_selection
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['selection'] = self.get_field_selection()
+        return context
+
+class VideoScopedListMixin:
+    """
+    Mixin for list views nested under one of the user's videos.
+    
+    Rows are scoped to the video and its owner in the same query, so the video
+    itself is only looked up when a page comes back empty, to tell an empty
+    result apart from a missing video. Pages are served with conditional GET
+    support from the versioned response cache under ``cache_endpoint``.
+    """
+    
+    cache_endpoint = None
+    
+    def scope_to_video(self, queryset):
+        return queryset.filter(
+            video_id=self.kwargs['video_id'],
+            video__user=self.request.user
+        )
+    
+    def list(self, request, *args, **kwargs):
+        parent_list = super().list
+        
+        def build_response():
+            response = parent_list(request, *args, **kwargs)
+            data = response.data
+            count = data.get('count') if isinstance(data, dict) else len(data)
+            if not count:
+                get_object_or_404(Video, id=self.kwargs['video_id'], user=request.user)
+            return response
+        
+        return conditional_response(
+            request, self.cache_endpoint, self.kwargs['video_id'], build_response
+        )
+
 class VideoUploadView(generics.CreateAPIView):
     """API view for video upload"""
     
     serializer_class = VideoUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
     parser_classes = [MultiPartParser, FormParser]
     
     def create(self, request, *args, **kwargs):
@@ -35,11 +153,12 @@ class VideoUploadView(generics.CreateAPIView):
             'message': 'Video uploaded successfully and processing started'
         }, status=status.HTTP_201_CREATED)
 
-class VideoListView(generics.ListAPIView):
+class VideoListView(SparseFieldsViewMixin, generics.ListAPIView):
     """API view for listing user's videos"""
     
     serializer_class = VideoListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status']
     search_fields = ['title', 'description']
@@ -47,18 +166,39 @@ class VideoListView(generics.ListAPIView):
     ordering = ['-uploaded_at']
     
     def get_queryset(self):
-        return Video.objects.filter(user=self.request.user).select_related('user')
+        selection = self.get_field_selection()
+        queryset = with_event_counts(Video.objects.filter(user=self.request.user), selection)
+        return prune_columns(queryset, VideoListSerializer, selection)
 
-class VideoDetailView(generics.RetrieveUpdateDestroyAPIView):
+class VideoDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """API view for video detail, update, and delete"""
     
     serializer_class = VideoDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
     
     def get_queryset(self):
-        return Video.objects.filter(user=self.request.user)
+        selection = self.get_field_selection()
+        events_selection = selection.nested('events')
+        queryset = with_detail_relations(
+            Video.objects.filter(user=self.request.user),
+            selection,
+            event_columns=selected_columns(EventSerializer, events_selection),
+            object_columns=selected_columns(
+                DetectedObjectSerializer, events_selection.nested('related_objects')
+            )
+        )
+        return prune_columns(queryset, VideoDetailSerializer, selection)
+    
+    def retrieve(self, request, *args, **kwargs):
+        parent_retrieve = super().retrieve
+        return conditional_response(
+            request, 'video-detail', kwargs['pk'],
+            lambda: parent_retrieve(request, *args, **kwargs)
+        )
 
 @api_view(['POST'])
+@renderer_classes(API_RENDERER_CLASSES)
 @permission_classes([permissions.IsAuthenticated])
 def start_video_analysis(request, video_id):
     """API view to start or restart video analysis"""
@@ -84,37 +224,71 @@ def start_video_analysis(request, video_id):
     }, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
 @permission_classes([permissions.IsAuthenticated])
 def video_analysis_status(request, video_id):
     """API view to get video analysis status"""
     
-    video = get_object_or_404(Video, id=video_id, user=request.user)
-    
-    return Response({
-        'video_id': str(video.id),
-        'status': video.status,
-        'processing_started_at': video.processing_started_at,
-        'processing_completed_at': video.processing_completed_at,
-        'processing_error': video.processing_error,
-        'events_count': video.events.count(),
-        'violations_count': video.events.filter(is_violation=True).count()
-    }, status=status.HTTP_200_OK)
+    def build_response():
+        video = get_object_or_404(
+            with_event_counts(Video.objects.filter(user=request.user)),
+            id=video_id
+        )
+        
+        return Response({
+            'video_id': str(video.id),
+            'status': video.status,
+            'processing_started_at': video.processing_started_at,
+            'processing_completed_at': video.processing_completed_at,
+            'processing_error': video.processing_error,
+            'events_count': video.events_total,
+            'violations_count': video.violations_total
+        }, status=status.HTTP_200_OK)
+    
+    return conditional_response(request, 'analysis-status', video_id, build_response)
 
-class VideoFramesView(generics.ListAPIView):
+class VideoFramesView(SparseFieldsViewMixin, VideoScopedListMixin, generics.ListAPIView):
     """API view for listing video frames"""
     
     serializer_class = VideoFrameSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
+    cache_endpoint = 'video-frames'
     
     def get_queryset(self):
-        video_id = self.kwargs['video_id']
-        video = get_object_or_404(Video, id=video_id, user=self.request.user)
-        return VideoFrame.objects.filter(video=video).order_by('timestamp')
+        selection = self.get_field_selection()
+        queryset = self.scope_to_video(VideoFrame._default_manager.all())
+        event_id = parse_event_param(self.request.query_params)
+        if event_id is not None:
+            # Frames covered by the event, flagged by the linking stage
+            span = (
+                Event.objects.filter(id=event_id, video_id=self.kwargs['video_id'])
+                .annotate(event_end=intervals.effective_end())
+                .values_list('start_time', 'event_end').first()
+            )
+            if span is None:
+                return queryset.none()
+            queryset = queryset.filter(has_events=True, timestamp__gte=span[0], timestamp__lte=span[1])
+        if selection.includes('objects', expandable=True):
+            min_confidence, class_names = parse_detection_filters(self.request.query_params)
+            queryset = with_frame_objects(
+                queryset, min_confidence, class_names,
+                columns=selected_columns(DetectedObjectSerializer, selection.nested('objects'))
+            )
+        return prune_columns(queryset, VideoFrameSerializer, selection).order_by('timestamp')
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None and self.get_field_selection().includes('objects', expandable=True):
+            attach_packed_objects(page, *parse_detection_filters(self.request.query_params))
+        return page
 
-class VideoEventsView(generics.ListCreateAPIView):
+class VideoEventsView(SparseFieldsViewMixin, VideoScopedListMixin, generics.ListCreateAPIView):
     """API view for listing and creating video events"""
     
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
+    cache_endpoint = 'video-events'
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -122,9 +296,16 @@ class VideoEventsView(generics.ListCreateAPIView):
         return EventSerializer
     
     def get_queryset(self):
-        video_id = self.kwargs['video_id']
-        video = get_object_or_404(Video, id=video_id, user=self.request.user)
-        queryset = Event.objects.filter(video=video)
+        selection = self.get_field_selection()
+        queryset = prune_columns(
+            self.scope_to_video(Event.objects.all()), EventSerializer, selection
+        )
+        if selection.includes('related_objects', expandable=True):
+            min_confidence, class_names = parse_detection_filters(self.request.query_params)
+            queryset = with_event_objects(
+                queryset, min_confidence, class_names,
+                columns=selected_columns(DetectedObjectSerializer, selection.nested('related_objects'))
+            )
         
         # Filter by severity if provided
         severity = self.request.query_params.get('severity')
@@ -144,34 +325,94 @@ class VideoEventsView(generics.ListCreateAPIView):
         if end_time:
             queryset = queryset.filter(start_time__lte=float(end_time))
         
+        # Filter by activity at a time or over a time range if provided
+        at, overlaps = parse_time_filters(self.request.query_params)
+        if at is not None or overlaps is not None:
+            queryset = queryset.alias(event_end=intervals.effective_end())
+        if at is not None:
+            queryset = queryset.filter(intervals.at_condition(at))
+        if overlaps is not None:
+            queryset = queryset.filter(intervals.overlap_condition(*overlaps))
+        
         return queryset.order_by('start_time')
 
-class EventDetailView(generics.RetrieveUpdateDestroyAPIView):
+class VideoTracksView(SparseFieldsViewMixin, VideoScopedListMixin, generics.ListAPIView):
+    """API view for listing the tracked objects of a video"""
+    
+    serializer_class = TrackSummarySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['first_seen', 'dwell_time', 'distance', 'mean_speed', 'max_speed']
+    ordering = ['first_seen']
+    cache_endpoint = 'video-tracks'
+    
+    def get_queryset(self):
+        queryset = prune_columns(
+            self.scope_to_video(TrackSummary.objects.all()),
+            TrackSummarySerializer, self.get_field_selection()
+        )
+        params = self.request.query_params
+        
+        classes = params.get('classes')
+        if classes:
+            queryset = queryset.filter(class_name__in=[name for name in classes.split(',') if name])
+        
+        # Filter by motion if provided
+        for param, lookup in (
+            ('min_speed', 'max_speed__gte'), ('max_speed', 'max_speed__lte'),
+            ('min_dwell', 'dwell_time__gte'), ('max_dwell', 'dwell_time__lte'),
+        ):
+            value = parse_float_param(params, param)
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+        
+        return queryset
+
+class EventDetailView(SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """API view for event detail, update, and delete"""
     
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = API_RENDERER_CLASSES
     
     def get_queryset(self):
-        return Event.objects.filter(video__user=self.request.user)
+        selection = self.get_field_selection()
+        queryset = prune_columns(
+            Event.objects.filter(video__user=self.request.user), EventSerializer, selection
+        )
+        if selection.includes('related_objects', expandable=True):
+            queryset = with_event_objects(
+                queryset,
+                columns=selected_columns(DetectedObjectSerializer, selection.nested('related_objects'))
+            )
+        return queryset
 
 @api_view(['POST'])
+@renderer_classes(API_RENDERER_CLASSES)
 @permission_classes([permissions.IsAuthenticated])
 def search_videos(request):
-    """API view for advanced video search"""
+    """
+    API view for advanced video search
+    
+    Results are paginated with a keyset cursor (pass the returned ``next`` URL
+    back with the same filters). With ``stream`` set, every match is streamed
+    as NDJSON instead. A ``query`` is answered from the full-text index and
+    orders results by relevance.
+    """
     
     serializer = VideoSearchSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     queryset = Video.objects.filter(user=request.user)
+    ordering = VideoSearchPagination.ordering
     
     # Apply search filters
     query = serializer.validated_data.get('query')
     if query:
-        queryset = queryset.filter(
-            Q(title__icontains=query) | Q(description__icontains=query)
-        )
+        queryset = search.search_videos(queryset, query)
+        ordering = ('-search_rank', '-id')
     
     status_filter = serializer.validated_data.get('status')
     if status_filter:
@@ -188,24 +429,265 @@ def search_videos(request):
     has_violations = serializer.validated_data.get('has_violations')
     if has_violations is not None:
         if has_violations:
-            queryset = queryset.filter(events__is_violation=True).distinct()
+            queryset = queryset.filter(has_violations_condition())
         else:
-            queryset = queryset.exclude(events__is_violation=True).distinct()
+            queryset = queryset.filter(~has_violations_condition())
     
     analysis_types = serializer.validated_data.get('analysis_types')
     if analysis_types:
         for analysis_type in analysis_types:
-            queryset = queryset.filter(analysis_types__contains=[analysis_type])
+            queryset = queryset.filter(analysis_type_condition(analysis_type))
+    
+    queryset = with_event_counts(queryset)
+    
+    if serializer.validated_data['stream']:
+        return stream_ndjson(queryset.order_by(*ordering), VideoListSerializer)
     
-    # Serialize results
-    videos = VideoListSerializer(queryset, many=True).data
+    # Serialize one page of results
+    paginator = VideoSearchPagination()
+    paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, request)
+    videos = VideoListSerializer(page, many=True).data
     
     return Response({
         'videos': videos,
-        'count': len(videos)
+        'count': len(videos),
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link()
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def search_all(request):
+    """API view for ranked full-text search across videos, events and messages"""
+    
+    serializer = EntitySearchSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    results = search.search_entries(
+        request.user,
+        serializer.validated_data['q'],
+        entity_types=serializer.validated_data.get('types'),
+        limit=serializer.validated_data['limit']
+    )
+    
+    return Response({
+        'results': SearchResultSerializer(results, many=True).data,
+        'count': len(results)
+    }, status=status.HTTP_200_OK)
+
+def similar_results(request, entity_type, instance, queryset, serializer_class, attach=None):
+    """
+    Serialize the instances most similar to ``instance``, with their scores;
+    ``attach`` is called on the matched instances before serializing
+    """
+    
+    serializer = SimilaritySearchSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    matches = vectors.find_similar(
+        request.user, entity_type, instance.id, serializer.validated_data['k']
+    ) or []
+    instances = queryset.in_bulk([object_id for object_id, _ in matches])
+    if attach is not None:
+        attach(list(instances.values()))
+    
+    results = []
+    for object_id, score in matches:
+        if object_id in instances:
+            data = serializer_class(instances[object_id]).data
+            data['score'] = score
+            results.append(data)
+    
+    return Response({
+        'results': results,
+        'count': len(results)
     }, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def similar_frames(request, pk):
+    """API view for frames that look like the given frame"""
+    
+    frames = VideoFrame._default_manager.filter(video__user=request.user)
+    frame = get_object_or_404(frames, id=pk)
+    return similar_results(
+        request, 'frame', frame, with_frame_objects(frames), VideoFrameSerializer,
+        attach=attach_packed_objects
+    )
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def similar_events(request, pk):
+    """API view for events that resemble the given event"""
+    
+    events = Event.objects.filter(video__user=request.user)
+    event = get_object_or_404(events, id=pk)
+    return similar_results(
+        request, 'event', event, with_event_objects(events), EventSerializer
+    )
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_timeline(request, video_id):
+    """API view for the precomputed event and detection density timeline of a video"""
+    
+    serializer = TimelineRequestSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def build_response():
+        video = get_object_or_404(Video, id=video_id, user=request.user)
+        return Response(
+            timeline.timeline_payload(timeline.get_video_timeline(video), **serializer.validated_data),
+            status=status.HTTP_200_OK
+        )
+    
+    return conditional_response(request, 'video-timeline', video_id, build_response)
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_active_events(request, video_id):
+    """
+    API view answering what is happening at a playback position (``?at=``)
+    or over a time range (``?overlaps=start,end``), from the in-process
+    interval tree of the video's events
+    """
+    at, overlaps = parse_time_filters(request.query_params)
+    if (at is None) == (overlaps is None):
+        return Response(
+            {'error': "Exactly one of 'at' and 'overlaps' is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    tree = intervals.get_event_tree(video_id, request.user)
+    if tree is None:
+        return Response({'error': 'Video not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    events = tree.at(at) if at is not None else tree.overlapping(*overlaps)
+    return Response({
+        'video_id': str(video_id),
+        'at': at,
+        'overlaps': list(overlaps) if overlaps is not None else None,
+        'events': intervals.sort_events(events),
+    })
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_frame_query(request, video_id):
+    """
+    API view for the frames of a video matching a boolean class expression,
+    e.g. ``?q=person AND car AND NOT traffic_light`` or ``?q=car >= 3``,
+    evaluated over the per-frame class bitmasks
+    """
+    serializer = FrameQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def build_response():
+        video = get_object_or_404(Video, id=video_id, user=request.user)
+        return Response(
+            classmasks.frame_query_payload(video, **serializer.validated_data),
+            status=status.HTTP_200_OK
+        )
+    
+    return conditional_response(request, 'video-frame-query', video_id, build_response)
+
+@api_view(['POST'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_region_query(request, video_id):
+    """
+    API view for the detections inside a region of the frame over a time
+    range, and the tracks they belong to, answered from the video's grid
+    spatial index
+    """
+    video = get_object_or_404(Video, id=video_id, user=request.user)
+    
+    serializer = RegionQuerySerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    payload = spatial.region_payload(video, **serializer.validated_data)
+    payload['tracks'] = TrackSummarySerializer(payload['tracks'], many=True).data
+    return Response(payload, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_snapshot(request, video_id):
+    """
+    API view for the stored analysis snapshot of a completed video
+    
+    The snapshot is read with one primary-key lookup, and JSON clients get
+    the stored document without it being decoded or re-encoded.
+    """
+    
+    snapshot = VideoSnapshot.objects.filter(video_id=video_id, video__user=request.user).first()
+    if snapshot is None or snapshot.schema_version != snapshots.SNAPSHOT_SCHEMA_VERSION:
+        video = get_object_or_404(Video, id=video_id, user=request.user)
+        if video.status != 'completed':
+            return Response({
+                'error': 'The snapshot is available once the analysis completes'
+            }, status=status.HTTP_404_NOT_FOUND)
+        snapshot = snapshots.build_video_snapshot(video)
+    
+    etag = snapshots.snapshot_etag(snapshot, request.accepted_media_type)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if isinstance(request.accepted_renderer, JSONRenderer):
+            response = HttpResponse(snapshots.snapshot_bytes(snapshot), content_type='application/json')
+        else:
+            response = Response(snapshots.snapshot_document(snapshot), status=status.HTTP_200_OK)
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAuthenticated])
+def video_export(request, video_id):
+    """API view for a columnar (NPZ or Parquet) export of a video's detections and events"""
+    
+    video = get_object_or_404(Video, id=video_id, user=request.user)
+    serializer = VideoExportSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    file_format = serializer.validated_data['file_format']
+    table = serializer.validated_data['table']
+    output = tempfile.TemporaryFile()
+    export.export_video(video, output, file_format, table)
+    output.seek(0)
+    
+    if file_format == 'parquet':
+        filename = f'{video.id}-{table}.parquet'
+        content_type = 'application/vnd.apache.parquet'
+    else:
+        filename = f'{video.id}.npz'
+        content_type = 'application/octet-stream'
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=content_type)
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
+@permission_classes([permissions.IsAdminUser])
+def video_cache_stats(request):
+    """API view for hit/miss counters of the video response cache"""
+    
+    return Response(cache_stats(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@renderer_classes(API_RENDERER_CLASSES)
 @permission_classes([permissions.IsAuthenticated])
 def video_statistics(request):
     """API view for user's video statistics"""
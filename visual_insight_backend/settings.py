@@ -201,6 +201,25 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache configuration (Redis when REDIS_URL is set, local memory otherwise)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Lifetime of cached video API responses, which are also invalidated on write
+VIDEO_RESPONSE_CACHE_TIMEOUT = 60 * 60  # 1 hour
+
 # Celery configuration for background tasks
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -209,6 +228,15 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Uploads only add their vectors to the trained similarity indexes; training
+# them again as collections grow runs here (requires celery beat)
+CELERY_BEAT_SCHEDULE = {
+    'retrain-embedding-indexes': {
+        'task': 'videos.tasks.retrain_embedding_indexes',
+        'schedule': 3600.0,
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -254,8 +282,28 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 MAX_VIDEO_DURATION = 120  # 2 minutes in seconds
 ALLOWED_VIDEO_FORMATS = ['mp4', 'avi', 'mov', 'mkv']
 VIDEO_PROCESSING_TIMEOUT = 300  # 5 minutes
+FRAME_STORAGE_SIZE = 1280  # pixels on the longest side of stored frames; None keeps the source resolution
+ANALYSIS_INPUT_SIZE = 640  # pixels; frames are letterboxed into a square input of this size for detection
 
 # AI/ML Model settings
 AI_MODEL_CONFIDENCE_THRESHOLD = 0.7
 EVENT_DETECTION_INTERVAL = 1.0  # seconds
+EVENT_MERGE_GAP = 1.0  # seconds between events of a type under which they are merged
+ANOMALY_WINDOW = 30  # frames of history behind anomaly statistics
+ANOMALY_Z_THRESHOLD = 3.0  # standard deviations from the recent mean that make a spike
+ANOMALY_CHANGE_THRESHOLD = 4.0  # standard errors between window means that make a change point
+TRACK_IOU_THRESHOLD = 0.3  # overlap under which a box does not continue a track of the previous frames
+TRACK_MAX_AGE = 2  # frames a track may go unmatched before it ends
+ACTIVITY_FLOW_WIDTH = 320  # pixels; frames are downscaled to this width for optical flow
+ACTIVITY_WORKERS = 4  # threads computing optical flow between frame pairs
+DETECTION_STORAGE = config('DETECTION_STORAGE', default='rows')  # 'rows' or 'packed' (one array per frame)
+VIDEO_MODELS = {}  # model name -> {'loader': dotted path, 'version': str}; unset names use the mock backends
+VIDEO_MODELS_PRELOAD = []  # model names loaded as each Celery worker process starts
+MODEL_CACHE_SIZE = 4  # models kept resident per worker process, least recently used evicted first
+
+# Similarity search settings (embedding function per entity type)
+VIDEO_EMBEDDING_FUNCTIONS = {
+    'frame': 'videos.vectors.frame_detection_embedding',
+    'event': 'videos.vectors.event_text_embedding',
+}
 